@@ -4,19 +4,24 @@ from __future__ import print_function
 
 import datetime
 import dateutil
+import itertools
+import os
 import re
+import subprocess
 import sys
+import timeit
 import unittest
 import json
 
 from dateutil.tz import tzutc
-from dateutil.rrule import rrule, rruleset, WEEKLY, MONTHLY
+from dateutil.rrule import rrule, rrulestr, rruleset, WEEKLY, MONTHLY
 
 from vobject import base, iCalendar
 from vobject import icalendar
 
 from vobject.base import __behaviorRegistry as behavior_registry
-from vobject.base import ContentLine, parseLine, ParseError
+from vobject.base import ContentLine, ExpansionLimitError, parseLine, \
+    ParseError
 from vobject.base import readComponents, textLineToContentLine
 
 from vobject.change_tz import change_tz
@@ -26,6 +31,17 @@ from vobject.icalendar import MultiDateBehavior, PeriodBehavior, \
 from vobject.icalendar import parseDtstart, stringToTextValues, \
     stringToPeriod, timedeltaToString
 
+from vobject.occurrences import expand, getOverrideIndex, localize
+from vobject import vectorized
+from vobject.freebusy import AvailabilityEvaluator, BusyPeriods, \
+    BusyTimeline, computeFreeBusy, findConflicts, findFreeSlots
+from vobject.intervals import UNBOUNDED, agenda, getIntervalIndex
+from vobject.alarms import AlarmIndex
+from vobject.recurrence import ExpansionBudget, seekRule, setDefaultBudget, \
+    wholeSeconds
+from vobject import bench
+from vobject.bench.corpus import AddressBookGenerator, CalendarGenerator
+
 two_hours = datetime.timedelta(hours=2)
 
 
@@ -245,6 +261,37 @@ class TestBehaviors(unittest.TestCase):
         non_component_behavior = base.getBehavior('RDATE')
         self.assertFalse(non_component_behavior.isComponent)
 
+    def test_lazy_loading(self):
+        """
+        Reading a vCard doesn't import iCalendar's behaviors or dependencies
+        """
+        script = '''
+import sys, vobject
+imported = set(sys.modules)
+card = vobject.readOne("BEGIN:VCARD\\r\\nVERSION:3.0\\r\\nN:Doe;J\\r\\n"
+                       "FN:J Doe\\r\\nEND:VCARD\\r\\n")
+card.serialize()
+loaded = set(sys.modules)
+vobject.iCalendar().serialize()
+print(" ".join(sorted(imported)))
+print(" ".join(sorted(loaded)))
+print(" ".join(sorted(sys.modules)))
+'''
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(
+            os.path.dirname(os.path.abspath(base.__file__)))
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         env=env).decode('ascii')
+        imported, loaded, used = [line.split()
+                                  for line in output.splitlines()]
+        for module in ('vobject.icalendar', 'vobject.vcard', 'dateutil',
+                       'pytz', 'socket'):
+            self.assertFalse(module in imported, module)
+        self.assertTrue('vobject.vcard' in loaded)
+        for module in ('vobject.icalendar', 'dateutil', 'pytz', 'socket'):
+            self.assertFalse(module in loaded, module)
+        self.assertTrue('vobject.icalendar' in used)
+
     def test_MultiDateBehavior(self):
         """
         Test MultiDateBehavior
@@ -828,6 +875,1312 @@ class TestIcalendar(unittest.TestCase):
         self.assertEqual(dates[1], datetime.datetime(2013, 1, 24, 0, 0))
         self.assertEqual(dates[-1], datetime.datetime(2013, 3, 28, 0, 0))
 
+    def test_rruleset_cache(self):
+        """
+        The rruleset is cached until recurrence lines change
+        """
+        vevent = RecurringComponent(name='VEVENT')
+        vevent.add('dtstart').value = datetime.datetime(2005, 1, 19, 9)
+        vevent.add('rrule').value = u"FREQ=DAILY;COUNT=3"
+        first = vevent.getrruleset()
+        self.assertEqual(vevent.getrruleset()._rrule, first._rrule)
+
+        # callers may modify the rruleset they get back
+        first.exdate(datetime.datetime(2005, 1, 20, 9))
+        self.assertEqual(len(list(vevent.getrruleset())), 3)
+
+        vevent.add('exdate').value = [datetime.datetime(2005, 1, 20, 9)]
+        self.assertEqual(len(list(vevent.getrruleset())), 2)
+        vevent.exdate.value.append(datetime.datetime(2005, 1, 21, 9))
+        self.assertEqual(len(list(vevent.getrruleset())), 1)
+
+        vevent.rrule.value = u"FREQ=DAILY;COUNT=5"
+        self.assertEqual(len(list(vevent.getrruleset())), 3)
+        vevent.dtstart.value = datetime.datetime(2005, 2, 1, 9)
+        self.assertEqual(len(list(vevent.getrruleset())), 5)
+        vevent.remove(vevent.exdate)
+        self.assertEqual(len(list(vevent.getrruleset())), 5)
+        vevent.remove(vevent.rrule)
+        self.assertIsNone(vevent.getrruleset())
+
+    def test_parse_rrule_memo(self):
+        """
+        Parsed RRULEs are shared between events
+        """
+        rule = u"FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20050301"
+        first = icalendar.parseRrule(rule, True)
+        self.assertIs(icalendar.parseRrule(rule, True), first)
+        until, untilIsDate, template = first
+        self.assertEqual(until, datetime.datetime(2005, 3, 1))
+        self.assertTrue(untilIsDate)
+        self.assertIsNone(template._until)
+
+        # parts defaulting to DTSTART's follow each event's DTSTART
+        rule = u"FREQ=MONTHLY;COUNT=3"
+        until, untilIsDate, template = icalendar.parseRrule(rule, True)
+        for day in (5, 17):
+            dtstart = datetime.datetime(2005, 1, day, 9)
+            self.assertEqual(
+                list(icalendar.makeRrule(rule, template, dtstart, True)),
+                list(rrulestr(rule, dtstart=dtstart)))
+
+    def test_seek_rruleset(self):
+        """
+        Sought rrulesets have the same occurrences from the seek date on
+        """
+        vevent = RecurringComponent(name='VEVENT')
+        vevent.add('dtstart').value = datetime.datetime(2009, 1, 5, 9,
+                                                        tzinfo=utc)
+        after = datetime.datetime(2018, 3, 7, 12, tzinfo=utc)
+        before = after + datetime.timedelta(days=40)
+        rules = [u"FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR",
+                 u"FREQ=WEEKLY;INTERVAL=3;BYDAY=MO,TH",
+                 u"FREQ=MONTHLY;BYDAY=-1FR;BYMONTH=1,2,3,4",
+                 u"FREQ=DAILY;INTERVAL=2;COUNT=1700",
+                 u"FREQ=HOURLY;INTERVAL=7;UNTIL=20180401T000000Z",
+                 u"FREQ=MONTHLY;BYSETPOS=-1;BYDAY=MO,TU,WE,TH,FR"]
+        for rule in rules:
+            vevent.rrule_list = []
+            vevent.add('rrule').value = rule
+            expected = vevent.getrruleset(True).between(after, before)
+            sought = vevent.getrruleset(True, seek=after)
+            self.assertEqual(sought.between(after, before), expected, rule)
+
+        # rules which have ended before the seek date are dropped
+        sought = vevent.getrruleset(seek=datetime.datetime(2030, 1, 1,
+                                                           tzinfo=utc))
+        self.assertEqual(len(sought._rrule), 1)
+        vevent.rrule.value = u"FREQ=DAILY;COUNT=10"
+        sought = vevent.getrruleset(seek=after)
+        self.assertEqual(sought._rrule, [])
+
+    def test_seek_hourly_minutely(self):
+        """
+        HOURLY and MINUTELY rules are sought by counting whole periods
+        """
+        dtstart = datetime.datetime(2015, 3, 2, 9, 41, 17)
+        after = datetime.datetime(2015, 4, 19, 23, 5, 50)
+        for rule in (u"FREQ=HOURLY;INTERVAL=5", u"FREQ=MINUTELY;INTERVAL=7",
+                     u"FREQ=HOURLY;COUNT=20000", u"FREQ=MINUTELY;COUNT=90000"):
+            original = rrulestr(rule, dtstart=dtstart)
+            sought = seekRule(original, after)
+            self.assertTrue(sought._dtstart > dtstart, rule)
+            expected = list(itertools.islice(original.xafter(after, inc=True),
+                                             50))
+            self.assertEqual(list(itertools.islice(
+                sought.xafter(after, inc=True), 50)), expected, rule)
+
+        self.assertEqual(wholeSeconds(datetime.timedelta(days=2, seconds=5,
+                                                         microseconds=9)),
+                         172805)
+        self.assertEqual(wholeSeconds(datetime.timedelta(hours=-1)), -3600)
+
+    def test_seek_sub_daily(self):
+        """
+        Sought rules with a sub-daily FREQ or time BY* parts and a COUNT have
+        the same occurrences as dateutil's
+        """
+        import random
+        rng = random.Random(1)
+        rules = [(datetime.datetime(2012, 11, 25, 5), u"FREQ=HOURLY;BYHOUR=5;"
+                  u"COUNT=1983")]
+        for n in range(80):
+            dtstart = datetime.datetime(2012, 1, 1) + datetime.timedelta(
+                seconds=rng.randrange(86400 * 30))
+            parts = [u"FREQ=" + rng.choice([u"SECONDLY", u"MINUTELY",
+                                            u"HOURLY", u"DAILY"]),
+                     u"INTERVAL={0}".format(rng.randint(1, 3)),
+                     u"COUNT={0}".format(rng.randint(1, 150))]
+            for name, limit, value in ((u"BYHOUR", 24, dtstart.hour),
+                                       (u"BYMINUTE", 60, dtstart.minute),
+                                       (u"BYSECOND", 60, dtstart.second)):
+                choice = rng.random()
+                if choice < 0.3:
+                    parts.append(u"{0}={1}".format(name, value))
+                elif choice < 0.5:
+                    parts.append(u"{0}={1}".format(name, rng.randrange(limit)))
+            rules.append((dtstart, u";".join(parts)))
+
+        for dtstart, rule in rules:
+            vevent = RecurringComponent(name='VEVENT')
+            vevent.add('dtstart').value = dtstart.replace(tzinfo=utc)
+            vevent.add('rrule').value = rule
+            try:
+                expected = list(vevent.getrruleset(True))
+            except ValueError:
+                continue  # BY* parts dateutil rejects for this DTSTART
+            if len(expected) < 2:
+                continue
+            after = expected[len(expected) // 2] - datetime.timedelta(
+                seconds=rng.randrange(7200))
+            before = expected[-1]
+            sought = vevent.getrruleset(True, seek=after)
+            self.assertEqual(sought.between(after, before, inc=True),
+                             [dt for dt in expected if after <= dt],
+                             (dtstart, rule))
+
+
+class TestTzidResolution(unittest.TestCase):
+    """
+    Tests for the TZID resolver chain and its caches
+    """
+    def setUp(self):
+        icalendar.clearTzidCache()
+        self.calls = []
+
+        def counting_resolver(tzid):
+            self.calls.append(tzid)
+            return None
+        icalendar.tzidResolvers.insert(0, counting_resolver)
+        self.addCleanup(icalendar.tzidResolvers.remove, counting_resolver)
+        self.addCleanup(icalendar.clearTzidCache)
+
+    def test_zoneinfo_resolution(self):
+        """
+        Unregistered IANA TZIDs resolve once, without needing localize
+        """
+        if icalendar.zoneinfo is None:
+            return self.skipTest("zoneinfo not available")  # NOQA
+        berlin = icalendar.getTzid('Europe/Berlin')
+        self.assertEqual(berlin, icalendar.getTzid('Europe/Berlin'))
+        self.assertEqual(self.calls, ['Europe/Berlin'])
+        self.assertFalse(hasattr(berlin, 'localize'))
+
+        dt = icalendar.stringToDateTime('20080701T120000', berlin)
+        self.assertEqual(dt.utcoffset(), datetime.timedelta(hours=2))
+        self.assertEqual(icalendar.TimezoneComponent.pickTzid(berlin),
+                         'Europe/Berlin')
+
+    def test_negative_cache(self):
+        """
+        Unknown TZIDs are only resolved and logged once
+        """
+        with self.assertLogs('vobject.base', level='ERROR') as logs:
+            for _ in range(3):
+                self.assertIsNone(icalendar.getTzid('Nowhere Standard Time'))
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(self.calls, ['Nowhere Standard Time'])
+
+        # registering the TZID later makes it known
+        icalendar.registerTzid('Nowhere Standard Time', utc)
+        self.addCleanup(icalendar.registerTzid, 'Nowhere Standard Time', None)
+        self.assertEqual(icalendar.getTzid('Nowhere Standard Time'), utc)
+
+    def test_alias(self):
+        """
+        Registered aliases resolve to their target timezone
+        """
+        icalendar.registerTzidAlias('Somewhere Standard Time', 'UTC')
+        tz = icalendar.getTzid('Somewhere Standard Time')
+        self.assertIsNotNone(tz)
+        self.assertEqual(
+            datetime.datetime(2008, 7, 1, tzinfo=tz).utcoffset(),
+            datetime.timedelta(0)
+        )
+
+    def test_windows_aliases(self):
+        """
+        Windows, Outlook and Lotus Notes TZIDs resolve without a VTIMEZONE
+        """
+        cal = base.readOne(
+            'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+            'BEGIN:VEVENT\r\nUID:outlook\r\nDTSTART;TZID="(GMT+01.00) '
+            'Amsterdam / Berlin / Bern / Rome / Stockholm / Vienna":'
+            '20080701T120000\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n')
+        self.assertEqual(cal.vevent.dtstart.value.utcoffset(),
+                         datetime.timedelta(hours=2))
+
+        for tzid in ('W. Europe Standard Time', 'W. Europe',
+                     '(UTC+01:00) Amsterdam, Berlin, Bern, Rome, Stockholm, Vienna'):
+            dt = datetime.datetime(2008, 1, 1, tzinfo=icalendar.getTzid(tzid))
+            self.assertEqual(dt.utcoffset(), datetime.timedelta(hours=1))
+        # Lotus style abbreviations don't shadow IANA names
+        gmt = icalendar.getTzid('GMT')
+        self.assertEqual(datetime.datetime(2008, 7, 1, tzinfo=gmt).utcoffset(),
+                         datetime.timedelta(0))
+
+    def test_cache_is_bounded(self):
+        """
+        The TZID caches evict least recently used entries
+        """
+        cache = icalendar.LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+
+    def test_cache_threads(self):
+        """
+        A cache shared by threads stays bounded
+        """
+        import threading
+        cache = icalendar.LRUCache(maxsize=8)
+        errors = []
+
+        def use(offset):
+            try:
+                for n in range(2000):
+                    key = (n + offset) % 20
+                    if cache.get(key) is None:
+                        cache.put(key, n)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=use, args=(offset,))
+                   for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache), 8)
+
+        # a lookup while another thread marks the key as recently used
+        # doesn't miss
+        cache = icalendar.LRUCache()
+        cache.put('a', 1)
+        found = []
+        with cache.lock:
+            value = cache.data.pop('a')
+            reader = threading.Thread(
+                target=lambda: found.append((cache.get('a'), 'a' in cache)))
+            reader.start()
+            reader.join(0.1)
+            cache.data['a'] = value
+        reader.join()
+        self.assertEqual(found, [(1, True)])
+
+        # None is a value like any other
+        cache.put('b', None)
+        cache.put('c', 3)
+        self.assertTrue(cache.get('b', 0) is None)
+        self.assertEqual(list(cache.data), ['a', 'c', 'b'])
+
+
+class TestParseContext(unittest.TestCase):
+    """
+    Tests for scoping the TZID registry to a ParseContext
+    """
+    @staticmethod
+    def calendar_text(offset):
+        """
+        A calendar defining TZID Context-Eastern with a fixed offset
+        """
+        return (
+            'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+            'BEGIN:VTIMEZONE\r\nTZID:Context-Eastern\r\n'
+            'BEGIN:STANDARD\r\nDTSTART:20000101T000000\r\n'
+            'TZOFFSETFROM:{0}\r\nTZOFFSETTO:{0}\r\n'
+            'END:STANDARD\r\nEND:VTIMEZONE\r\n'
+            'BEGIN:VEVENT\r\nUID:context\r\n'
+            'DTSTART;TZID=Context-Eastern:20080701T120000\r\n'
+            'END:VEVENT\r\nEND:VCALENDAR\r\n'.format(offset))
+
+    def test_context_registry(self):
+        """
+        VTIMEZONEs parsed with a context are registered only in that context
+        """
+        context = base.ParseContext()
+        cal = base.readOne(self.calendar_text('-0500'), context=context)
+        self.assertIsNone(icalendar.getTzid('Context-Eastern', False))
+        self.assertIn('Context-Eastern', context.tzids)
+        self.assertEqual(cal.vevent.dtstart.value.utcoffset(),
+                         datetime.timedelta(hours=-5))
+
+        other = base.readOne(self.calendar_text('-0400'),
+                             context=base.ParseContext())
+        self.assertEqual(other.vevent.dtstart.value.utcoffset(),
+                         datetime.timedelta(hours=-4))
+
+        serialized = cal.serialize(context=context)
+        self.assertEqual(serialized.count('TZID:Context-Eastern'), 1)
+        self.assertIsNone(base.getParseContext())
+
+    def test_threads(self):
+        """
+        Concurrent parses with their own contexts don't see each other's TZIDs
+        """
+        import threading
+        results = {}
+
+        def parse(offset):
+            offsets = set()
+            for _ in range(20):
+                cal = base.readOne(self.calendar_text(offset),
+                                   context=base.ParseContext())
+                offsets.add(cal.vevent.dtstart.value.utcoffset())
+            results[offset] = offsets
+
+        threads = [threading.Thread(target=parse, args=(offset,))
+                   for offset in ('-0500', '-0400', '+0100')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results['-0500'], {datetime.timedelta(hours=-5)})
+        self.assertEqual(results['-0400'], {datetime.timedelta(hours=-4)})
+        self.assertEqual(results['+0100'], {datetime.timedelta(hours=1)})
+
+
+class TestParseLimits(unittest.TestCase):
+    """
+    Tests for limiting the resources parsing untrusted input uses
+    """
+    def assertRefused(self, text, **limits):
+        for allowQP in (False, True):
+            self.assertRaises(base.ParseLimitError, base.readOne, text,
+                              allowQP=allowQP,
+                              limits=base.ParseLimits(**limits))
+
+    def test_limits(self):
+        """
+        Input exceeding a limit raises ParseLimitError, other input parses
+        """
+        text = get_test_file("simple_test.ics")
+        limits = base.ParseLimits(maxLineLength=100, maxParams=2, maxDepth=2,
+                                  maxComponents=2, maxProperties=10)
+        cal = base.readOne(text, limits=limits)
+        self.assertEqual(cal.vevent.summary.value, 'Bastille Day Party')
+
+        self.assertRefused(text, maxLineLength=20)
+        folded = ('BEGIN:VCALENDAR\r\nX-LONG:' + 'a' * 70 +
+                  '\r\n a' * 1000 + '\r\nEND:VCALENDAR\r\n')
+        self.assertRefused(folded, maxLineLength=1076)
+        base.readOne(folded, limits=base.ParseLimits(maxLineLength=1077))
+
+        params = ('BEGIN:VCALENDAR\r\nX-MANY;A=1;B="x;y:z";C=1,2,3:v\r\n'
+                  'END:VCALENDAR\r\n')
+        self.assertRefused(params, maxParams=4)
+        base.readOne(params, limits=base.ParseLimits(maxParams=5))
+        self.assertRefused(params.replace('"x;y:z"', 'x'), maxParams=4)
+        self.assertRaises(base.ParseLimitError, base.readOne, params,
+                          ignoreUnreadable=True,
+                          limits=base.ParseLimits(maxParams=1))
+
+        nested = 'BEGIN:X\r\n' * 50 + 'END:X\r\n' * 50
+        self.assertRefused(nested, maxDepth=49)
+        base.readOne(nested, limits=base.ParseLimits(maxDepth=50))
+        self.assertRefused(nested, maxComponents=49)
+        self.assertRefused(text, maxProperties=0)
+
+
+class TestParseStats(unittest.TestCase):
+    """
+    Tests for instrumenting parsing and serializing
+    """
+    def test_stats(self):
+        """
+        Lines and components are counted and phases timed while active
+        """
+        text = get_test_file("standard_test.ics")
+        stats = base.ParseStats()
+        cal = base.readOne(text, stats=stats)
+        self.assertEqual(stats.lines, len(text.strip().splitlines()))
+        self.assertEqual(stats.components, text.count('BEGIN:'))
+        self.assertEqual(stats.lines,
+                         stats.properties + 2 * stats.components)
+        for phase in ('unfold', 'parseLine', 'decode', 'transform', 'tz'):
+            self.assertTrue(stats.times[phase] > 0, phase)
+        self.assertEqual(stats.times['serialize'], 0)
+        self.assertEqual(stats.behaviors['VTimezone'][0],
+                         len(cal.vtimezone_list))
+        self.assertEqual(stats.running, [])
+
+        with base.ParseStats() as active:
+            cal.serialize()
+        self.assertTrue(active.times['serialize'] > 0)
+        self.assertTrue(active.times['validate'] > 0)
+        self.assertEqual(active.serialized, stats.components)
+        self.assertEqual(active.lines, 0)
+        self.assertEqual(base.getParseStats(), None)
+
+        metrics = active.metrics()
+        self.assertEqual(metrics['vobject.serialized'], stats.components)
+        self.assertEqual(metrics['vobject.time.serialize'],
+                         active.times['serialize'])
+
+    def test_slow_components(self):
+        """
+        Components slower than the threshold are passed to onSlow
+        """
+        text = get_test_file("recurrence.ics")
+        slow = []
+        stats = base.ParseStats(slowThreshold=0, onSlow=slow.append)
+        cal = base.readOne(text, stats=stats)
+        with stats:
+            cal.vevent.getrruleset()
+            cal.serialize()
+
+        reported = set((s.where, s.name) for s in slow)
+        for where in ('read', 'serialize'):
+            self.assertTrue((where, 'VCALENDAR') in reported, where)
+            self.assertTrue((where, 'VEVENT') in reported, where)
+        self.assertTrue(('transform', 'DTSTART') in reported)
+        self.assertTrue(('rruleset', 'VEVENT') in reported)
+
+        uid = cal.vevent.uid.value
+        event = [s for s in slow if s.where == 'read' and s.name == 'VEVENT']
+        self.assertEqual(event[0].uid, uid)
+        self.assertTrue(0 < event[0].lineNumber < cal.vevent.uid.lineNumber)
+        line = [s for s in slow if s.name == 'DTSTART'][0]
+        self.assertEqual(line.uid, uid)
+
+        del slow[:]
+        cal = base.readOne(text, transform=False)
+        with stats:
+            cal.transformChildrenToNative()
+        self.assertTrue(('transform', 'DTSTART') in
+                        set((s.where, s.name) for s in slow))
+        self.assertTrue(type(cal.vevent.dtstart.value) is datetime.datetime)
+
+        del slow[:]
+        stats.slowThreshold = 60
+        base.readOne(text, stats=stats).serialize(stats=stats)
+        self.assertEqual(slow, [])
+
+    def test_slow_expansion(self):
+        """
+        Components slow to expand into occurrences are reported, not only
+        those slow to have their rruleset built
+        """
+        cal = base.readOne(get_test_file("recurrence.ics"))
+        uid = cal.vevent.uid.value
+        start = datetime.datetime(2006, 1, 1, tzinfo=tzutc())
+        end = datetime.datetime(2007, 1, 1, tzinfo=tzutc())
+        cal.vevent.getrruleset(addRDate=True)
+
+        def expanded(expand):
+            slow = []
+            with base.ParseStats(slowThreshold=0, onSlow=slow.append):
+                expand()
+            return [s.uid for s in slow if (s.where, s.name) ==
+                    ('expand', 'VEVENT')]
+
+        self.assertEqual(expanded(lambda: expand(cal, start, end)), [uid])
+        self.assertEqual(expanded(
+            lambda: list(itertools.islice(agenda([cal], start), 3))), [uid])
+        if vectorized.numpy is not None:
+            self.assertEqual(expanded(lambda: vectorized.expandArrays(
+                cal.vevent_list, start, end)), [uid])
+
+
+class TestScaling(unittest.TestCase):
+    """
+    Tests that parsing and serializing pathological input takes time linear
+    in its size
+    """
+    def assertLinear(self, function, make, size):
+        """
+        function(make(n)) takes well under 256 times longer when n is 16
+        times larger, which it would if it were quadratic
+
+        The bound is four times the linear ratio, so the test doesn't fail
+        on a loaded machine, and the best of several runs is compared.
+        """
+        times = []
+        for n in (size, 16 * size):
+            argument = make(n)
+            times.append(min(timeit.repeat(lambda: function(argument),
+                                           number=1, repeat=3)))
+        self.assertLess(times[1] / times[0], 64,
+                        "{0} took {1:.4f}s for {2}, {3:.4f}s for {4}".format(
+                            function.__name__, times[0], size, times[1],
+                            16 * size))
+
+    @staticmethod
+    def calendar(lines):
+        return ('BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nUID:scaling\r\n'
+                'DTSTART:20000101T090000Z\r\n' + lines +
+                'END:VEVENT\r\nEND:VCALENDAR\r\n')
+
+    def test_long_lines(self):
+        """
+        Long folded lines, long quoted-printable values
+        """
+        def folded(n):
+            return self.calendar('DESCRIPTION:' + 'x' * 63 +
+                                 '\r\n ' + 'x' * 74 * n + '\r\n')
+
+        def qpReadOne(text):
+            return base.readOne(text, allowQP=True)
+
+        def quotedPrintable(n):
+            return ('BEGIN:VCARD\r\nVERSION:2.1\r\nFN:Scaling\r\n'
+                    'NOTE;ENCODING=QUOTED-PRINTABLE:' + 'abc=3D=\r\n' * n +
+                    'end\r\nEND:VCARD\r\n')
+
+        self.assertLinear(base.readOne, folded, 500)
+        self.assertLinear(qpReadOne, folded, 500)
+        self.assertLinear(qpReadOne, quotedPrintable, 5000)
+
+    def test_many_values(self):
+        """
+        Many parameters, EXDATEs, escaped text values, deep nesting
+        """
+        def params(n):
+            return self.calendar('X-PARAMS' + ''.join(
+                ';X-P{0}="a,b",c'.format(i) for i in range(n)) + ':v\r\n')
+
+        def exdates(n):
+            return self.calendar('RRULE:FREQ=DAILY\r\nEXDATE:' + ','.join(
+                '{0:%Y%m%d}T090000Z'.format(
+                    datetime.date(2000, 1, 1) + datetime.timedelta(days=i))
+                for i in range(n)) + '\r\n')
+
+        def expandExdates(text):
+            return list(base.readOne(text).vevent.getrruleset()[:10])
+
+        def nested(n):
+            return 'BEGIN:X-NESTED\r\nX-P:v\r\n' * n + \
+                'END:X-NESTED\r\n' * n
+
+        self.assertLinear(base.readOne, params, 1000)
+        self.assertLinear(expandExdates, exdates, 1000)
+        self.assertLinear(stringToTextValues,
+                          lambda n: 'a\\, b\\; c\\n' * n, 10000)
+        self.assertLinear(base.readOne, nested, 25)
+
+    def test_serialize(self):
+        """
+        Long lines are folded in linear time
+        """
+        def described(n):
+            cal = base.readOne(self.calendar(''))
+            cal.vevent.add('description').value = u'x\u00e9\u4e2d ' * n
+            return cal
+
+        def serialize(component):
+            return component.serialize()
+
+        self.assertLinear(serialize, described, 5000)
+
+
+class TestBench(unittest.TestCase):
+    """
+    Tests for the benchmark suite
+    """
+    def test_run(self):
+        """
+        Benchmarks report throughput, results can be compared
+        """
+        corpus = bench.readCorpus(['test_files/simple_test.ics'])
+        results = bench.run(['parse', 'parse_corpus', 'ics_diff'], repeat=1,
+                            scale=0.01, corpus=corpus)
+        parse = results['benchmarks']['parse']
+        self.assertGreater(parse['components'], 10)
+        self.assertGreater(parse['linesPerSecond'], 0)
+        self.assertGreater(parse['megabytesPerSecond'], 0)
+        self.assertEqual(results['benchmarks']['parse_corpus']['components'],
+                         2)
+        self.assertIsNone(results['benchmarks']['ics_diff']['bytes'])
+        json.loads(json.dumps(results))
+        self.assertEqual(list(bench.compare(results, results).values()),
+                         [1.0, 1.0, 1.0])
+        self.assertIsNone(parse['speedup'])
+
+    @unittest.skipIf(vectorized.numpy is None, "NumPy is not installed")
+    def test_paired(self):
+        """
+        The vectorized benchmark reports its speedup over rruleset iteration
+        """
+        results = bench.run(['vectorized'], repeat=1, scale=0.01, corpus=[])
+        result = results['benchmarks']['vectorized']
+        self.assertGreater(result['baselineBest'], 0)
+        self.assertAlmostEqual(result['speedup'],
+                               result['baselineBest'] / result['best'])
+
+        from vobject.bench.__main__ import formatResult
+        result.update(best=0.5, baselineBest=0.1, speedup=0.2)
+        self.assertTrue(formatResult('vectorized', result).endswith(
+            "5.0x slower than the baseline's 0.1000s"))
+        result.update(best=0.1, baselineBest=0.5, speedup=5.0)
+        self.assertTrue(formatResult('vectorized', result).endswith(
+            "5.0x faster than the baseline's 0.5000s"))
+
+    def test_corpus(self):
+        """
+        Generated calendars and address books are seeded and parse back
+        """
+        generator = CalendarGenerator(seed=4)
+        text = generator.text(200)
+        self.assertEqual(text, CalendarGenerator(seed=4).text(200))
+        self.assertNotEqual(text, CalendarGenerator(seed=5).text(200))
+        cal = base.readOne(text)
+        events = cal.vevent_list
+        self.assertEqual(len(cal.vtimezone_list), len(generator.tzinfos))
+        self.assertEqual(len([e for e in events
+                              if 'recurrence-id' not in e.contents]), 200)
+        for name in ('rrule', 'exdate', 'recurrence-id', 'valarm',
+                     'attendee'):
+            self.assertTrue(any(name in e.contents for e in events), name)
+        starts = [e.dtstart.value for e in events]
+        self.assertTrue(any(not isinstance(s, datetime.datetime)
+                            for s in starts))
+        self.assertTrue(any(isinstance(s, datetime.datetime) and
+                            s.tzinfo is None for s in starts))
+
+        book = AddressBookGenerator(seed=4, quotedPrintable=0.5, photos=0.5,
+                                    photoSize=100).text(20)
+        cards = list(base.readComponents(book, allowQP=True))
+        self.assertEqual(len(cards), 20)
+        old = [card for card in cards if card.version.value == '2.1']
+        self.assertTrue(old)
+        self.assertIn('\r\n', old[0].note.value)
+        self.assertEqual({len(card.photo.value) for card in cards
+                          if 'photo' in card.contents}, {100})
+        self.assertTrue(any(line.group for card in cards
+                            for line in card.lines()))
+
+
+class TestTzinfoPool(unittest.TestCase):
+    """
+    Tests for sharing tzinfo objects between parsed calendars
+    """
+    @staticmethod
+    def calendar_text(tzid, uid):
+        """
+        A calendar with a US Eastern VTIMEZONE named tzid
+        """
+        return (
+            'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+            'BEGIN:VTIMEZONE\r\nTZID:{0}\r\n'
+            'BEGIN:DAYLIGHT\r\nTZOFFSETFROM:-0500\r\nTZOFFSETTO:-0400\r\n'
+            'TZNAME:EDT\r\nDTSTART:20070311T020000\r\n'
+            'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU\r\nEND:DAYLIGHT\r\n'
+            'BEGIN:STANDARD\r\nTZOFFSETFROM:-0400\r\nTZOFFSETTO:-0500\r\n'
+            'TZNAME:EST\r\nDTSTART:20071104T020000\r\n'
+            'RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU\r\nEND:STANDARD\r\n'
+            'END:VTIMEZONE\r\n'
+            'BEGIN:VEVENT\r\nUID:{1}\r\n'
+            'DTSTART;TZID={0}:20200701T120000\r\n'
+            'END:VEVENT\r\nEND:VCALENDAR\r\n'.format(tzid, uid))
+
+    def parse(self, pool, tzid, uid):
+        context = base.ParseContext(tzPool=pool)
+        return base.readOne(self.calendar_text(tzid, uid), context=context)
+
+    def test_shared_tzinfo(self):
+        """
+        Equivalent VTIMEZONEs in different calendars share one tzinfo
+        """
+        pool = icalendar.TzinfoPool()
+        first = self.parse(pool, 'Pool-Eastern', 'first')
+        second = self.parse(pool, 'Pool-Eastern', 'second')
+        self.assertIs(first.vevent.dtstart.value.tzinfo,
+                      second.vevent.dtstart.value.tzinfo)
+        self.assertEqual(len(pool), 1)
+
+        # a different TZID isn't merged, so serializing keeps the TZID
+        other = self.parse(pool, 'Pool-Other', 'other')
+        self.assertIsNot(first.vevent.dtstart.value.tzinfo,
+                         other.vevent.dtstart.value.tzinfo)
+        self.assertIn('TZID=Pool-Other:', other.serialize())
+
+    def test_iana_match(self):
+        """
+        A VTIMEZONE agreeing with its IANA zone uses the IANA tzinfo
+        """
+        pool = icalendar.TzinfoPool()
+        cal = self.parse(pool, 'America/New_York', 'iana')
+        tzinfo = cal.vevent.dtstart.value.tzinfo
+        self.assertEqual(icalendar.TimezoneComponent.pickTzid(tzinfo),
+                         'America/New_York')
+        self.assertIs(tzinfo, icalendar.ianaTimezone('America/New_York'))
+        self.assertIn('TZID=America/New_York:', cal.serialize())
+
+        # rules that don't agree with the IANA zone are kept
+        cal = self.parse(pool, 'America/Chicago', 'chicago')
+        tzinfo = cal.vevent.dtstart.value.tzinfo
+        self.assertIsNot(tzinfo, icalendar.ianaTimezone('America/Chicago'))
+        self.assertEqual(tzinfo.utcoffset(cal.vevent.dtstart.value),
+                         datetime.timedelta(hours=-4))
+
+
+class TestOccurrences(unittest.TestCase):
+    """
+    Tests for expanding calendars into occurrences
+    """
+    def setUp(self):
+        self.cal = base.readOne(get_test_file("recurrence_overrides.ics"))
+
+    def test_expand(self):
+        """
+        Overrides replace instances, EXDATEs are skipped, ends are computed
+        """
+        occurrences = expand(self.cal,
+                             datetime.datetime(2018, 1, 8, tzinfo=utc),
+                             datetime.datetime(2018, 1, 27, tzinfo=utc))
+        self.assertEqual(
+            [(o.uid, o.start.isoformat()) for o in occurrences],
+            [('allday@example.com', '2018-01-15'),
+             ('allday@example.com', '2018-01-16'),
+             ('floating@example.com', '2018-01-16T09:00:00'),
+             ('allday@example.com', '2018-01-17'),
+             ('todo@example.com', '2018-01-17T12:00:00+00:00'),
+             ('weekly@example.com', '2018-01-18T15:00:00+01:00'),
+             ('weekly@example.com', '2018-01-26T10:00:00+01:00')]
+        )
+        moved = occurrences[5]
+        self.assertEqual(moved.recurrenceId.isoformat(),
+                         '2018-01-19T10:00:00+01:00')
+        self.assertEqual(moved.component.summary.value,
+                         'Weekly meeting, moved to Thursday')
+        self.assertEqual(occurrences[2].end.isoformat(), '2018-01-16T09:30:00')
+        self.assertEqual(occurrences[0].end, datetime.date(2018, 1, 16))
+        self.assertEqual(occurrences[6].end.isoformat(),
+                         '2018-01-26T11:00:00+01:00')
+
+    def test_window_bounds(self):
+        """
+        Occurrences are included if they intersect the window
+        """
+        berlin = icalendar.getTzid('Europe/Berlin')
+        # the moved instance ends exactly at the start of the window
+        occurrences = expand(self.cal,
+                             datetime.datetime(2018, 1, 18, 16, tzinfo=berlin),
+                             datetime.datetime(2018, 1, 19, 10, tzinfo=berlin))
+        self.assertEqual(occurrences, [])
+
+        # the original time of the moved instance isn't an occurrence
+        occurrences = expand(self.cal,
+                             datetime.datetime(2018, 1, 19, 9, 30, tzinfo=berlin),
+                             datetime.datetime(2018, 1, 19, 10, 30, tzinfo=berlin))
+        self.assertEqual(occurrences, [])
+
+        # dates and floating times are taken to be in tzinfo
+        occurrences = expand(self.cal, datetime.date(2018, 1, 16),
+                             datetime.date(2018, 1, 17),
+                             tzinfo=dateutil.tz.tzoffset(None, 10 * 3600))
+        self.assertEqual([o.uid for o in occurrences],
+                         ['allday@example.com', 'floating@example.com'])
+
+    def test_override_index(self):
+        """
+        The override index follows components added to and removed from the
+        calendar, with dates and timezones normalized
+        """
+        index = getOverrideIndex(self.cal)
+        self.assertTrue(index.master('weekly@example.com') is
+                        self.cal.vevent)
+        berlin = icalendar.getTzid('Europe/Berlin')
+        moved = index.override(
+            'weekly@example.com',
+            datetime.datetime(2018, 1, 19, 9, tzinfo=utc))
+        self.assertEqual(moved.summary.value,
+                         'Weekly meeting, moved to Thursday')
+
+        override = self.cal.add('vevent')
+        override.add('uid').value = 'allday@example.com'
+        override.add('recurrence-id').value = datetime.date(2018, 1, 16)
+        override.add('dtstart').value = datetime.date(2018, 1, 20)
+        self.assertTrue(index.override('allday@example.com',
+                                       datetime.date(2018, 1, 16))
+                        is override)
+        window = (datetime.datetime(2018, 1, 14, tzinfo=berlin),
+                  datetime.datetime(2018, 1, 21, tzinfo=berlin))
+        self.assertEqual(
+            [o.start for o in expand(self.cal, *window, tzinfo=berlin)
+             if o.uid == 'allday@example.com'],
+            [datetime.date(2018, 1, 15), datetime.date(2018, 1, 17),
+             datetime.date(2018, 1, 20)])
+
+        self.cal.remove(override)
+        self.assertTrue(index.override('allday@example.com',
+                                       datetime.date(2018, 1, 16)) is None)
+        self.assertEqual(len(expand(self.cal, *window, tzinfo=berlin)), 6)
+
+    def test_this_and_future(self):
+        """
+        A RANGE=THISANDFUTURE override moves the following instances
+        """
+        berlin = icalendar.getTzid('Europe/Berlin')
+        override = self.cal.add('vevent')
+        override.add('uid').value = 'weekly@example.com'
+        recurrenceId = override.add('recurrence-id')
+        recurrenceId.value = datetime.datetime(2018, 1, 26, 9, tzinfo=utc)
+        recurrenceId.params['RANGE'] = ['THISANDFUTURE']
+        override.add('dtstart').value = datetime.datetime(2018, 1, 26, 14,
+                                                          tzinfo=berlin)
+        override.add('duration').value = datetime.timedelta(minutes=30)
+        override.add('summary').value = 'Afternoon meeting'
+
+        occurrences = expand(self.cal,
+                             datetime.datetime(2018, 1, 20, tzinfo=utc),
+                             datetime.datetime(2018, 2, 10, tzinfo=utc))
+        self.assertEqual(
+            [(o.start.isoformat(), o.end.isoformat(), o.component.summary.value)
+             for o in occurrences],
+            [('2018-01-26T14:00:00+01:00', '2018-01-26T14:30:00+01:00',
+              'Afternoon meeting'),
+             ('2018-02-02T14:00:00+01:00', '2018-02-02T14:30:00+01:00',
+              'Afternoon meeting'),
+             ('2018-02-09T14:00:00+01:00', '2018-02-09T14:30:00+01:00',
+              'Afternoon meeting')])
+        self.assertEqual(occurrences[1].recurrenceId.isoformat(),
+                         '2018-02-02T10:00:00+01:00')
+
+    def test_interval_index(self):
+        """
+        The interval index finds the same occurrences as expand, and follows
+        components added to and removed from the calendar
+        """
+        index = getIntervalIndex(self.cal)
+        self.assertEqual(len(index), 5)
+        berlin = icalendar.getTzid('Europe/Berlin')
+        windows = [(datetime.datetime(2018, 1, 8, tzinfo=utc),
+                    datetime.datetime(2018, 1, 27, tzinfo=utc)),
+                   (datetime.datetime(2018, 1, 16, 9, tzinfo=utc),
+                    datetime.datetime(2018, 1, 16, 9, 15, tzinfo=utc)),
+                   (datetime.datetime(2019, 3, 1, tzinfo=berlin),
+                    datetime.datetime(2019, 3, 2, tzinfo=berlin))]
+        for start, end in windows:
+            self.assertEqual(index.between(start, end),
+                             expand(self.cal, start, end))
+
+        event = self.cal.add('vevent')
+        event.add('uid').value = 'long@example.com'
+        event.add('dtstart').value = datetime.datetime(2017, 6, 1, tzinfo=utc)
+        event.add('dtend').value = datetime.datetime(2018, 6, 1, tzinfo=utc)
+        self.assertEqual(
+            [o.uid for o in index.between(*windows[1])],
+            ['long@example.com', 'allday@example.com',
+             'floating@example.com'])
+        self.cal.remove(event)
+        self.assertEqual(len(index), 5)
+        self.assertEqual(
+            [o.uid for o in index.between(*windows[1])],
+            ['allday@example.com', 'floating@example.com'])
+
+    def test_count_series_bounded(self):
+        """
+        Series bounded by a COUNT are indexed with the end of their last
+        occurrence, only series which recur forever are unbounded
+        """
+        cal = base.newFromBehavior('vcalendar')
+        rules = {'daily': 'FREQ=DAILY;COUNT=500',
+                 'hourly': 'FREQ=HOURLY;INTERVAL=5;COUNT=40',
+                 'weekdays': 'FREQ=WEEKLY;BYDAY=MO,WE;COUNT=30',
+                 'forever': 'FREQ=WEEKLY'}
+        for name, rule in rules.items():
+            event = cal.add('vevent')
+            event.add('uid').value = name
+            event.add('dtstart').value = datetime.datetime(2018, 3, 20, 9,
+                                                           tzinfo=utc)
+            event.add('duration').value = datetime.timedelta(hours=1)
+            event.add('rrule').value = rule
+        index = getIntervalIndex(cal)
+        groups = dict((entry[0].uid.value, entry[2])
+                      for entry in index.entries.values())
+        self.assertEqual(groups['forever'], UNBOUNDED)
+        for name in ('daily', 'hourly', 'weekdays'):
+            self.assertNotEqual(groups[name], UNBOUNDED, name)
+
+        for start, end in ((datetime.datetime(2019, 7, 31, tzinfo=utc),
+                            datetime.datetime(2019, 8, 3, tzinfo=utc)),
+                           (datetime.datetime(2018, 3, 28, tzinfo=utc),
+                            datetime.datetime(2018, 3, 30, tzinfo=utc)),
+                           (datetime.datetime(2018, 5, 14, tzinfo=utc),
+                            datetime.datetime(2018, 5, 24, tzinfo=utc))):
+            self.assertEqual(index.between(start, end),
+                             expand(cal, start, end))
+
+    def test_agenda(self):
+        """
+        agenda merges the occurrences of several calendars in order
+        """
+        other = base.newFromBehavior('vcalendar')
+        for day in (16, 18):
+            event = other.add('vevent')
+            event.add('uid').value = 'other-{0}@example.com'.format(day)
+            event.add('dtstart').value = datetime.datetime(2018, 1, day, 12,
+                                                           tzinfo=utc)
+        weekly = other.add('vevent')
+        weekly.add('uid').value = 'weekly-other@example.com'
+        weekly.add('dtstart').value = datetime.datetime(2017, 1, 2, 8,
+                                                        tzinfo=utc)
+        weekly.add('rrule').value = 'FREQ=WEEKLY'
+
+        start = datetime.datetime(2018, 1, 16, tzinfo=utc)
+        occurrences = list(itertools.islice(agenda([self.cal, other], start),
+                                            7))
+        self.assertEqual(
+            [(o.uid, o.start) for o in occurrences],
+            [('allday@example.com', datetime.date(2018, 1, 16)),
+             ('floating@example.com', datetime.datetime(2018, 1, 16, 9)),
+             ('other-16@example.com',
+              datetime.datetime(2018, 1, 16, 12, tzinfo=utc)),
+             ('allday@example.com', datetime.date(2018, 1, 17)),
+             ('todo@example.com',
+              datetime.datetime(2018, 1, 17, 12, tzinfo=utc)),
+             ('other-18@example.com',
+              datetime.datetime(2018, 1, 18, 12, tzinfo=utc)),
+             ('weekly@example.com', occurrences[6].start)])
+        self.assertEqual(occurrences[6].start.isoformat(),
+                         '2018-01-18T15:00:00+01:00')
+        following = list(itertools.islice(agenda([self.cal, other], start),
+                                          7, 9))
+        self.assertEqual([o.uid for o in following],
+                         ['weekly-other@example.com', 'weekly@example.com'])
+
+    def test_expansion_budget(self):
+        """
+        Budgets limit expanding runaway rules
+        """
+        cal = base.newFromBehavior('vcalendar')
+        event = cal.add('vevent')
+        event.add('uid').value = 'secondly@example.com'
+        event.add('dtstart').value = datetime.datetime(2018, 1, 1, tzinfo=utc)
+        event.add('rrule').value = 'FREQ=SECONDLY'
+        start = datetime.datetime(2018, 1, 1, tzinfo=utc)
+        end = datetime.datetime(2018, 1, 2, tzinfo=utc)
+
+        self.assertRaises(ExpansionLimitError, expand, cal, start, end,
+                          budget=ExpansionBudget(maxIterations=1000))
+        self.assertRaises(ExpansionLimitError, expand, cal, start, end,
+                          budget=ExpansionBudget(maxInstances=10))
+
+        budget = ExpansionBudget(maxInstances=10, truncate=True)
+        self.assertEqual(len(expand(cal, start, end, budget=budget)), 10)
+        self.assertTrue(budget.truncated)
+        budget = ExpansionBudget(maxIterations=100, truncate=True)
+        upcoming = list(itertools.islice(agenda([cal], start, budget=budget),
+                                         1000))
+        self.assertEqual(len(upcoming), 100)
+        self.assertTrue(budget.truncated)
+
+        setDefaultBudget(maxIterations=1000)
+        try:
+            self.assertRaises(ExpansionLimitError,
+                              getIntervalIndex(cal).between, start, end)
+        finally:
+            setDefaultBudget()
+
+        # the 30th of February never comes, expanding doesn't search for it
+        event.rrule.value = 'FREQ=HOURLY;BYMONTH=2;BYMONTHDAY=30'
+        occurrences = expand(cal, start, datetime.datetime(2100, 1, 1,
+                                                           tzinfo=utc),
+                             budget=ExpansionBudget(deadline=5))
+        self.assertEqual(occurrences, [])
+
+
+class TestFreeBusy(unittest.TestCase):
+    """
+    Tests for computing free/busy time
+    """
+    def setUp(self):
+        self.cal = base.readOne(get_test_file("recurrence_overrides.ics"))
+        self.start = datetime.datetime(2018, 1, 8, tzinfo=utc)
+        self.end = datetime.datetime(2018, 1, 27, tzinfo=utc)
+
+    def test_compute_free_busy(self):
+        """
+        Overlapping periods are merged, TRANSP and STATUS are respected
+        """
+        tentative = self.cal.add('vevent')
+        tentative.add('uid').value = 'tentative@example.com'
+        tentative.add('dtstart').value = datetime.datetime(2018, 1, 20, 9,
+                                                           tzinfo=utc)
+        tentative.add('dtend').value = datetime.datetime(2018, 1, 20, 11,
+                                                         tzinfo=utc)
+        tentative.add('status').value = 'TENTATIVE'
+        transparent = self.cal.add('vevent')
+        transparent.add('uid').value = 'transparent@example.com'
+        transparent.add('dtstart').value = datetime.date(2018, 1, 22)
+        transparent.add('transp').value = 'TRANSPARENT'
+
+        vfreebusy = computeFreeBusy([self.cal], self.start, self.end)
+        self.assertEqual(vfreebusy.dtstart.value, self.start)
+        lines = vfreebusy.contents['freebusy']
+        self.assertEqual(
+            [period[0].isoformat() for period in lines[0].value],
+            ['2018-01-15T00:00:00+00:00', '2018-01-18T14:00:00+00:00',
+             '2018-01-26T09:00:00+00:00'])
+        self.assertEqual(lines[0].value[0][1].isoformat(),
+                         '2018-01-18T00:00:00+00:00')
+        self.assertEqual(lines[1].fbtype_param, 'BUSY-TENTATIVE')
+        self.assertEqual(
+            lines[1].value,
+            [(datetime.datetime(2018, 1, 20, 9, tzinfo=utc),
+              datetime.datetime(2018, 1, 20, 11, tzinfo=utc))])
+        vfreebusy.serialize()
+
+    def test_busy_timeline(self):
+        """
+        The timeline follows events as they're added, changed and removed
+        """
+        timeline = BusyTimeline([self.cal], self.start, self.end)
+        event = self.cal.add('vevent')
+        event.add('uid').value = 'new@example.com'
+        event.add('dtstart').value = datetime.datetime(2018, 1, 18, 15,
+                                                       tzinfo=utc)
+        event.add('duration').value = datetime.timedelta(hours=1)
+        timeline.update(event)
+        self.assertEqual(
+            timeline.periods()['BUSY'][1],
+            (datetime.datetime(2018, 1, 18, 14, tzinfo=utc),
+             datetime.datetime(2018, 1, 18, 16, tzinfo=utc)))
+
+        event.add('status').value = 'CANCELLED'
+        timeline.update(event)
+        self.assertEqual(
+            timeline.periods()['BUSY'][1],
+            (datetime.datetime(2018, 1, 18, 14, tzinfo=utc),
+             datetime.datetime(2018, 1, 18, 15, tzinfo=utc)))
+
+        # removing the override brings back the instance it replaced
+        self.cal.remove(self.cal.vevent_list[1])
+        self.assertEqual(
+            timeline.periods()['BUSY'][1:],
+            [(datetime.datetime(2018, 1, 19, 9, tzinfo=utc),
+              datetime.datetime(2018, 1, 19, 10, tzinfo=utc)),
+             (datetime.datetime(2018, 1, 26, 9, tzinfo=utc),
+              datetime.datetime(2018, 1, 26, 10, tzinfo=utc))])
+
+    def test_busy_periods(self):
+        """
+        FREEBUSY lines are read into sorted arrays, queried and merged
+        """
+        text = get_test_file("freebusy.ics")
+        native = BusyPeriods.fromComponents([base.readOne(text)])
+        periods = BusyPeriods.fromComponents(
+            [base.readOne(text, transform=False)])
+        self.assertEqual(native.types, periods.types)
+        self.assertEqual(
+            list(periods.periods()),
+            [(datetime.datetime(2006, 2, 16, 1, tzinfo=utc),
+              datetime.datetime(2006, 2, 16, 3, tzinfo=utc))])
+
+        other = base.newFromBehavior('vfreebusy')
+        other.add('freebusy').value = (
+            '20060216T020000Z/PT2H,20060217T090000Z/20060217T100000Z')
+        unavailable = other.add('freebusy')
+        unavailable.value = '20060216T060000Z/PT1H'
+        unavailable.fbtype_param = 'BUSY-UNAVAILABLE'
+        merged = BusyPeriods.merge([periods,
+                                    BusyPeriods.fromComponents([other])])
+        self.assertEqual(len(merged), 3)
+
+        def hour(day, hour):
+            return datetime.datetime(2006, 2, day, hour, tzinfo=utc)
+        self.assertTrue(merged.isBusy(hour(16, 3), hour(16, 4)))
+        self.assertFalse(merged.isBusy(hour(16, 4), hour(16, 6)))
+        self.assertFalse(merged.isBusy(hour(16, 6), hour(16, 7), ['BUSY']))
+        self.assertEqual(
+            merged.overlapping(hour(16, 0), hour(17, 9)),
+            [(hour(16, 1), hour(16, 4), 'BUSY'),
+             (hour(16, 6), hour(16, 7), 'BUSY-UNAVAILABLE')])
+
+    def test_find_free_slots(self):
+        """
+        Free slots of several attendees, within working hours
+        """
+        other = base.newFromBehavior('vfreebusy')
+        other.add('freebusy').value = '20180118T090000Z/PT2H'
+
+        def hour(day, hour):
+            return datetime.datetime(2018, 1, day, hour, tzinfo=utc)
+        for resolution in None, datetime.timedelta(minutes=30):
+            slots = findFreeSlots(
+                [self.cal, other], hour(15, 0), hour(20, 0),
+                datetime.timedelta(hours=1), count=4,
+                workingHours=(datetime.time(9), datetime.time(17)),
+                resolution=resolution)
+            self.assertEqual(slots, [(hour(18, 11), hour(18, 12)),
+                                     (hour(18, 12), hour(18, 13)),
+                                     (hour(18, 13), hour(18, 14)),
+                                     (hour(18, 15), hour(18, 16))])
+        # the 20th is a Saturday
+        slots = findFreeSlots([self.cal, other], hour(18, 16), hour(22, 0),
+                              datetime.timedelta(hours=2), count=2,
+                              workingHours=(datetime.time(9),
+                                            datetime.time(17)))
+        self.assertEqual(slots, [(hour(19, 9), hour(19, 11)),
+                                 (hour(19, 11), hour(19, 13))])
+
+    def test_find_conflicts(self):
+        """
+        Overlapping occurrences are reported, transparent events ignored
+        """
+        def add(uid, hour, minutes, transp=None):
+            event = self.cal.add('vevent')
+            event.add('uid').value = uid
+            event.add('dtstart').value = datetime.datetime(
+                2018, 1, 26, int(hour), int(hour % 1 * 60), tzinfo=utc)
+            event.add('duration').value = datetime.timedelta(minutes=minutes)
+            if transp is not None:
+                event.add('transp').value = transp
+        add('lunch@example.com', 9.5, 90)
+        add('call@example.com', 10, 15)
+        add('reminder@example.com', 9, 60, 'TRANSPARENT')
+        add('later@example.com', 11, 60)
+
+        conflicts = findConflicts(self.cal, self.start, self.end)
+        self.assertEqual(
+            [(earlier.uid, later.uid) for earlier, later in conflicts],
+            [('allday@example.com', 'floating@example.com'),
+             ('weekly@example.com', 'lunch@example.com'),
+             ('lunch@example.com', 'call@example.com')])
+        self.assertEqual(findConflicts(self.cal,
+                                       datetime.datetime(2018, 1, 26, 10, 30,
+                                                         tzinfo=utc),
+                                       self.end), [])
+
+    def test_availability(self):
+        """
+        AVAILABLE occurrences are free, PRIORITY layers VAVAILABILITYs
+        """
+        cal = base.readOne(get_test_file("availability_layers.ics"))
+        evaluator = AvailabilityEvaluator([cal])
+
+        def hour(day, hour):
+            return datetime.datetime(2018, 1, day, hour, tzinfo=utc)
+        periods = evaluator.periods(hour(17, 0), hour(20, 0))
+        self.assertEqual(
+            periods,
+            [(hour(17, 0), hour(17, 12), 'BUSY-UNAVAILABLE'),
+             # the overridden instance starts later
+             (hour(17, 12), hour(17, 16), 'FREE'),
+             (hour(17, 16), hour(17, 23), 'BUSY-UNAVAILABLE'),
+             # the higher priority conference day
+             (hour(17, 23), hour(18, 11), 'BUSY'),
+             (hour(18, 11), hour(18, 12), 'FREE'),
+             (hour(18, 12), hour(18, 23), 'BUSY'),
+             (hour(18, 23), hour(19, 8), 'BUSY-UNAVAILABLE'),
+             (hour(19, 8), hour(19, 16), 'FREE'),
+             (hour(19, 16), hour(20, 0), 'BUSY-UNAVAILABLE')])
+
+        # expanded AVAILABLE blocks are reused, until they change
+        cached = len(evaluator.cache)
+        self.assertEqual(evaluator.periods(hour(17, 0), hour(20, 0)),
+                         periods)
+        self.assertEqual(len(evaluator.cache), cached)
+        weekdays = cal.vavailability.available
+        weekdays.dtend.value = weekdays.dtend.value.replace(hour=18)
+        self.assertEqual(evaluator.periods(hour(19, 0), hour(20, 0))[1],
+                         (hour(19, 8), hour(19, 17), 'FREE'))
+
+        slots = findFreeSlots([evaluator], hour(17, 0), hour(20, 0),
+                              datetime.timedelta(hours=3))
+        self.assertEqual(slots, [(hour(17, 12), hour(17, 15))])
+
+
+class TestAlarms(unittest.TestCase):
+    """
+    Tests for the alarm index
+    """
+    def setUp(self):
+        self.cal = base.readOne(get_test_file("recurrence_overrides.ics"))
+        master, moved = self.cal.vevent_list[:2]
+        alarm = master.add('valarm')
+        alarm.add('action').value = 'DISPLAY'
+        alarm.add('trigger').value = datetime.timedelta(minutes=-15)
+        alarm.add('repeat').value = '1'
+        alarm.add('duration').value = datetime.timedelta(minutes=5)
+        alarm = moved.add('valarm')
+        alarm.add('action').value = 'DISPLAY'
+        trigger = alarm.add('trigger')
+        trigger.value = datetime.timedelta(0)
+        trigger.related_param = 'END'
+        alarm = self.cal.vtodo.add('valarm')
+        alarm.add('action').value = 'AUDIO'
+        alarm.add('trigger').value = datetime.datetime(2018, 1, 17, 11,
+                                                       tzinfo=utc)
+
+    def test_pop_due(self):
+        """
+        Relative, absolute, repeated and RELATED=END triggers, in order
+        """
+        index = AlarmIndex([self.cal],
+                           datetime.datetime(2018, 1, 10, tzinfo=utc))
+        self.assertEqual(index.nextTrigger(),
+                         datetime.datetime(2018, 1, 17, 11, tzinfo=utc))
+        due = index.popDue(datetime.datetime(2018, 1, 27, tzinfo=utc))
+        self.assertEqual(
+            [(trigger.time.astimezone(utc).strftime('%d %H:%M'),
+              trigger.component.uid.value, trigger.repetition)
+             for trigger in due],
+            [('17 11:00', 'todo@example.com', 0),
+             # the end of the moved instance
+             ('18 15:00', 'weekly@example.com', 0),
+             ('26 08:45', 'weekly@example.com', 0),
+             ('26 08:50', 'weekly@example.com', 1)])
+        self.assertTrue(due[0].occurrence is None)
+        self.assertEqual(due[2].occurrence.recurrenceId,
+                         due[2].occurrence.start)
+        self.assertEqual(index.popDue(datetime.datetime(2018, 1, 27,
+                                                        tzinfo=utc)), [])
+        self.assertEqual(index.nextTrigger().astimezone(utc),
+                         datetime.datetime(2018, 2, 2, 8, 45, tzinfo=utc))
+
+    def test_incremental(self):
+        """
+        Changed, added and removed components are taken into account
+        """
+        start = datetime.datetime(2018, 1, 20, tzinfo=utc)
+        index = AlarmIndex([self.cal], start)
+        master = self.cal.vevent
+        master.valarm.trigger.value = datetime.timedelta(hours=-1)
+        index.update(master)
+        self.assertEqual(index.nextTrigger(),
+                         datetime.datetime(2018, 1, 26, 8, tzinfo=utc))
+
+        event = self.cal.add('vevent')
+        event.add('uid').value = 'new@example.com'
+        event.add('dtstart').value = datetime.datetime(2018, 1, 22, 12,
+                                                       tzinfo=utc)
+        event.add('valarm').add('trigger').value = datetime.timedelta(0)
+        index.update(event)
+        self.assertEqual(index.nextTrigger(),
+                         datetime.datetime(2018, 1, 22, 12, tzinfo=utc))
+        self.cal.remove(event)
+        self.cal.remove(master)
+        self.assertEqual(index.popDue(datetime.datetime(2018, 3, 1,
+                                                        tzinfo=utc)), [])
+        self.assertEqual(index.nextTrigger(), None)
+
+
+@unittest.skipIf(vectorized.numpy is None, "NumPy is not installed")
+class TestVectorized(unittest.TestCase):
+    """
+    Tests for expanding components into NumPy arrays
+    """
+    def assertSameOccurrences(self, cal, start, end):
+        components = cal.vevent_list + cal.vtodo_list
+        starts, ends, index = vectorized.expandArrays(components, start, end)
+        positions = dict((id(c), i) for i, c in enumerate(components))
+
+        def naiveUTC(dt):
+            return localize(dt, utc).astimezone(utc).replace(tzinfo=None)
+
+        expected = sorted(
+            (naiveUTC(o.start), naiveUTC(o.end), positions[id(o.component)])
+            for o in expand(cal, start, end))
+        got = sorted(zip(starts.tolist(), ends.tolist(), index.tolist()))
+        self.assertEqual(got, expected)
+
+    def test_expand_arrays(self):
+        """
+        expandArrays agrees with expand, across DST transitions too
+        """
+        cal = base.readOne(get_test_file("recurrence_overrides.ics"))
+        berlin = icalendar.getTzid('Europe/Berlin')
+        for n, rule in enumerate([u"FREQ=DAILY;INTERVAL=3;COUNT=40",
+                                  u"FREQ=WEEKLY;INTERVAL=2;BYDAY=SU,MO,FR",
+                                  u"FREQ=DAILY;BYDAY=MO,WE;UNTIL=20180401T000000Z"]):
+            vevent = cal.add('vevent')
+            vevent.add('uid').value = u"vectorized-{0}".format(n)
+            vevent.add('dtstart').value = datetime.datetime(2017, 12, 30, 1,
+                                                            tzinfo=berlin)
+            vevent.add('duration').value = datetime.timedelta(hours=2)
+            vevent.add('rrule').value = rule
+            vevent.add('exdate').value = [
+                datetime.datetime(2018, 3, 26, 1, tzinfo=berlin)]
+        self.assertSameOccurrences(cal,
+                                   datetime.datetime(2018, 1, 1, tzinfo=utc),
+                                   datetime.datetime(2018, 5, 1, tzinfo=utc))
+
 
 class TestChangeTZ(unittest.TestCase):
     """
@@ -76,8 +76,26 @@ VObject Overview
 
 """
 
-from .base import newFromBehavior, readOne, readComponents
-from . import icalendar, vcard
+import importlib
+import sys
+
+from .base import newFromBehavior, readOne, readComponents, ParseContext, \
+    ParseLimits, ParseStats
+
+if sys.version_info < (3, 7):
+    from . import icalendar, vcard
+else:
+    def __getattr__(name):
+        """
+        Import icalendar and vcard when first used, not with vobject.
+
+        Parsing or creating their components imports them too, so a program
+        reading only vCards never loads iCalendar's dependencies.
+        """
+        if name in ('icalendar', 'vcard'):
+            return importlib.import_module('.' + name, __name__)
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(
+            __name__, name))
 
 
 def iCalendar():
@@ -0,0 +1,278 @@
+"""
+Find the VALARMs of calendars as they become due.
+
+An AlarmIndex keeps the next trigger times of the VEVENTs and VTODOs of
+calendars in a priority queue.  Recurring components are expanded lazily,
+one occurrence at a time as the previous ones' alarms become due, so the
+index stays small and cheap to build for large calendars::
+
+    index = AlarmIndex(calendars, now)
+    while True:
+        for trigger in index.popDue(now):
+            notify(trigger.alarm, trigger.occurrence)
+        ...
+"""
+
+import collections
+import datetime
+import heapq
+import itertools
+
+from .icalendar import utc
+from .intervals import iterComponent
+from .occurrences import getOverrideIndex, localize
+
+zeroDelta = datetime.timedelta(0)
+
+# components whose VALARMs are indexed
+ALARMED = ('VEVENT', 'VTODO')
+
+
+AlarmTrigger = collections.namedtuple(
+    'AlarmTrigger', ('time', 'alarm', 'component', 'occurrence', 'repetition'))
+AlarmTrigger.__doc__ = """
+One time a VALARM triggers.
+
+time is an aware datetime.  component is the VEVENT or VTODO the alarm
+belongs to, occurrence the L{Occurrence<vobject.occurrences.Occurrence>} it
+triggers for, None for alarms with an absolute DATE-TIME trigger, which
+trigger once even for recurring components.  repetition counts the REPEATs,
+0 for the first trigger.
+"""
+
+
+def alarmTrigger(alarm):
+    """
+    Return (trigger, related, repeat, interval) for alarm.
+
+    trigger is a timedelta or an aware datetime, related is 'START' or
+    'END', the alarm is repeated repeat times, interval apart.
+    """
+    line = alarm.contents.get('trigger')
+    trigger = zeroDelta if line is None else line[0].value
+    related = 'START'
+    if line is not None:
+        related = line[0].params.get('RELATED', ['START'])[0].upper()
+    try:
+        repeat = int(alarm.getChildValue('repeat') or 0)
+    except ValueError:
+        repeat = 0
+    interval = alarm.getChildValue('duration')
+    if interval is None:
+        repeat = 0
+    return trigger, related, repeat, interval
+
+
+def absoluteTimes(alarm, tzinfo):
+    """
+    Yield (time, repetition) for an alarm with a DATE-TIME trigger.
+    """
+    trigger, related, repeat, interval = alarmTrigger(alarm)
+    if isinstance(trigger, datetime.datetime):
+        trigger = localize(trigger, tzinfo)
+        for repetition in range(repeat + 1):
+            yield trigger, repetition
+            if repetition < repeat:
+                trigger += interval
+
+
+def relativeTimes(alarm, occurrence, tzinfo):
+    """
+    Yield (time, repetition) for an alarm with a DURATION trigger, for an
+    occurrence.
+    """
+    trigger, related, repeat, interval = alarmTrigger(alarm)
+    if isinstance(trigger, datetime.timedelta):
+        if related == 'END':
+            time = localize(occurrence.end, tzinfo) + trigger
+        else:
+            time = localize(occurrence.start, tzinfo) + trigger
+        for repetition in range(repeat + 1):
+            yield time, repetition
+            if repetition < repeat:
+                time += interval
+
+
+def alarmReach(component):
+    """
+    Return how long before the start of an occurrence its relative alarms
+    may trigger, and how long after, counting repeats.
+    """
+    before = after = zeroDelta
+    for alarm in component.contents.get('valarm', ()):
+        trigger, related, repeat, interval = alarmTrigger(alarm)
+        if isinstance(trigger, datetime.timedelta):
+            last = trigger + (repeat * interval if repeat else zeroDelta)
+            before = max(before, -trigger)
+            after = max(after, last)
+    return before, after
+
+
+class AlarmIndex(object):
+    """
+    A priority queue of the trigger times of calendars' VALARMs, from start
+    on.
+
+    The queue holds the triggers of absolute alarms, and, for each VEVENT
+    and VTODO with relative alarms, its next occurrence keyed by the earliest
+    time its alarms may trigger.  When that time comes, the occurrence's
+    triggers are queued and the component's next occurrence taken.
+
+    The index observes the calendars, components added and removed with
+    add and remove are taken into account.  Call update after changing a
+    component or its alarms.  Triggers already returned by popDue aren't
+    returned again.
+    """
+    def __init__(self, calendars, start, tzinfo=None):
+        if tzinfo is None:
+            tzinfo = getattr(start, 'tzinfo', None) or utc
+        self.tzinfo = tzinfo
+        self.start = localize(start, tzinfo)
+        # triggers before this time have been returned, or were in the past
+        self.after = self.start
+        self.inclusive = True
+        self.heap = []
+        self.counter = itertools.count()
+        # id(component): (component, calendar, version)
+        self.entries = {}
+        self.versions = itertools.count()
+        for calendar in calendars:
+            for name in ALARMED:
+                for component in calendar.contents.get(name.lower(), ()):
+                    self.add(component, calendar)
+            calendar.addObserver(self)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def childAdded(self, parent, child):
+        if child.name in ALARMED:
+            self.add(child, parent)
+            self.updateMaster(child, parent)
+
+    def childRemoved(self, parent, child):
+        if child.name in ALARMED:
+            self.discard(child)
+            self.updateMaster(child, parent)
+
+    def updateMaster(self, component, calendar):
+        if 'recurrence-id' in component.contents:
+            uid = component.getChildValue('uid')
+            master = getOverrideIndex(calendar).master(uid)
+            if master is not None and master is not component:
+                self.update(master)
+
+    def isPending(self, time):
+        return time > self.after or (self.inclusive and time == self.after)
+
+    def add(self, component, calendar):
+        """
+        Queue the triggers of component's alarms.
+        """
+        version = next(self.versions)
+        self.entries[id(component)] = (component, calendar, version)
+        alarms = component.contents.get('valarm', ())
+        if not alarms:
+            return
+        relative = False
+        for alarm in alarms:
+            for time, repetition in absoluteTimes(alarm, self.tzinfo):
+                self.pushTrigger(AlarmTrigger(time, alarm, component, None,
+                                              repetition), version)
+            if isinstance(alarmTrigger(alarm)[0], datetime.timedelta):
+                relative = True
+        if relative:
+            before, after = alarmReach(component)
+            index = getOverrideIndex(calendar)
+            index.refresh()
+            occurrences = iterComponent(component, self.after - after,
+                                        self.tzinfo, index)
+            self.pushOccurrence(component, occurrences, version)
+
+    def discard(self, component):
+        """
+        Forget component's triggers.
+        """
+        # queued entries of old versions are skipped when they're popped
+        self.entries.pop(id(component), None)
+
+    def update(self, component):
+        """
+        Queue the triggers of component again, after it or its alarms changed.
+        """
+        entry = self.entries.get(id(component))
+        if entry is not None:
+            self.add(component, entry[1])
+            self.updateMaster(component, entry[1])
+
+    def pushTrigger(self, trigger, version):
+        if self.isPending(trigger.time):
+            heapq.heappush(self.heap, (trigger.time, next(self.counter),
+                                       version, trigger))
+
+    def pushOccurrence(self, component, occurrences, version):
+        """
+        Queue the next occurrence of component, keyed by the earliest time
+        its alarms may trigger.
+        """
+        for occurrence in occurrences:
+            before = alarmReach(occurrence.component)[0]
+            key = localize(occurrence.start, self.tzinfo) - before
+            heapq.heappush(self.heap, (key, next(self.counter), version,
+                                       (component, occurrence, occurrences)))
+            return
+
+    def isCurrent(self, version, component):
+        entry = self.entries.get(id(component))
+        return entry is not None and entry[2] == version
+
+    def advance(self, now):
+        """
+        Queue the triggers of occurrences whose alarms may trigger by now.
+        """
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            key, tiebreaker, version, item = heap[0]
+            if isinstance(item, AlarmTrigger):
+                if not self.isCurrent(version, item.component):
+                    heapq.heappop(heap)
+                    continue
+                return
+            heapq.heappop(heap)
+            component, occurrence, occurrences = item
+            if not self.isCurrent(version, component):
+                continue
+            # a RANGE=THISANDFUTURE override's alarms replace the master's
+            for alarm in occurrence.component.contents.get('valarm', ()):
+                for time, repetition in relativeTimes(alarm, occurrence,
+                                                      self.tzinfo):
+                    self.pushTrigger(AlarmTrigger(time, alarm, component,
+                                                  occurrence, repetition),
+                                     version)
+            self.pushOccurrence(component, occurrences, version)
+
+    def popDue(self, now):
+        """
+        Return the triggers due by now, an aware datetime, in order, and
+        remove them from the queue.
+        """
+        due = []
+        while True:
+            self.advance(now)
+            if not self.heap or self.heap[0][0] > now:
+                break
+            due.append(heapq.heappop(self.heap)[3])
+        if now >= self.after:
+            self.after, self.inclusive = now, False
+        return due
+
+    def nextTrigger(self):
+        """
+        Return the time of the next trigger, or None if there's none.
+        """
+        heap = self.heap
+        while heap:
+            self.advance(heap[0][0])
+            if heap and isinstance(heap[0][3], AlarmTrigger):
+                return heap[0][0]
+        return None
@@ -2,12 +2,17 @@
 
 from __future__ import print_function
 
+import collections
 import copy
 import codecs
+import importlib
 import logging
 import re
 import six
 import sys
+import threading
+
+from timeit import default_timer as clock
 
 # ------------------------------------ Python 2/3 compatibility challenges  ----
 # Python 3 no longer has a basestring type, so....
@@ -83,6 +88,303 @@ SPACE = ' '
 TAB = '\t'
 SPACEORTAB = SPACE + TAB
 
+# ------------------------------- Parse context --------------------------------
+_parseState = threading.local()
+
+
+class ParseContext(object):
+    """
+    State scoped to a batch of parsing or serialization work.
+
+    Timezones defined by VTIMEZONEs are normally registered in a module-global
+    TZID registry, so concurrent parses race, and one stream's definition of a
+    TZID like "Eastern" is used for every later stream.  While a ParseContext
+    is active, TZIDs are registered in the context instead, and the global
+    registry is only read, as a fallback.
+
+    Pass a ParseContext to L{readComponents}, L{readOne} or
+    L{VBase.serialize}, or activate it for a block of code with a with
+    statement.  A context is active only in the thread that activated it, use
+    one context per thread (or per document) to parse in a thread pool; no
+    locks are needed.
+
+    @ivar tzids:
+        A dictionary of TZIDs registered while this context was active.
+    @ivar caches:
+        A dictionary of caches owned by this context, keyed by name.
+    @ivar options:
+        A dictionary of options, available to behaviors while parsing, like
+        tzPool, a L{TzinfoPool<vobject.icalendar.TzinfoPool>} to share tzinfo
+        objects between documents.
+    """
+    def __init__(self, tzids=None, **options):
+        self.tzids = dict(tzids or {})
+        self.caches = {}
+        self.options = options
+
+    def __enter__(self):
+        previous = _parseState.__dict__.setdefault('previous', [])
+        previous.append(getattr(_parseState, 'context', None))
+        _parseState.context = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _parseState.context = _parseState.previous.pop()
+        return False
+
+    def __repr__(self):
+        return "<ParseContext| {0} TZIDs>".format(len(self.tzids))
+
+
+def getParseContext():
+    """
+    Return the ParseContext active in this thread, or None.
+    """
+    return getattr(_parseState, 'context', None)
+
+
+class _NoContext(object):
+    """
+    Stand-in for a ParseContext when none was given, activates nothing.
+    """
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_noContext = _NoContext()
+
+
+class ParseLimits(object):
+    """
+    Limits on the resources parsing a stream may use, for untrusted input.
+
+    Pass ParseLimits to L{readComponents} or L{readOne}.  Limits are checked
+    as the stream is tokenized, before lines are parsed or components
+    transformed, and exceeding one raises ParseLimitError, a ParseError.
+    Each limit may be None, for no limit.
+
+    @ivar maxLineLength:
+        The most characters in a logical (unfolded) line.
+    @ivar maxParams:
+        The most parameter values in a line, a parameter without a value
+        counts as one.
+    @ivar maxDepth:
+        The most deeply components may be nested, 1 allows no subcomponents.
+    @ivar maxComponents:
+        The most components in the stream, subcomponents included.
+    @ivar maxProperties:
+        The most properties in the stream.
+    """
+    def __init__(self, maxLineLength=None, maxParams=None, maxDepth=None,
+                 maxComponents=None, maxProperties=None):
+        self.maxLineLength = maxLineLength
+        self.maxParams = maxParams
+        self.maxDepth = maxDepth
+        self.maxComponents = maxComponents
+        self.maxProperties = maxProperties
+
+    def __repr__(self):
+        return "<ParseLimits| {0}>".format(", ".join(
+            "{0}={1}".format(name, value)
+            for name, value in sorted(self.__dict__.items())
+            if value is not None))
+
+noLimits = ParseLimits()
+
+
+class ParseStats(object):
+    """
+    Counts and timings of parsing and serialization, for profiling feeds.
+
+    Instrumentation is off unless a ParseStats is passed to
+    L{readComponents}, L{readOne} or L{VBase.serialize}, or activated for a
+    block of code with a with statement, in which case it accumulates over
+    everything parsed and serialized in the block::
+
+        with ParseStats() as stats:
+            calendar = readOne(text)
+            calendar.serialize()
+        metrics.update(stats.metrics())
+
+    Time is split between phases, each timed exclusive of the phases nested
+    in it, so the phases add up to the time spent in vobject:
+
+        - unfold: reading and unfolding lines
+        - parseLine: splitting lines into name, parameters and value
+        - decode: setting behaviors and decoding encoded values
+        - validate: validating components
+        - transform: transforming values to Python types
+        - tz: building tzinfos from VTIMEZONEs and resolving unknown TZIDs
+        - serialize: encoding, transforming back and folding lines
+
+    Like a ParseContext, a ParseStats is active only in the thread that
+    activated it, use one per thread.
+
+    To find the individual components which are slow, give a threshold in
+    seconds.  Each component, or transformed property, taking longer than
+    that to be read, transformed, serialized, to have its rruleset built or
+    to be expanded into occurrences is passed to onSlow, as a
+    L{SlowComponent}, or logged as a warning if onSlow is None::
+
+        stats = ParseStats(slowThreshold=0.5, onSlow=slow.append)
+
+    @ivar lines:
+        The number of logical lines read.
+    @ivar components:
+        The number of components read, subcomponents included.
+    @ivar properties:
+        The number of properties read.
+    @ivar serialized:
+        The number of components serialized, subcomponents included.
+    @ivar times:
+        A dictionary of seconds spent in each phase.
+    @ivar behaviors:
+        A dictionary of [count, seconds] transforming to native values, by
+        behavior class name, including the time of nested components.
+    @ivar slowThreshold:
+        Seconds after which a component is reported to onSlow, or None.
+    @ivar onSlow:
+        A function called with a L{SlowComponent}, or None.
+    """
+    phases = ('unfold', 'parseLine', 'decode', 'validate', 'transform', 'tz',
+              'serialize')
+
+    def __init__(self, slowThreshold=None, onSlow=None):
+        self.slowThreshold = slowThreshold
+        self.onSlow = onSlow
+        self.reset()
+
+    def reset(self):
+        """
+        Set all counts and times to zero.
+        """
+        self.lines = self.components = self.properties = self.serialized = 0
+        self.times = dict((phase, 0.0) for phase in self.phases)
+        self.behaviors = {}
+        self.running = []
+        self.since = None
+
+    def __enter__(self):
+        previous = _parseState.__dict__.setdefault('previousStats', [])
+        previous.append(getattr(_parseState, 'stats', None))
+        _parseState.stats = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _parseState.stats = _parseState.previousStats.pop()
+        return False
+
+    def enter(self, phase):
+        """
+        Start timing phase, pausing the phase it's nested in.
+        """
+        now = clock()
+        if self.running:
+            self.times[self.running[-1]] += now - self.since
+        self.running.append(phase)
+        self.since = now
+
+    def leave(self):
+        """
+        Stop timing the current phase, resuming the one it's nested in.
+        """
+        now = clock()
+        self.times[self.running.pop()] += now - self.since
+        self.since = now
+
+    def phase(self, phase):
+        """
+        Return a context manager timing phase.
+        """
+        return _Phase(self, phase)
+
+    def addBehavior(self, behavior, seconds):
+        entry = self.behaviors.get(behavior.__name__)
+        if entry is None:
+            self.behaviors[behavior.__name__] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def checkSlow(self, where, obj, seconds, parent=None):
+        """
+        Report obj if it took longer than slowThreshold.
+
+        where is what was slow: read, transform, rruleset, expand or
+        serialize.  The UID of a property is its parent component's.
+        """
+        if self.slowThreshold is None or seconds < self.slowThreshold:
+            return
+        if isinstance(obj, Component):
+            parent = obj
+        uid = parent.getChildValue('uid') if parent is not None else None
+        slow = SlowComponent(where, obj.name, uid, obj.lineNumber, seconds)
+        if self.onSlow is None:
+            logger.warning("Slow {0}: {1} UID {2} at line {3}, {4:.3f}s"
+                           .format(*slow))
+        else:
+            self.onSlow(slow)
+
+    def metrics(self, prefix='vobject'):
+        """
+        Return a flat dictionary of the counts and times, with dotted names
+        like vobject.time.parseLine, for a metrics system.
+        """
+        metrics = {}
+        for name in ('lines', 'components', 'properties', 'serialized'):
+            metrics['{0}.{1}'.format(prefix, name)] = getattr(self, name)
+        for phase, seconds in self.times.items():
+            metrics['{0}.time.{1}'.format(prefix, phase)] = seconds
+        for name, (count, seconds) in self.behaviors.items():
+            metrics['{0}.behavior.{1}.count'.format(prefix, name)] = count
+            metrics['{0}.behavior.{1}.time'.format(prefix, name)] = seconds
+        return metrics
+
+    def __repr__(self):
+        return "<ParseStats| {0} lines, {1} components, {2:.3f}s>".format(
+            self.lines, self.components, sum(self.times.values()))
+
+
+SlowComponent = collections.namedtuple(
+    'SlowComponent', ('where', 'name', 'uid', 'lineNumber', 'seconds'))
+SlowComponent.__doc__ = """
+A component or property which took seconds to process, where is read,
+transform, rruleset, expand or serialize.  uid and lineNumber may be None.
+"""
+
+
+class _Phase(object):
+    def __init__(self, stats, phase):
+        self.stats = stats
+        self.phase = phase
+
+    def __enter__(self):
+        self.stats.enter(self.phase)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.leave()
+        return False
+
+
+def getParseStats():
+    """
+    Return the ParseStats active in this thread, or None.
+    """
+    return getattr(_parseState, 'stats', None)
+
+
+def timedPhase(phase):
+    """
+    Return a context manager timing phase in the active ParseStats, if any.
+    """
+    stats = getattr(_parseState, 'stats', None)
+    if stats is None:
+        return _noContext
+    return _Phase(stats, phase)
+
+
 # --------------------------------- Main classes -------------------------------
 
 
@@ -239,23 +541,52 @@ class VBase(object):
         """
         pass
 
-    def serialize(self, buf=None, lineLength=75, validate=True, behavior=None):
+    def serialize(self, buf=None, lineLength=75, validate=True, behavior=None,
+                  context=None, stats=None):
         """
         Serialize to buf if it exists, otherwise return a string.
 
-        Use self.behavior.serialize if behavior exists.
+        Use self.behavior.serialize if behavior exists.  If context, a
+        L{ParseContext}, is given, it's active while serializing.  If stats, a
+        L{ParseStats}, is given, or one is active, serializing is timed.
         """
         if not behavior:
             behavior = self.behavior
-
-        if behavior:
-            if DEBUG:
-                logger.debug("serializing {0!s} with behavior {1!s}".format(self.name, behavior))
-            return behavior.serialize(self, buf, lineLength, validate)
+        if stats is None:
+            stats = getattr(_parseState, 'stats', None)
+        if stats is None:
+            return self._serialize(buf, lineLength, validate, behavior,
+                                   context)
+
+        # serializing done by another phase, like building a tzinfo,
+        # belongs to that phase
+        running = stats.running
+        if running and running[-1] != 'serialize':
+            return self._serialize(buf, lineLength, validate, behavior,
+                                   context)
+        start = clock()
+        if running:
+            out = self._serialize(buf, lineLength, validate, behavior,
+                                  context)
         else:
-            if DEBUG:
-                logger.debug("serializing {0!s} without behavior".format(self.name))
-            return defaultSerialize(self, buf, lineLength)
+            with stats, stats.phase('serialize'):
+                out = self._serialize(buf, lineLength, validate, behavior,
+                                      context)
+        if isinstance(self, Component):
+            stats.serialized += 1
+            stats.checkSlow('serialize', self, clock() - start)
+        return out
+
+    def _serialize(self, buf, lineLength, validate, behavior, context):
+        with context or _noContext:
+            if behavior:
+                if DEBUG:
+                    logger.debug("serializing {0!s} with behavior {1!s}".format(self.name, behavior))
+                return behavior.serialize(self, buf, lineLength, validate)
+            else:
+                if DEBUG:
+                    logger.debug("serializing {0!s} without behavior".format(self.name))
+                return defaultSerialize(self, buf, lineLength)
 
 
 def toVName(name, stripNum=0, upper=False):
@@ -464,7 +795,11 @@ class Component(VBase):
     @ivar useBegin:
         A boolean flag determining whether BEGIN: and END: lines should
         be serialized.
+    @ivar lineNumber:
+        The line number of the BEGIN line, if the component was parsed.
     """
+    lineNumber = None
+
     def __init__(self, name=None, *args, **kwds):
         super(Component, self).__init__(*args, **kwds)
         self.contents = {}
@@ -609,6 +944,8 @@ class Component(VBase):
                 if isinstance(obj, ContentLine):
                     obj.behavior = self.behavior.defaultBehavior
         self.contents.setdefault(obj.name.lower(), []).append(obj)
+        for observer in self.__dict__.get('observers', ()):
+            observer.childAdded(self, obj)
         return obj
 
     def remove(self, obj):
@@ -622,7 +959,28 @@ class Component(VBase):
                 if len(named) == 0:
                     del self.contents[obj.name.lower()]
             except ValueError:
-                pass
+                return
+            for observer in self.__dict__.get('observers', ()):
+                observer.childRemoved(self, obj)
+
+    def addObserver(self, observer):
+        """
+        Call observer.childAdded(self, child) and
+        observer.childRemoved(self, child) when children are added or removed.
+
+        Lets indexes over a component's children stay up to date.  Only add
+        and remove are observed, not children set as attributes, like
+        component.vevent_list = [].
+        """
+        self.__dict__.setdefault('observers', []).append(observer)
+
+    def removeObserver(self, observer):
+        """
+        Stop calling observer when children are added or removed.
+        """
+        observers = self.__dict__.get('observers', [])
+        if observer in observers:
+            observers.remove(observer)
 
     def getChildren(self):
         """
@@ -667,12 +1025,36 @@ class Component(VBase):
         Recursively replace children with their native representation.
 
         Sort to get dependency order right, like vtimezone before vevent.
+        If a L{ParseStats} is active, transforming is timed and slow children
+        are reported to it.
         """
+        stats = getattr(_parseState, 'stats', None)
+        if stats is not None:
+            with stats.phase('transform'):
+                self._transformChildrenWithStats(stats)
+            return
         for childArray in (self.contents[k] for k in self.sortChildKeys()):
             for child in childArray:
                 child = child.transformToNative()
                 child.transformChildrenToNative()
 
+    def _transformChildrenWithStats(self, stats):
+        """
+        Like transformChildrenToNative, timing each child's behavior and
+        reporting slow children.
+        """
+        for childArray in (self.contents[k] for k in self.sortChildKeys()):
+            for child in childArray:
+                behavior = child.behavior
+                start = clock()
+                child = child.transformToNative()
+                if isinstance(child, Component):
+                    child._transformChildrenWithStats(stats)
+                seconds = clock() - start
+                if behavior is not None:
+                    stats.addBehavior(behavior, seconds)
+                stats.checkSlow('transform', child, seconds, self)
+
     def transformChildrenFromNative(self, clearBehavior=True):
         """
         Recursively transform native children to vanilla representations.
@@ -727,6 +1109,14 @@ class NativeError(VObjectError):
     pass
 
 
+class ParseLimitError(ParseError):
+    pass
+
+
+class ExpansionLimitError(VObjectError):
+    pass
+
+
 # --------- Parsing functions and parseLine regular expressions ----------------
 
 patterns = {}
@@ -786,34 +1176,58 @@ line_re = re.compile(patterns['line'], re.DOTALL | re.VERBOSE)
 begin_re = re.compile('BEGIN', re.IGNORECASE)
 
 
-def parseParams(string):
+def tooManyParams(maxParams, lineNumber=None):
+    return ParseLimitError("Line has more than {0} parameter values".format(
+                           maxParams), lineNumber)
+
+
+def parseParams(string, maxParams=None, lineNumber=None):
     """
     Parse parameters
+
+    If maxParams is given, ParseError is raised as soon as more parameter
+    values than that are found.
     """
-    all = params_re.findall(string)
     allParameters = []
-    for tup in all:
+    count = 0
+    for match in params_re.finditer(string):
+        tup = match.groups()
         paramList = [tup[0]]  # tup looks like (name, valuesString)
-        for pair in param_values_re.findall(tup[1]):
+        for pair in param_values_re.findall(tup[1] or ''):
             # pair looks like ('', value) or (value, '')
             if pair[0] != '':
                 paramList.append(pair[0])
             else:
                 paramList.append(pair[1])
         allParameters.append(paramList)
+        if maxParams is not None:
+            count += max(len(paramList) - 1, 1)
+            if count > maxParams:
+                raise tooManyParams(maxParams, lineNumber)
     return allParameters
 
 
-def parseLine(line, lineNumber=None):
+def parseLine(line, lineNumber=None, maxParams=None):
     """
     Parse line
+
+    If maxParams is given, lines with more parameter values than that raise
+    ParseError.
     """
+    if maxParams is not None:
+        # before the first colon, semicolons separate parameters unless
+        # they're quoted, so most lines with too many are refused before
+        # matching them
+        colon = line.find(':')
+        if line.count(';', 0, colon) > maxParams and \
+                line.find('"', 0, colon) < 0:
+            raise tooManyParams(maxParams, lineNumber)
     match = line_re.match(line)
     if match is None:
         raise ParseError("Failed to parse line: {0!s}".format(line), lineNumber)
     # Underscores are replaced with dash to work around Lotus Notes
     return (match.group('name').replace('_', '-'),
-            parseParams(match.group('params')),
+            parseParams(match.group('params'), maxParams, lineNumber),
             match.group('value'), match.group('group'))
 
 # logical line regular expressions
@@ -831,6 +1245,7 @@ patterns['wraporend'] = r'({wrap!s} | {lineend!s} )'.format(**patterns)
 
 wrap_re = re.compile(patterns['wraporend'], re.VERBOSE)
 logical_lines_re = re.compile(patterns['logicallines'], re.VERBOSE)
+physical_lines_re = re.compile(r'\r\n|\r|\n')
 
 testLines = """
 Line 0 text
@@ -842,7 +1257,31 @@ Line 2 is a new line, it does not start with whitespace.
 """
 
 
-def getLogicalLines(fp, allowQP=True):
+def lineTooLong(maxLength, lineNumber):
+    return ParseLimitError("Line is longer than {0} characters".format(
+                           maxLength), lineNumber)
+
+
+def checkLineLengths(text, maxLength):
+    """
+    Raise ParseError if a logical line of text is longer than maxLength.
+
+    Matching logical_lines_re against a huge line takes memory proportional
+    to its length, so lines are measured before.
+    """
+    length = 0
+    start = 1
+    for lineNumber, line in enumerate(physical_lines_re.split(text), 1):
+        if line and line[0] in SPACEORTAB:
+            length += len(line) - 1
+        else:
+            length = len(line)
+            start = lineNumber
+        if length > maxLength:
+            raise lineTooLong(maxLength, start)
+
+
+def getLogicalLines(fp, allowQP=True, maxLength=None):
     """
     Iterate through a stream, yielding one logical line at a time.
 
@@ -853,6 +1292,10 @@ def getLogicalLines(fp, allowQP=True):
 
     Quoted-printable data will be decoded in the Behavior decoding phase.
 
+    If maxLength is given, ParseError is raised for logical lines longer than
+    maxLength characters, with quoted-printable lines as soon as that many
+    characters have been read.
+
     # We're leaving this test in for awhile, because the unittest was ugly and dumb.
     >>> from six import StringIO
     >>> f=StringIO(testLines)
@@ -867,6 +1310,8 @@ def getLogicalLines(fp, allowQP=True):
     """
     if not allowQP:
         val = fp.read(-1)
+        if maxLength is not None:
+            checkLineLengths(val, maxLength)
 
         lineNumber = 1
         for match in logical_lines_re.finditer(val):
@@ -881,8 +1326,14 @@ def getLogicalLines(fp, allowQP=True):
         logicalLine = newbuffer()
         lineNumber = 0
         lineStartNumber = 0
+        # whether the logical line mentions quoted-printable, and its last
+        # characters, so it isn't searched again for each physical line
+        qpMarked = False
+        tail = ''
+        # a physical line this long is too long, don't read more of it
+        readLength = -1 if maxLength is None else maxLength + 3
         while True:
-            line = fp.readline()
+            line = fp.readline(readLength)
             if line == '':
                 break
             else:
@@ -893,37 +1344,43 @@ def getLogicalLines(fp, allowQP=True):
                     yield logicalLine.getvalue(), lineStartNumber
                 lineStartNumber = lineNumber
                 logicalLine = newbuffer()
-                quotedPrintable = False
+                quotedPrintable = qpMarked = False
+                tail = ''
                 continue
 
             if quotedPrintable and allowQP:
-                logicalLine.write('\n')
-                logicalLine.write(line)
+                written = '\n' + line
                 quotedPrintable = False
             elif line[0] in SPACEORTAB:
-                logicalLine.write(line[1:])
-            elif logicalLine.tell() > 0:
-                yield logicalLine.getvalue(), lineStartNumber
-                lineStartNumber = lineNumber
-                logicalLine = newbuffer()
-                logicalLine.write(line)
+                written = line[1:]
             else:
+                if logicalLine.tell() > 0:
+                    yield logicalLine.getvalue(), lineStartNumber
+                    lineStartNumber = lineNumber
                 logicalLine = newbuffer()
-                logicalLine.write(line)
+                qpMarked = False
+                tail = ''
+                written = line
+            logicalLine.write(written)
+
+            if maxLength is not None and logicalLine.tell() > maxLength:
+                raise lineTooLong(maxLength, lineStartNumber or lineNumber)
 
             # vCard 2.1 allows parameters to be encoded without a parameter name
             # False positives are unlikely, but possible.
-            val = logicalLine.getvalue()
-            if val[-1] == '=' and val.lower().find('quoted-printable') >= 0:
+            if not qpMarked:
+                tail = (tail[-15:] + written).lower()
+                qpMarked = tail.find('quoted-printable') >= 0
+            if written[-1:] == '=' and qpMarked:
                 quotedPrintable = True
 
         if logicalLine.tell() > 0:
             yield logicalLine.getvalue(), lineStartNumber
 
 
-def textLineToContentLine(text, n=None):
-    return ContentLine(*parseLine(text, n), **{'encoded': True,
-                                               'lineNumber': n})
+def textLineToContentLine(text, n=None, maxParams=None):
+    return ContentLine(*parseLine(text, n, maxParams),
+                       **{'encoded': True, 'lineNumber': n})
 
 
 def dquoteEscape(param):
@@ -1037,6 +1494,45 @@ def defaultSerialize(obj, buf, lineLength):
     return buf or outbuf.getvalue()
 
 
+def _timedLines(lines, stats):
+    """
+    Count and time unfolding the logical lines from getLogicalLines.
+    """
+    lines = iter(lines)
+    while True:
+        stats.enter('unfold')
+        try:
+            line = next(lines)
+        except StopIteration:
+            return
+        finally:
+            stats.leave()
+        stats.lines += 1
+        yield line
+
+
+def _timedParser(stats):
+    """
+    Return textLineToContentLine, counting and timing lines in stats.
+    """
+    def toContentLine(text, n=None, maxParams=None):
+        stats.enter('parseLine')
+        try:
+            vline = textLineToContentLine(text, n, maxParams)
+        finally:
+            stats.leave()
+        if vline.name == "BEGIN":
+            stats.components += 1
+        elif vline.name != "END":
+            stats.properties += 1
+        return vline
+    return toContentLine
+
+
+def _noPhase(phase):
+    return _noContext
+
+
 class Stack:
     def __init__(self):
         self.stack = []
@@ -1073,23 +1569,51 @@ class Stack:
 
 
 def readComponents(streamOrString, validate=False, transform=True,
-                   ignoreUnreadable=False, allowQP=False):
+                   ignoreUnreadable=False, allowQP=False, context=None,
+                   limits=None, stats=None):
     """
     Generate one Component at a time from a stream.
+
+    If context, a L{ParseContext}, is given, it's active while each component
+    is validated and transformed, so TZIDs defined in the stream are
+    registered in the context rather than globally.  If limits, a
+    L{ParseLimits}, is given, input exceeding them raises ParseError, even
+    when ignoreUnreadable is True.  If stats, a L{ParseStats}, is given, or
+    one is active when reading starts, parsing is counted and timed in it.
     """
     if isinstance(streamOrString, basestring):
         stream = six.StringIO(streamOrString)
     else:
         stream = streamOrString
+    if limits is None:
+        limits = noLimits
+    if stats is None:
+        stats = getattr(_parseState, 'stats', None)
+
+    lines = getLogicalLines(stream, allowQP, limits.maxLineLength)
+    if stats is None:
+        toContentLine = textLineToContentLine
+        timed = _noPhase
+    else:
+        lines = _timedLines(lines, stats)
+        toContentLine = _timedParser(stats)
+        timed = stats.phase
+    # when the components read began, to report slow ones
+    began = [] if stats is not None and stats.slowThreshold is not None \
+        else None
 
     try:
         stack = Stack()
         versionLine = None
         n = 0
-        for line, n in getLogicalLines(stream, allowQP):
+        components = properties = 0
+        maxParams = limits.maxParams
+        for line, n in lines:
             if ignoreUnreadable:
                 try:
-                    vline = textLineToContentLine(line, n)
+                    vline = toContentLine(line, n, maxParams)
+                except ParseLimitError:
+                    raise
                 except VObjectError as e:
                     if e.lineNumber is not None:
                         msg = "Skipped line {lineNumber}, message: {msg}"
@@ -1098,12 +1622,33 @@ def readComponents(streamOrString, validate=False, transform=True,
                     logger.error(msg.format(**{'lineNumber': e.lineNumber, 'msg': str(e)}))
                     continue
             else:
-                vline = textLineToContentLine(line, n)
+                vline = toContentLine(line, n, maxParams)
+            if vline.name == "BEGIN":
+                components += 1
+                if (limits.maxComponents is not None and
+                        components > limits.maxComponents):
+                    raise ParseLimitError("Stream has more than {0} components"
+                                          .format(limits.maxComponents), n)
+                if limits.maxDepth is not None and \
+                        len(stack) >= limits.maxDepth:
+                    raise ParseLimitError("Components are nested more than "
+                                          "{0} deep".format(limits.maxDepth),
+                                          n)
+            elif vline.name != "END":
+                properties += 1
+                if (limits.maxProperties is not None and
+                        properties > limits.maxProperties):
+                    raise ParseLimitError("Stream has more than {0} properties"
+                                          .format(limits.maxProperties), n)
             if vline.name == "VERSION":
                 versionLine = vline
                 stack.modifyTop(vline)
             elif vline.name == "BEGIN":
-                stack.push(Component(vline.value, group=vline.group))
+                component = Component(vline.value, group=vline.group)
+                component.lineNumber = n
+                stack.push(component)
+                if began is not None:
+                    began.append(clock())
             elif vline.name == "PROFILE":
                 if not stack.top():
                     stack.push(Component())
@@ -1116,18 +1661,33 @@ def readComponents(streamOrString, validate=False, transform=True,
                 if vline.value.upper() == stack.topName():  # START matches END
                     if len(stack) == 1:
                         component = stack.pop()
-                        if versionLine is not None:
-                            component.setBehaviorFromVersionLine(versionLine)
-                        else:
-                            behavior = getBehavior(component.name)
-                            if behavior:
-                                component.setBehavior(behavior)
-                        if validate:
-                            component.validate(raiseException=True)
-                        if transform:
-                            component.transformChildrenToNative()
+                        with timed('decode'):
+                            if versionLine is not None:
+                                component.setBehaviorFromVersionLine(
+                                    versionLine)
+                            else:
+                                behavior = getBehavior(component.name)
+                                if behavior:
+                                    component.setBehavior(behavior)
+                        with context or _noContext, stats or _noContext:
+                            if validate:
+                                with timed('validate'):
+                                    component.validate(raiseException=True)
+                            if transform:
+                                if stats is None:
+                                    component.transformChildrenToNative()
+                                else:
+                                    with timed('transform'):
+                                        component._transformChildrenWithStats(
+                                            stats)
+                        if began is not None:
+                            stats.checkSlow('read', component,
+                                            clock() - began.pop())
                         yield component  # EXIT POINT
                     else:
+                        if began is not None:
+                            stats.checkSlow('read', stack.top(),
+                                            clock() - began.pop())
                         stack.modifyTop(stack.pop())
                 else:
                     err = "{0} component wasn't closed"
@@ -1148,17 +1708,45 @@ def readComponents(streamOrString, validate=False, transform=True,
 
 
 def readOne(stream, validate=False, transform=True, ignoreUnreadable=False,
-            allowQP=False):
+            allowQP=False, context=None, limits=None, stats=None):
     """
     Return the first component from stream.
     """
     return next(readComponents(stream, validate, transform, ignoreUnreadable,
-                               allowQP))
+                               allowQP, context, limits, stats))
 
 
 # --------------------------- version registry ---------------------------------
+# Behaviors are registered when their modules are imported and only read while
+# parsing, so unlike TZIDs they aren't scoped to a ParseContext
 __behaviorRegistry = {}
 
+# The modules registering the behaviors of each profile and of the components
+# which may be parsed on their own, imported when one of their behaviors is
+# first looked up, so reading vCards doesn't import iCalendar's dependencies
+__profileModules = dict.fromkeys(
+    ('VCALENDAR', 'VEVENT', 'VTODO', 'VJOURNAL', 'VFREEBUSY', 'VTIMEZONE',
+     'STANDARD', 'DAYLIGHT', 'VALARM', 'VAVAILABILITY', 'AVAILABLE'),
+    '.icalendar')
+__profileModules['VCARD'] = '.vcard'
+__unloadedModules = set(__profileModules.values())
+
+
+def loadBehaviors(name=None):
+    """
+    Import the module registering the behaviors of the component name, or
+    all such modules if name is None.
+    """
+    if name is None:
+        modules = sorted(__unloadedModules)
+    elif __profileModules.get(name) in __unloadedModules:
+        modules = [__profileModules[name]]
+    else:
+        return
+    for module in modules:
+        importlib.import_module(module, __package__)
+        __unloadedModules.discard(module)
+
 
 def registerBehavior(behavior, name=None, default=False, id=None):
     """
@@ -1187,6 +1775,8 @@ def getBehavior(name, id=None):
     If id is None, return the default for name.
     """
     name = name.upper()
+    if name not in __behaviorRegistry and __unloadedModules:
+        loadBehaviors(name)
     if name in __behaviorRegistry:
         if id:
             for n, behavior in __behaviorRegistry[name]:
@@ -1203,6 +1793,10 @@ def newFromBehavior(name, id=None):
     """
     name = name.upper()
     behavior = getBehavior(name, id)
+    if behavior is None and __unloadedModules:
+        # name may be a property of a profile which isn't loaded yet
+        loadBehaviors()
+        behavior = getBehavior(name, id)
     if behavior is None:
         raise VObjectError("No behavior found named {0!s}".format(name))
     if behavior.isComponent:
@@ -1218,3 +1812,77 @@ def newFromBehavior(name, id=None):
 def backslashEscape(s):
     s = s.replace("\\", "\\\\").replace(";", "\;").replace(",", "\,")
     return s.replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+
+
+# DQUOTE included to work around iCal's penchant for backslash escaping it,
+# although it isn't actually supposed to be escaped according to rfc2445 TEXT
+escapableCharList = '\\;,Nn"'
+
+
+def stringToTextValues(s, listSeparator=',', charList=None, strict=False):
+    """
+    Returns list of strings.
+    """
+    if charList is None:
+        charList = escapableCharList
+
+    def escapableChar(c):
+        return c in charList
+
+    def error(msg):
+        if strict:
+            raise ParseError(msg)
+        else:
+            logging.error(msg)
+
+    # vars which control state machine
+    charIterator = enumerate(s)
+    state = "read normal"
+
+    current = []
+    results = []
+
+    while True:
+        try:
+            charIndex, char = next(charIterator)
+        except:
+            char = "eof"
+
+        if state == "read normal":
+            if char == '\\':
+                state = "read escaped char"
+            elif char == listSeparator:
+                state = "read normal"
+                current = "".join(current)
+                results.append(current)
+                current = []
+            elif char == "eof":
+                state = "end"
+            else:
+                state = "read normal"
+                current.append(char)
+
+        elif state == "read escaped char":
+            if escapableChar(char):
+                state = "read normal"
+                if char in 'nN':
+                    current.append('\n')
+                else:
+                    current.append(char)
+            else:
+                state = "read normal"
+                # leave unrecognized escaped characters for later passes
+                current.append('\\' + char)
+
+        elif state == "end":  # an end state
+            if len(current) or len(results) == 0:
+                current = "".join(current)
+                results.append(current)
+            return results
+
+        elif state == "error":  # an end state
+            return results
+
+        else:
+            state = "error"
+            error("unknown state: '{0!s}' reached in {1!s}".format(state, s))
@@ -154,7 +154,8 @@ class Behavior(object):
 
         cls.generateImplicitParameters(obj)
         if validate:
-            cls.validate(obj, raiseException=True)
+            with base.timedPhase('validate'):
+                cls.validate(obj, raiseException=True)
 
         if obj.isNative:
             transformed = obj.transformFromNative()
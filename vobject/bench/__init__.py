@@ -0,0 +1,383 @@
+"""
+Benchmarks of parsing, validating, serializing and expanding calendars and
+vCards.
+
+Run the package to time all benchmarks, or the ones named, and print a
+table, or save the results as JSON to compare runs across commits::
+
+    python -m vobject.bench
+    python -m vobject.bench parse serialize --json after.json
+    python -m vobject.bench --compare before.json
+
+Each benchmark builds its input once, then times its workload repeat times.
+The best time is reported, with the throughput in lines, megabytes and
+components per second it gives, and the peak memory allocated while running
+the workload once more with tracemalloc (not available in Python 2).
+
+Synthetic inputs are generated by L{corpus<vobject.bench.corpus>} from a
+fixed seed, so runs are comparable, and scale, a number, multiplies their
+size.  The real corpus is the test files of the
+source tree, or the files given with --corpus.
+"""
+
+from __future__ import division, print_function
+
+import collections
+import datetime
+import glob
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # tracemalloc is only in the standard library from 3.4
+
+from .. import base, icalendar, ics_diff
+
+# the benchmarks, by name, in the order they're run
+BENCHMARKS = collections.OrderedDict()
+
+Workload = collections.namedtuple(
+    'Workload', ('run', 'lines', 'size', 'components', 'baseline'))
+Workload.__new__.__defaults__ = (None,)
+Workload.__doc__ = """
+What a benchmark times: run, a function without arguments, processes lines
+lines, size bytes, and components components, each None if it doesn't
+apply.  baseline, if given, is a function doing the same work another way,
+which is timed too, to report run's speedup over it.
+"""
+
+
+def benchmark(name):
+    """
+    Register a function returning the Workload of benchmark name, given the
+    scale and the real corpus, a list of (filename, text).
+    """
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def measure(workload, repeat=3):
+    """
+    Time workload, return its results as a dictionary.
+    """
+    times = timeit.repeat(workload.run, number=1, repeat=repeat)
+    best = min(times)
+    results = {
+        'best': best,
+        'median': sorted(times)[len(times) // 2],
+        'repeat': repeat,
+        'lines': workload.lines,
+        'bytes': workload.size,
+        'components': workload.components,
+        'linesPerSecond': None,
+        'megabytesPerSecond': None,
+        'componentsPerSecond': None,
+        'peakMemory': None,
+        'baselineBest': None,
+        'speedup': None,
+    }
+    if best > 0:
+        for count, key in ((workload.lines, 'linesPerSecond'),
+                           (workload.size, 'megabytesPerSecond'),
+                           (workload.components, 'componentsPerSecond')):
+            if count is not None:
+                results[key] = count / best
+        if workload.size is not None:
+            results['megabytesPerSecond'] /= 1024 * 1024
+    if workload.baseline is not None:
+        baseline = min(timeit.repeat(workload.baseline, number=1,
+                                     repeat=repeat))
+        results['baselineBest'] = baseline
+        if best > 0:
+            results['speedup'] = baseline / best
+    if tracemalloc is not None and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        try:
+            workload.run()
+            results['peakMemory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return results
+
+
+def run(names=None, repeat=3, scale=1, corpus=None, report=None):
+    """
+    Run the benchmarks named, or all of them, and return a dictionary of
+    their results and of the environment, suitable for JSON.
+
+    report, if given, is called with the name and results of each benchmark
+    as it finishes.
+    """
+    if corpus is None:
+        corpus = readCorpus(defaultCorpus())
+    results = collections.OrderedDict()
+    for name in names or BENCHMARKS:
+        workload = BENCHMARKS[name](scale, corpus)
+        if workload is None:
+            continue
+        results[name] = measure(workload, repeat)
+        if report is not None:
+            report(name, results[name])
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'date': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'scale': scale,
+        'benchmarks': results,
+    }
+
+
+def compare(results, baseline):
+    """
+    Return {name: best time / baseline best time} for the benchmarks in both
+    results, as returned by run.
+    """
+    ratios = collections.OrderedDict()
+    for name, result in results['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is not None and before['best'] > 0:
+            ratios[name] = result['best'] / before['best']
+    return ratios
+
+
+# ------------------------------ Corpora ---------------------------------------
+
+def defaultCorpus():
+    """
+    Return the paths of the parseable test files of the source tree, if
+    vobject is run from one.
+    """
+    directory = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                             'test_files')
+    paths = sorted(glob.glob(os.path.join(directory, '*.ics')))
+    # these test parse errors
+    return [path for path in paths
+            if os.path.basename(path) not in ('badline.ics', 'badstream.ics')]
+
+
+def readCorpus(paths):
+    """
+    Return [(path, text)] for paths, files or directories of .ics and .vcf
+    files.
+    """
+    corpus = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, '*.ics')) +
+                           glob.glob(os.path.join(path, '*.vcf')))
+        else:
+            files = [path]
+        for filename in files:
+            with open(filename, 'rb') as f:
+                corpus.append((filename, f.read().decode('utf-8')))
+    return corpus
+
+
+def lineCount(text):
+    return text.count('\n')
+
+
+def calendarText(events):
+    # imported here, so the corpus module can be run with python -m
+    from .corpus import CalendarGenerator
+    return CalendarGenerator().text(events)
+
+
+def addressBookText(cards):
+    from .corpus import AddressBookGenerator
+    return AddressBookGenerator(photos=1).text(cards)
+
+
+# ----------------------------- Benchmarks -------------------------------------
+
+def scaled(size, scale):
+    return max(int(size * scale), 1)
+
+
+def parseWorkload(text, transform, components=None, allowQP=False):
+    def parse():
+        return list(base.readComponents(text, transform=transform,
+                                        allowQP=allowQP))
+    if components is None:
+        components = text.count('\nBEGIN:') + text.startswith('BEGIN:')
+    return Workload(parse, lineCount(text), len(text.encode('utf-8')),
+                    components)
+
+
+@benchmark('import')
+def importBenchmark(scale, corpus):
+    """
+    Start Python and import vobject.
+    """
+    # import the vobject being benchmarked, not an installed one
+    env = dict(os.environ)
+    path = os.path.dirname(os.path.dirname(os.path.abspath(base.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [path] + [p for p in [env.get('PYTHONPATH')] if p])
+    command = [sys.executable, '-c', 'import vobject']
+    subprocess.check_call(command, env=env)  # compile, and fail early
+
+    def start():
+        subprocess.check_call(command, env=env)
+    return Workload(start, None, None, None)
+
+
+@benchmark('parse')
+def parseBenchmark(scale, corpus):
+    """
+    readComponents without transforming values.
+    """
+    return parseWorkload(calendarText(scaled(1000, scale)), False)
+
+
+@benchmark('parse_transform')
+def parseTransformBenchmark(scale, corpus):
+    """
+    readComponents, transforming values to Python types.
+    """
+    return parseWorkload(calendarText(scaled(1000, scale)), True)
+
+
+@benchmark('parse_corpus')
+def parseCorpusBenchmark(scale, corpus):
+    """
+    readComponents on the real corpus.
+    """
+    if not corpus:
+        return None
+    texts = [text for filename, text in corpus]
+    components = sum(text.count('\nBEGIN:') + text.startswith('BEGIN:')
+                     for text in texts)
+
+    copies = scaled(10, scale)
+
+    def parse():
+        for _ in range(copies):
+            for text in texts:
+                list(base.readComponents(text))
+    total = ''.join(texts)
+    return Workload(parse, copies * lineCount(total),
+                    copies * len(total.encode('utf-8')), copies * components)
+
+
+@benchmark('validate')
+def validateBenchmark(scale, corpus):
+    """
+    Validate a parsed calendar.
+    """
+    text = calendarText(scaled(1000, scale))
+    calendar = base.readOne(text)
+
+    def validate():
+        calendar.validate(raiseException=True)
+    return Workload(validate, lineCount(text), None,
+                    len(calendar.contents['vevent']))
+
+
+@benchmark('serialize')
+def serializeBenchmark(scale, corpus):
+    """
+    Serialize a parsed calendar.
+    """
+    text = calendarText(scaled(1000, scale))
+    calendar = base.readOne(text)
+    serialized = calendar.serialize()
+    return Workload(calendar.serialize, lineCount(serialized),
+                    len(serialized.encode('utf-8')),
+                    len(calendar.contents['vevent']))
+
+
+@benchmark('expand')
+def expandBenchmark(scale, corpus):
+    """
+    Iterate the rrulesets of recurring events over two years.
+    """
+    calendar = base.readOne(calendarText(scaled(2000, scale)))
+    events = [event for event in calendar.vevent_list
+              if 'rrule' in event.contents]
+    start = datetime.datetime(2018, 1, 1, tzinfo=icalendar.utc)
+    end = datetime.datetime(2020, 1, 1, tzinfo=icalendar.utc)
+
+    def expand():
+        for event in events:
+            event.getrruleset(addRDate=True).between(start, end)
+    return Workload(expand, None, None, len(events))
+
+
+@benchmark('vtimezone')
+def vtimezoneBenchmark(scale, corpus):
+    """
+    Generate VTIMEZONEs from tzinfos.
+    """
+    from dateutil import tz
+    names = ['America/New_York', 'America/Los_Angeles', 'America/Sao_Paulo',
+             'Europe/Berlin', 'Europe/London', 'Asia/Tokyo',
+             'Australia/Sydney', 'Pacific/Auckland']
+    zones = [zone for zone in map(tz.gettz, names) if zone is not None]
+    if not zones:
+        return None
+    zones = zones * scaled(5, scale)
+
+    def generate():
+        for zone in zones:
+            icalendar.TimezoneComponent(zone).serialize()
+    return Workload(generate, None, None, len(zones))
+
+
+@benchmark('vcard_photos')
+def vcardPhotosBenchmark(scale, corpus):
+    """
+    Parse vCards with base64 PHOTOs.
+    """
+    text = addressBookText(scaled(200, scale))
+    return parseWorkload(text, True, allowQP=True)
+
+
+@benchmark('ics_diff')
+def icsDiffBenchmark(scale, corpus):
+    """
+    Compare a calendar with a modified copy.
+    """
+    text = calendarText(scaled(1000, scale))
+    left = base.readOne(text)
+    right = base.readOne(text)
+    for n, event in enumerate(right.vevent_list):
+        if n % 10 == 0:
+            event.summary.value += ' (moved)'
+
+    def compare():
+        ics_diff.diff(left, right)
+    return Workload(compare, None, None, 2 * len(left.vevent_list))
+
+
+@benchmark('vectorized')
+def vectorizedBenchmark(scale, corpus):
+    """
+    Expand recurring events into NumPy arrays with expandArrays, against
+    iterating each event's rruleset.
+    """
+    from .. import vectorized
+    if vectorized.numpy is None:
+        return None
+    calendar = base.readOne(calendarText(scaled(2000, scale)))
+    events = calendar.vevent_list
+    start = datetime.datetime(2018, 1, 1, tzinfo=icalendar.utc)
+    end = datetime.datetime(2019, 1, 1, tzinfo=icalendar.utc)
+
+    def expand():
+        vectorized.expandArrays(events, start, end)
+
+    def iterate():
+        for event in events:
+            rruleset = event.getrruleset(addRDate=True)
+            if rruleset is not None:
+                rruleset.between(start, end, inc=True)
+    return Workload(expand, None, None, len(events), iterate)
@@ -0,0 +1,90 @@
+from __future__ import print_function
+
+import json
+import sys
+
+from optparse import OptionParser
+
+from . import BENCHMARKS, compare, readCorpus, run
+
+
+def formatResult(name, result):
+    def rate(key, unit):
+        if result[key] is None:
+            return ''
+        return "{0:,.0f} {1}".format(result[key], unit)
+
+    memory = result['peakMemory']
+    line = "{0:<16} {1:>9.4f}s {2:>16} {3:>10} {4:>18} {5:>10}".format(
+        name, result['best'], rate('linesPerSecond', 'lines/s'),
+        '' if result['megabytesPerSecond'] is None else
+        "{0:.2f} MB/s".format(result['megabytesPerSecond']),
+        rate('componentsPerSecond', 'components/s'),
+        '' if memory is None else "{0:.1f} MB".format(memory / 1048576.0))
+    speedup = result.get('speedup')
+    if speedup is not None:
+        if speedup >= 1:
+            comparison = "{0:.1f}x faster".format(speedup)
+        else:
+            comparison = "{0:.1f}x slower".format(1 / speedup)
+        line += "  {0} than the baseline's {1:.4f}s".format(
+            comparison, result['baselineBest'])
+    return line
+
+
+def main():
+    options, args = getOptions()
+    if options.list:
+        for name, function in BENCHMARKS.items():
+            print("{0:<16} {1}".format(name, (function.__doc__ or '').strip()))
+        return
+    unknown = [name for name in args if name not in BENCHMARKS]
+    if unknown:
+        print("error: unknown benchmarks: {0}".format(', '.join(unknown)))
+        sys.exit(2)
+
+    corpus = readCorpus(options.corpus) if options.corpus else None
+    report = None if options.quiet else \
+        lambda name, result: print(formatResult(name, result))
+    results = run(args or None, options.repeat, options.scale, corpus, report)
+
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        print()
+        for name, ratio in compare(results, baseline).items():
+            print("{0:<16} {1:>6.2f}x the time of {2}".format(
+                name, ratio, options.compare))
+
+
+def getOptions():
+    usage = "usage: %prog [options] [benchmark ...]"
+    parser = OptionParser(usage=usage)
+    parser.set_description("Time vobject's parsing, serializing and "
+                           "expansion.  Runs all benchmarks by default.")
+    parser.add_option("-r", "--repeat", type="int", default=3,
+                      help="times to run each benchmark [default: 3]")
+    parser.add_option("-s", "--scale", type="float", default=1,
+                      help="multiply the size of synthetic inputs "
+                           "[default: 1]")
+    parser.add_option("-c", "--corpus", action="append", default=[],
+                      help="a file or directory of real .ics or .vcf files, "
+                           "replacing the test files [may be repeated]")
+    parser.add_option("-j", "--json", help="write the results to this file")
+    parser.add_option("--compare", metavar="JSON",
+                      help="compare with the results saved in this file")
+    parser.add_option("-l", "--list", action="store_true", default=False,
+                      help="list the benchmarks")
+    parser.add_option("-q", "--quiet", action="store_true", default=False,
+                      help="don't print results as they're measured")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Aborted")
@@ -0,0 +1,345 @@
+"""
+Generate large synthetic calendars and address books, for benchmarks and
+load tests.
+
+Generators are seeded, the same arguments always give the same output.
+Components are built with the behaviors like any other and written one at a
+time, so outputs of any size can be streamed to disk::
+
+    with open('events.ics', 'w') as f:
+        CalendarGenerator(seed=1).write(f, 1000000)
+
+or from the command line::
+
+    python -m vobject.bench.corpus calendar 1000000 events.ics --seed 1
+    python -m vobject.bench.corpus addressbook 100000 cards.vcf
+"""
+
+from __future__ import print_function
+
+import base64
+import binascii
+import codecs
+import datetime
+import random
+import sys
+
+from optparse import OptionParser
+
+import six
+
+from dateutil import tz
+
+from .. import base, iCalendar, icalendar, vCard, vcard
+
+# the kinds of events generated, and their weights
+EVENT_MIX = (('timed', 50), ('allday', 15), ('floating', 10),
+             ('recurring', 25))
+
+# timezones of timed events, their VTIMEZONEs have distinct TZIDs
+ZONES = ('America/New_York', 'America/Los_Angeles', 'Europe/Berlin',
+         'Asia/Tokyo', 'Australia/Sydney')
+
+# recurrence rules of recurring events, with the days between instances
+RULES = (('FREQ=DAILY;COUNT=60', 1), ('FREQ=WEEKLY', 7),
+         ('FREQ=WEEKLY;INTERVAL=2;UNTIL=20301231T000000Z', 14),
+         ('FREQ=DAILY;INTERVAL=3;COUNT=100', 3))
+
+WORDS = ('agenda', 'budget', 'call', 'customer', 'design', 'follow-up',
+         'launch', 'notes', 'plan', 'quarterly', 'review', 'roadmap', 'sync',
+         'team', 'update', 'weekly', u'café', u'会议')
+
+FIRST_NAMES = ('Alex', 'Sam', 'Jordan', 'Maria', 'Wei', 'Fatima', 'Jonas',
+               u'Renée', 'Kenji', 'Priya', 'Olu', 'Ana')
+LAST_NAMES = ('Smith', 'Garcia', 'Chen', 'Okafor', u'Müller', 'Tanaka',
+              'Novak', 'Silva', 'Kowalski', 'Haddad')
+
+# vCard 2.1 cards aren't folded, quoted-printable values use soft line breaks
+UNFOLDED = 10 ** 9
+
+
+def choose(rng, weighted):
+    """
+    Return a choice from (value, weight) pairs.
+    """
+    point = rng.uniform(0, sum(weight for value, weight in weighted))
+    for value, weight in weighted:
+        point -= weight
+        if point <= 0:
+            return value
+    return weighted[-1][0]
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+class CalendarGenerator(object):
+    """
+    Generate VEVENTs with a mix of timed, all-day, floating and recurring
+    events.
+
+    mix is a sequence of (kind, weight) pairs like EVENT_MIX.  The other
+    arguments are the fraction of events with VALARMs, ATTENDEEs, long
+    DESCRIPTIONs, and of recurring events with EXDATEs and with overrides,
+    VEVENTs with a RECURRENCE-ID moving an instance.  Events start within
+    days days from start.
+    """
+    def __init__(self, seed=0, mix=EVENT_MIX, zones=ZONES,
+                 start=datetime.datetime(2018, 1, 1), days=730, alarms=0.3,
+                 attendees=0.5, longDescriptions=0.05, exdates=0.3,
+                 overrides=0.2):
+        self.seed = seed
+        self.mix = mix
+        self.tzinfos = [zone for zone in map(tz.gettz, zones)
+                        if zone is not None]
+        self.start = start
+        self.days = days
+        self.alarms = alarms
+        self.attendees = attendees
+        self.longDescriptions = longDescriptions
+        self.exdates = exdates
+        self.overrides = overrides
+
+    def events(self, count):
+        """
+        Yield count events, and the overrides of recurring ones, which
+        aren't counted.
+        """
+        rng = random.Random(self.seed)
+        for n in range(count):
+            kind = choose(rng, self.mix)
+            if kind in ('timed', 'recurring') and not self.tzinfos:
+                kind = 'floating'
+            event, period = self.event(rng, n, kind)
+            yield event
+            if period is not None and rng.random() < self.overrides:
+                yield self.override(rng, event, period)
+
+    def event(self, rng, n, kind):
+        """
+        Return a new event of kind, and the time between its instances if
+        it recurs.
+        """
+        event = base.newFromBehavior('vevent')
+        event.add('uid').value = 'event-{0}-{1}@example.com'.format(
+            self.seed, n)
+        event.add('dtstamp').value = datetime.datetime(
+            2018, 1, 1, tzinfo=icalendar.utc)
+        day = self.start + datetime.timedelta(days=rng.randrange(self.days))
+        if kind == 'allday':
+            start = day.date()
+            end = start + datetime.timedelta(days=rng.choice((1, 1, 1, 2, 3)))
+        else:
+            start = day.replace(hour=rng.randrange(7, 19),
+                                minute=rng.choice((0, 15, 30, 45)))
+            if kind != 'floating':
+                start = start.replace(tzinfo=rng.choice(self.tzinfos))
+            end = start + datetime.timedelta(minutes=rng.choice((15, 30, 60,
+                                                                 90)))
+        event.add('dtstart').value = start
+        event.add('dtend').value = end
+        event.add('summary').value = words(rng, rng.randrange(1, 5)).title()
+        if rng.random() < self.longDescriptions:
+            description = '\n'.join(words(rng, 12)
+                                    for _ in range(rng.randrange(20, 200)))
+        else:
+            description = words(rng, rng.randrange(3, 30))
+        event.add('description').value = description
+        if rng.random() < 0.5:
+            event.add('location').value = 'Room {0}, {1}'.format(
+                rng.randrange(1, 500), rng.choice(('HQ', 'Annex', 'Remote')))
+        if rng.random() < self.attendees:
+            self.addAttendees(rng, event)
+        if rng.random() < self.alarms:
+            alarm = event.add('valarm')
+            alarm.add('action').value = 'DISPLAY'
+            alarm.add('description').value = 'Reminder'
+            alarm.add('trigger').value = -datetime.timedelta(
+                minutes=rng.choice((5, 10, 15, 30, 60)))
+
+        period = None
+        if kind == 'recurring':
+            rule, days = rng.choice(RULES)
+            period = datetime.timedelta(days=days)
+            event.add('rrule').value = rule
+            if rng.random() < self.exdates:
+                event.add('exdate').value = [
+                    start + period * rng.randrange(1, 10)
+                    for _ in range(rng.randrange(1, 4))]
+        return event, period
+
+    def addAttendees(self, rng, event):
+        organizer = event.add('organizer')
+        organizer.value = 'mailto:organizer{0}@example.com'.format(
+            rng.randrange(100))
+        for _ in range(rng.randrange(1, 8)):
+            number = rng.randrange(10000)
+            attendee = event.add('attendee')
+            attendee.value = 'mailto:person{0}@example.com'.format(number)
+            attendee.params['CN'] = [u'{0} {1}'.format(
+                rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))]
+            attendee.params['PARTSTAT'] = [rng.choice(
+                ('ACCEPTED', 'DECLINED', 'TENTATIVE', 'NEEDS-ACTION'))]
+            attendee.params['ROLE'] = ['REQ-PARTICIPANT']
+
+    def override(self, rng, master, period):
+        """
+        Return an override moving an instance of master by up to a day.
+        """
+        event = base.newFromBehavior('vevent')
+        event.add('uid').value = master.uid.value
+        event.add('dtstamp').value = master.dtstamp.value
+        instance = master.dtstart.value + period * rng.randrange(10, 20)
+        event.add('recurrence-id').value = instance
+        shift = datetime.timedelta(hours=rng.randrange(-24, 25))
+        if not isinstance(instance, datetime.datetime):
+            shift = datetime.timedelta(days=rng.choice((-1, 1)))
+        duration = master.dtend.value - master.dtstart.value
+        event.add('dtstart').value = instance + shift
+        event.add('dtend').value = instance + shift + duration
+        event.add('summary').value = master.summary.value + ' (moved)'
+        return event
+
+    def write(self, fp, count):
+        """
+        Write a VCALENDAR with count events (and overrides) to fp, a text
+        stream.
+        """
+        calendar = iCalendar()
+        calendar.add('prodid').value = '-//vobject//corpus//EN'
+        for tzinfo in self.tzinfos:
+            calendar.add(icalendar.TimezoneComponent(tzinfo))
+        header = calendar.serialize(validate=False)
+        end = 'END:VCALENDAR\r\n'
+        fp.write(header[:-len(end)])
+        for event in self.events(count):
+            fp.write(event.serialize(validate=False))
+        fp.write(end)
+
+    def text(self, count):
+        """
+        Return a VCALENDAR with count events as text.
+        """
+        buf = six.StringIO()
+        self.write(buf, count)
+        return buf.getvalue()
+
+
+class AddressBookGenerator(object):
+    """
+    Generate vCards, some of them with grouped properties, base64 PHOTOs of
+    photoSize bytes, or in vCard 2.1 with quoted-printable values, each in
+    the given fraction of cards.
+    """
+    def __init__(self, seed=0, groups=0.3, quotedPrintable=0.2, photos=0.1,
+                 photoSize=8192):
+        self.seed = seed
+        self.groups = groups
+        self.quotedPrintable = quotedPrintable
+        self.photos = photos
+        self.photoSize = photoSize
+
+    def cards(self, count):
+        """
+        Yield (card, lineLength) for count vCards, serialize cards folded at
+        lineLength.
+        """
+        rng = random.Random(self.seed)
+        for n in range(count):
+            yield self.card(rng, n)
+
+    def card(self, rng, n):
+        card = vCard()
+        card.add('uid').value = 'card-{0}-{1}'.format(self.seed, n)
+        given, family = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        card.add('n').value = vcard.Name(family=family, given=given)
+        card.add('fn').value = u'{0} {1}'.format(given, family)
+        email = card.add('email')
+        email.value = u'{0}.{1}{2}@example.com'.format(given, family, n)
+        email.type_param = 'INTERNET'
+        card.add('tel').value = '+1-555-{0:04d}'.format(rng.randrange(10000))
+        if rng.random() < self.groups:
+            for number in range(1, rng.randrange(2, 4)):
+                group = 'item{0}'.format(number)
+                card.add('email', group).value = \
+                    'other{0}.{1}@example.com'.format(number, n)
+                card.add('x-ablabel', group).value = rng.choice(
+                    ('_$!<Work>!$_', '_$!<Home>!$_', 'Club'))
+        if rng.random() < self.photos:
+            photo = card.add('photo')
+            photo.value = binascii.unhexlify('{0:0{1}x}'.format(
+                rng.getrandbits(8 * self.photoSize), 2 * self.photoSize))
+            photo.encoding_param = 'b'
+            photo.type_param = 'JPEG'
+
+        lineLength = 75
+        note = u'\n'.join(words(rng, 8) for _ in range(rng.randrange(1, 5)))
+        if rng.random() < self.quotedPrintable:
+            card.add('version').value = '2.1'
+            for line in card.contents.get('photo', ()):
+                line.value = base64.b64encode(line.value).decode('ascii')
+                line.encoded = True
+                line.encoding_param = 'BASE64'
+            # line breaks are encoded, soft line breaks end lines
+            encoded = '=0D=0A=\r\n'.join(
+                codecs.encode(text.encode('utf-8'), 'quopri').decode('ascii')
+                .replace('=\n', '=\r\n') for text in note.split('\n'))
+            # written as is, the behavior would escape the encoded value
+            line = card.add('note')
+            line.behavior = None
+            line.value = encoded
+            line.params['ENCODING'] = ['QUOTED-PRINTABLE']
+            line.params['CHARSET'] = ['UTF-8']
+            lineLength = UNFOLDED
+        else:
+            card.add('note').value = note
+        return card, lineLength
+
+    def write(self, fp, count):
+        """
+        Write count vCards to fp, a text stream.
+        """
+        for card, lineLength in self.cards(count):
+            fp.write(card.serialize(lineLength=lineLength, validate=False))
+
+    def text(self, count):
+        """
+        Return count vCards as text.
+        """
+        buf = six.StringIO()
+        self.write(buf, count)
+        return buf.getvalue()
+
+
+def main():
+    options, args = getOptions()
+    if len(args) not in (2, 3) or args[0] not in ('calendar', 'addressbook'):
+        print("error: expected calendar or addressbook, a count, and "
+              "optionally a file")
+        sys.exit(2)
+    if args[0] == 'calendar':
+        generator = CalendarGenerator(options.seed)
+    else:
+        generator = AddressBookGenerator(options.seed)
+    if len(args) == 3:
+        with codecs.open(args[2], 'w', 'utf-8') as f:
+            generator.write(f, int(args[1]))
+    else:
+        generator.write(sys.stdout, int(args[1]))
+
+
+def getOptions():
+    usage = "usage: %prog [options] calendar|addressbook count [file]"
+    parser = OptionParser(usage=usage)
+    parser.set_description("Write a synthetic calendar or address book.")
+    parser.add_option("-s", "--seed", type="int", default=0,
+                      help="seed of the generator [default: 0]")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Aborted")
@@ -0,0 +1,843 @@
+"""
+Compute free/busy time from calendars, as a VFREEBUSY component.
+
+Busy time comes from the occurrences of VEVENTs, following RFC 5545: events
+with TRANSP:TRANSPARENT or STATUS:CANCELLED don't block time, tentative
+events are BUSY-TENTATIVE, others BUSY.  The FREEBUSY lines of VFREEBUSY
+components in the calendars are included with their FBTYPE.
+
+Where periods of several types overlap, the busiest type wins: BUSY, then
+BUSY-UNAVAILABLE, then BUSY-TENTATIVE.
+
+BusyPeriods holds the periods of VFREEBUSY components compactly, as sorted
+arrays of UTC seconds per FBTYPE, for answering "is this time busy" with a
+bisection and merging the free/busy time of many people.
+
+AvailabilityEvaluator computes the free and busy time described by RFC 7953
+VAVAILABILITY components, findConflicts finds double-booked events.
+"""
+
+import array
+import bisect
+import calendar
+import datetime
+import heapq
+import itertools
+
+from . import base
+from .icalendar import (LRUCache, sameSignature, stringToDurations,
+                        stringToPeriod, utc)
+from .intervals import getIntervalIndex
+from .occurrences import (OverrideIndex, expandComponent, getOverrideIndex,
+                          localize)
+from .recurrence import getBudget
+
+BUSY = 'BUSY'
+BUSY_UNAVAILABLE = 'BUSY-UNAVAILABLE'
+BUSY_TENTATIVE = 'BUSY-TENTATIVE'
+FREE = 'FREE'
+
+# busy types, busiest first
+PRECEDENCE = (BUSY, BUSY_UNAVAILABLE, BUSY_TENTATIVE)
+
+
+def busyType(component):
+    """
+    Return the FBTYPE of the time component blocks, or None if it's free.
+    """
+    if component.name != 'VEVENT':
+        return None
+    transp = component.getChildValue('transp')
+    if transp is not None and transp.upper() == 'TRANSPARENT':
+        return None
+    status = (component.getChildValue('status') or '').upper()
+    if status == 'CANCELLED':
+        return None
+    if status == 'TENTATIVE':
+        return BUSY_TENTATIVE
+    return BUSY
+
+
+def periodEnd(period):
+    """
+    Return the end of a FREEBUSY period, (start, end or duration).
+    """
+    if isinstance(period[1], datetime.timedelta):
+        return period[0] + period[1]
+    return period[1]
+
+
+class BusyTimeline(object):
+    """
+    The busy periods of calendars within [start, end), updated as events
+    change instead of being recomputed.
+
+    The timeline observes the calendars, components added and removed with
+    add and remove are taken into account.  Call update after changing a
+    component.
+
+    The sweep keeps, for every time a period starts or ends, how many periods
+    of each type start (+1) or end (-1) then, in a sorted list, so a change
+    only adds or removes the boundaries of the periods involved.
+
+    budget, an L{ExpansionBudget<vobject.recurrence.ExpansionBudget>},
+    limits building the timeline, each later change is limited by the
+    default budget.
+    """
+    def __init__(self, calendars, start, end, tzinfo=None, budget=None):
+        if tzinfo is None:
+            tzinfo = getattr(start, 'tzinfo', None) or utc
+        self.tzinfo = tzinfo
+        self.start = localize(start, tzinfo).astimezone(utc)
+        self.end = localize(end, tzinfo).astimezone(utc)
+        self.calendars = list(calendars)
+        # sorted boundary times, and for each, the change per busy type
+        self.times = []
+        self.deltas = {}
+        # id(component): (component, calendar, periods)
+        self.entries = {}
+        self.budget = getBudget(budget)
+        for calendar in self.calendars:
+            for component in calendar.getChildren():
+                self.add(component, calendar)
+            calendar.addObserver(self)
+        self.budget = None
+
+    def childAdded(self, parent, child):
+        self.add(child, parent)
+        self.updateMaster(child, parent)
+
+    def childRemoved(self, parent, child):
+        self.discard(child)
+        self.updateMaster(child, parent)
+
+    def updateMaster(self, component, calendar):
+        """
+        Recompute the master of component if it's an override, which changes
+        the master's occurrences.
+        """
+        if (component.name == 'VEVENT' and
+                'recurrence-id' in component.contents):
+            uid = component.getChildValue('uid')
+            master = getOverrideIndex(calendar).master(uid)
+            if master is not None and master is not component:
+                self.update(master)
+
+    def periodsOf(self, component, calendar):
+        """
+        Return the busy periods of component in the window, as
+        (start, end, fbtype) with UTC times.
+        """
+        periods = []
+        if component.name == 'VEVENT':
+            if 'recurrence-id' in component.contents:
+                index = None
+            else:
+                index = getOverrideIndex(calendar)
+                index.refresh()
+            for occurrence in expandComponent(component, self.start,
+                                              self.end, self.tzinfo, index,
+                                              self.budget):
+                fbtype = busyType(occurrence.component)
+                if fbtype is not None:
+                    periods.append(
+                        (localize(occurrence.start, self.tzinfo),
+                         localize(occurrence.end, self.tzinfo), fbtype))
+        elif component.name == 'VFREEBUSY':
+            for line in component.contents.get('freebusy', ()):
+                fbtype = line.params.get('FBTYPE', [BUSY])[0].upper()
+                if fbtype == FREE:
+                    continue
+                for period in line.value:
+                    periods.append((localize(period[0], self.tzinfo),
+                                    localize(periodEnd(period), self.tzinfo),
+                                    fbtype))
+
+        clipped = []
+        for start, end, fbtype in periods:
+            start = max(start.astimezone(utc), self.start)
+            end = min(end.astimezone(utc), self.end)
+            if start < end:
+                clipped.append((start, end, fbtype))
+        return clipped
+
+    def add(self, component, calendar):
+        if component.name not in ('VEVENT', 'VFREEBUSY'):
+            return
+        periods = self.periodsOf(component, calendar)
+        self.entries[id(component)] = (component, calendar, periods)
+        for start, end, fbtype in periods:
+            self.shift(start, fbtype, 1)
+            self.shift(end, fbtype, -1)
+
+    def discard(self, component):
+        entry = self.entries.pop(id(component), None)
+        if entry is not None:
+            for start, end, fbtype in entry[2]:
+                self.shift(start, fbtype, -1)
+                self.shift(end, fbtype, 1)
+
+    def update(self, component):
+        """
+        Recompute the busy periods of component, after it changed.
+        """
+        entry = self.entries.get(id(component))
+        if entry is not None:
+            self.discard(component)
+            self.add(component, entry[1])
+            self.updateMaster(component, entry[1])
+
+    def shift(self, time, fbtype, delta):
+        deltas = self.deltas.get(time)
+        if deltas is None:
+            deltas = self.deltas[time] = {}
+            bisect.insort(self.times, time)
+        deltas[fbtype] = deltas.get(fbtype, 0) + delta
+        if not any(deltas.values()):
+            del self.deltas[time]
+            del self.times[bisect.bisect_left(self.times, time)]
+
+    def periods(self):
+        """
+        Return the coalesced busy periods, a dictionary of lists of
+        (start, end) UTC datetimes by FBTYPE.
+        """
+        periods = {}
+        counts = dict((fbtype, 0) for fbtype in PRECEDENCE)
+        current = currentStart = None
+        for time in self.times:
+            for fbtype, delta in self.deltas[time].items():
+                counts[fbtype] = counts.get(fbtype, 0) + delta
+            busiest = None
+            for fbtype in PRECEDENCE:
+                if counts[fbtype]:
+                    busiest = fbtype
+                    break
+            if busiest is None:
+                # unknown, x-name types, are less busy than the others
+                busiest = next((fbtype for fbtype in sorted(counts)
+                                if counts[fbtype]), None)
+            if busiest == current:
+                continue
+            if current is not None:
+                periods.setdefault(current, []).append((currentStart, time))
+            current, currentStart = busiest, time
+        return periods
+
+    def vfreebusy(self):
+        """
+        Return a VFREEBUSY component with the busy periods, one FREEBUSY line
+        per FBTYPE.
+        """
+        vfreebusy = base.newFromBehavior('vfreebusy')
+        vfreebusy.add('dtstamp').value = datetime.datetime.now(utc)
+        vfreebusy.add('dtstart').value = self.start
+        vfreebusy.add('dtend').value = self.end
+        periods = self.periods()
+        for fbtype in PRECEDENCE + tuple(sorted(set(periods) -
+                                                set(PRECEDENCE))):
+            if fbtype in periods:
+                line = vfreebusy.add('freebusy')
+                line.value = periods[fbtype]
+                if fbtype != BUSY:
+                    line.params['FBTYPE'] = [fbtype]
+        return vfreebusy
+
+
+def computeFreeBusy(calendars, start, end, tzinfo=None, budget=None):
+    """
+    Return a VFREEBUSY component with the busy time of calendars within
+    [start, end).
+
+    start and end may be dates or datetimes.  Floating times, dates and
+    naive bounds are taken to be in tzinfo, which defaults to start's
+    timezone, or UTC.  Periods are coalesced and in UTC.  To keep free/busy
+    time up to date as events change, use a L{BusyTimeline}.  Expansion is
+    limited by budget, an
+    L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}, or the default
+    budget.
+    """
+    timeline = BusyTimeline(calendars, start, end, tzinfo, budget)
+    for calendar in timeline.calendars:
+        calendar.removeObserver(timeline)
+    return timeline.vfreebusy()
+
+
+def findConflicts(calendar, start, end, tzinfo=None, budget=None):
+    """
+    Return the pairs of overlapping event occurrences within [start, end).
+
+    Occurrences come from the calendar's L{IntervalIndex
+    <vobject.intervals.IntervalIndex>}, events which don't block time,
+    TRANSPARENT or CANCELLED ones, are ignored.  A sweep over occurrences
+    ordered by start keeps the ones still going on in a heap by end, so the
+    cost is O(n log n + k) for n occurrences and k conflicts.
+
+    start and end may be dates or datetimes.  Floating times, dates and naive
+    bounds are taken to be in tzinfo, which defaults to start's timezone, or
+    UTC.  Expansion is limited by budget, an
+    L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}, or the default
+    budget.
+
+    @return:
+        A list of (earlier, later) pairs of
+        L{Occurrence<vobject.occurrences.Occurrence>}s, ordered by the start
+        of the later one.
+    """
+    if tzinfo is None:
+        tzinfo = getattr(start, 'tzinfo', None) or utc
+    occurrences = getIntervalIndex(calendar).between(start, end, tzinfo,
+                                                     ('vevent',), budget)
+    conflicts = []
+    active = []
+    counter = itertools.count()
+    for occurrence in occurrences:
+        if busyType(occurrence.component) is None:
+            continue
+        occurrenceStart = localize(occurrence.start, tzinfo)
+        occurrenceEnd = localize(occurrence.end, tzinfo)
+        while active and active[0][0] <= occurrenceStart:
+            heapq.heappop(active)
+        # earlier occurrences first
+        conflicts.extend((other, occurrence) for otherEnd, tiebreaker, other
+                         in sorted(active, key=lambda entry: entry[1]))
+        heapq.heappush(active, (occurrenceEnd, next(counter), occurrence))
+    return conflicts
+
+
+def toTimestamp(dt):
+    """
+    Return the UTC seconds from the epoch to dt, an aware datetime.
+    """
+    return calendar.timegm(dt.utctimetuple())
+
+
+def fromTimestamp(seconds):
+    return datetime.datetime.fromtimestamp(seconds, utc)
+
+
+def parsePeriods(value):
+    """
+    Yield (start, end) in UTC seconds for the periods of a FREEBUSY value,
+    a string or a list of (start, end or duration) tuples.
+
+    UTC periods are parsed without building datetimes, others with
+    L{stringToPeriod<vobject.icalendar.stringToPeriod>}, taken to be UTC.
+    """
+    if not isinstance(value, list):
+        if not value:
+            return
+        periods = []
+        for text in value.split(','):
+            start, end = text.split('/')
+            if len(start) == 16 and start[15] in 'zZ':
+                seconds = calendar.timegm((
+                    int(start[0:4]), int(start[4:6]), int(start[6:8]),
+                    int(start[9:11]), int(start[11:13]), int(start[13:15])))
+                if end[-1] in 'zZ' and len(end) == 16:
+                    endSeconds = calendar.timegm((
+                        int(end[0:4]), int(end[4:6]), int(end[6:8]),
+                        int(end[9:11]), int(end[11:13]), int(end[13:15])))
+                else:
+                    duration = stringToDurations(end)[0]
+                    endSeconds = seconds + int(duration.total_seconds())
+                yield seconds, endSeconds
+            else:
+                periods.append(stringToPeriod(text, utc))
+        value = periods
+    for period in value:
+        start = localize(period[0], utc)
+        yield toTimestamp(start), toTimestamp(localize(periodEnd(period), utc))
+
+
+def coalesce(periods):
+    """
+    Return (starts, ends) arrays of the union of periods, (start, end) pairs
+    sorted by start.
+    """
+    starts, ends = array.array('q'), array.array('q')
+    for start, end in periods:
+        if end <= start:
+            continue
+        if ends and start <= ends[-1]:
+            if end > ends[-1]:
+                ends[-1] = end
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+class BusyPeriods(object):
+    """
+    Coalesced busy periods by FBTYPE, as parallel arrays of start and end
+    times in UTC seconds, sorted.
+
+    Periods of one type don't overlap, so the periods intersecting a time
+    range are found by bisecting their ends.
+
+    @ivar types:
+        A dictionary of (starts, ends) array.array('q') pairs by FBTYPE.
+    """
+    def __init__(self, types=None):
+        self.types = types or {}
+
+    @classmethod
+    def fromComponents(cls, components):
+        """
+        Return the BusyPeriods of the FREEBUSY lines of VFREEBUSY components.
+
+        Lines parsed with transform=False are read from their text, without
+        building a list of datetimes per line.  FBTYPE=FREE periods are
+        ignored.
+        """
+        periods = {}
+        for component in components:
+            for line in component.contents.get('freebusy', ()):
+                fbtype = line.params.get('FBTYPE', [BUSY])[0].upper()
+                if fbtype != FREE:
+                    periods.setdefault(fbtype, []).extend(
+                        parsePeriods(line.value))
+        return cls(dict((fbtype, coalesce(sorted(pairs)))
+                        for fbtype, pairs in periods.items()))
+
+    @classmethod
+    def merge(cls, documents):
+        """
+        Return the union of several BusyPeriods, merging their sorted arrays
+        without sorting again.
+        """
+        types = {}
+        for document in documents:
+            for fbtype, arrays in document.types.items():
+                types.setdefault(fbtype, []).append(zip(*arrays))
+        return cls(dict((fbtype, coalesce(heapq.merge(*iterators)))
+                        for fbtype, iterators in types.items()))
+
+    def __len__(self):
+        return sum(len(starts) for starts, ends in self.types.values())
+
+    def overlapping(self, start, end, fbtypes=PRECEDENCE):
+        """
+        Return the periods of types fbtypes intersecting [start, end), aware
+        datetimes, as a list of (start, end, fbtype), ordered by start.
+        """
+        start, end = toTimestamp(start), toTimestamp(end)
+        found = []
+        for fbtype in fbtypes:
+            if fbtype not in self.types:
+                continue
+            starts, ends = self.types[fbtype]
+            position = bisect.bisect_right(ends, start)
+            while position < len(starts) and starts[position] < end:
+                found.append((fbtype, starts[position], ends[position]))
+                position += 1
+        found.sort(key=lambda period: period[1])
+        return [(fromTimestamp(periodStart), fromTimestamp(periodEnd),
+                 fbtype) for fbtype, periodStart, periodEnd in found]
+
+    def isBusy(self, start, end, fbtypes=PRECEDENCE):
+        """
+        Return True if [start, end) intersects a period of types fbtypes.
+        """
+        start, end = toTimestamp(start), toTimestamp(end)
+        for fbtype in fbtypes:
+            if fbtype in self.types:
+                starts, ends = self.types[fbtype]
+                position = bisect.bisect_right(ends, start)
+                if position < len(starts) and starts[position] < end:
+                    return True
+        return False
+
+    def periods(self, fbtype=BUSY):
+        """
+        Yield the periods of type fbtype as (start, end) UTC datetimes.
+        """
+        starts, ends = self.types.get(fbtype, ((), ()))
+        for start, end in zip(starts, ends):
+            yield fromTimestamp(start), fromTimestamp(end)
+
+
+def attendeeBusyPeriods(attendee, start, end, tzinfo, budget=None):
+    """
+    Return the BusyPeriods of an attendee: a BusyPeriods, a BusyTimeline, an
+    AvailabilityEvaluator, a VFREEBUSY component, or a VCALENDAR whose busy
+    time within [start, end) is computed.
+    """
+    if isinstance(attendee, BusyPeriods):
+        return attendee
+    if isinstance(attendee, BusyTimeline):
+        return BusyPeriods.fromComponents([attendee.vfreebusy()])
+    if isinstance(attendee, AvailabilityEvaluator):
+        return attendee.busyPeriods(start, end, tzinfo, budget)
+    if attendee.name == 'VFREEBUSY':
+        return BusyPeriods.fromComponents([attendee])
+    return BusyPeriods.fromComponents(
+        [computeFreeBusy([attendee], start, end, tzinfo, budget)])
+
+
+def workingPeriods(start, end, tzinfo, workingHours, weekdays):
+    """
+    Return the working periods within [start, end), UTC seconds, as sorted
+    (start, end) pairs.
+
+    workingHours is a (start, end) pair of wall clock times in tzinfo, or None
+    for the whole window, weekdays are the days worked, Monday being 0.
+    """
+    windowStart, windowEnd = toTimestamp(start), toTimestamp(end)
+    if workingHours is None:
+        return [(windowStart, windowEnd)]
+    periods = []
+    day = start.astimezone(tzinfo).date()
+    lastDay = end.astimezone(tzinfo).date()
+    while day <= lastDay:
+        if day.weekday() in weekdays:
+            dayStart = toTimestamp(localize(
+                datetime.datetime.combine(day, workingHours[0]), tzinfo))
+            dayEnd = toTimestamp(localize(
+                datetime.datetime.combine(day, workingHours[1]), tzinfo))
+            dayStart, dayEnd = max(dayStart, windowStart), min(dayEnd,
+                                                               windowEnd)
+            if dayStart < dayEnd:
+                periods.append((dayStart, dayEnd))
+        day += datetime.timedelta(days=1)
+    return periods
+
+
+def sweepFreeSlots(busy, working, duration, step, count):
+    """
+    Return up to count slots as (start, end) UTC seconds, duration long and
+    step apart within a free period, in the working periods outside of the
+    coalesced busy periods.
+    """
+    busyStarts, busyEnds = busy
+    slots = []
+    for workStart, workEnd in working:
+        position = bisect.bisect_right(busyEnds, workStart)
+        free = workStart
+        while free < workEnd:
+            if position < len(busyStarts) and busyStarts[position] < workEnd:
+                freeEnd = busyStarts[position]
+            else:
+                freeEnd = workEnd
+            while free + duration <= freeEnd:
+                slots.append((free, free + duration))
+                if len(slots) == count:
+                    return slots
+                free += step
+            if freeEnd == workEnd:
+                break
+            free = max(free, busyEnds[position])
+            position += 1
+    return slots
+
+
+def bitmapFreeSlots(busyPeriods, working, windowStart, resolution, duration,
+                    step, count):
+    """
+    Return up to count slots like sweepFreeSlots, using bitmaps of
+    resolution second buckets from windowStart: busy time is rounded out to
+    whole buckets, working time in to whole buckets.
+    """
+    free = 0
+    for start, end in working:
+        first = -(-(start - windowStart) // resolution)
+        last = (end - windowStart) // resolution
+        if first < last:
+            free |= ((1 << (last - first)) - 1) << first
+    busy = 0
+    for start, end in busyPeriods:
+        first = (start - windowStart) // resolution
+        last = -(-(end - windowStart) // resolution)
+        if first < 0:
+            first = 0
+        if first < last:
+            busy |= ((1 << (last - first)) - 1) << first
+    free &= ~busy
+
+    # bit i of runs is set if buckets i to i + length - 1 are free
+    needed = -(-duration // resolution)
+    runs, length = free, 1
+    while length < needed:
+        shift = min(length, needed - length)
+        runs &= runs >> shift
+        length += shift
+
+    stepBuckets = max(1, -(-step // resolution))
+    slots = []
+    while runs and len(slots) < count:
+        bucket = (runs & -runs).bit_length() - 1
+        start = windowStart + bucket * resolution
+        slots.append((start, start + duration))
+        runs &= ~((1 << (bucket + stepBuckets)) - 1)
+    return slots
+
+
+def findFreeSlots(attendees, start, end, duration, count=1, tzinfo=None,
+                  workingHours=None, weekdays=range(5), step=None,
+                  fbtypes=PRECEDENCE, resolution=None, budget=None):
+    """
+    Return the first count slots within [start, end) when all attendees are
+    free, as a list of (start, end) datetimes in tzinfo.
+
+    attendees may be calendars, VFREEBUSY components, L{BusyTimeline}s,
+    L{AvailabilityEvaluator}s or L{BusyPeriods}.  Time busy with one of
+    fbtypes is unavailable.  Slots are duration long, a timedelta, and start
+    step apart within free time, step defaults to duration.  workingHours, a
+    (start, end) pair of times, and weekdays limit slots to working days and
+    hours in tzinfo, which defaults to start's timezone, or UTC.
+
+    Busy times are merged into sorted intervals and intersected with working
+    time in one sweep.  If resolution, a timedelta, is given, free time is
+    computed with bitmaps of buckets that long instead, which is faster for
+    many attendees with many busy periods, but rounds busy time out to the
+    buckets.  Expanding the attendees' calendars is limited by budget, an
+    L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}, or the default
+    budget.
+    """
+    if tzinfo is None:
+        tzinfo = getattr(start, 'tzinfo', None) or utc
+    start, end = localize(start, tzinfo), localize(end, tzinfo)
+    windowStart, windowEnd = toTimestamp(start), toTimestamp(end)
+    duration = int(duration.total_seconds())
+    step = duration if step is None else int(step.total_seconds())
+    budget = getBudget(budget)
+
+    runs = []
+    for attendee in attendees:
+        periods = attendeeBusyPeriods(attendee, start, end, tzinfo, budget)
+        for fbtype in fbtypes:
+            if fbtype in periods.types:
+                starts, ends = periods.types[fbtype]
+                first = bisect.bisect_right(ends, windowStart)
+                last = bisect.bisect_left(starts, windowEnd)
+                runs.append(zip(starts[first:last], ends[first:last]))
+    # sorting runs of sorted periods is a merge of the runs
+    busyPeriods = sorted(itertools.chain.from_iterable(runs))
+    working = workingPeriods(start, end, tzinfo, workingHours, weekdays)
+
+    if resolution is None:
+        slots = sweepFreeSlots(coalesce(busyPeriods), working, duration,
+                               step, count)
+    else:
+        slots = bitmapFreeSlots(busyPeriods, working, windowStart,
+                                int(resolution.total_seconds()), duration,
+                                step, count)
+    return [(fromTimestamp(slotStart).astimezone(tzinfo),
+             fromTimestamp(slotEnd).astimezone(tzinfo))
+            for slotStart, slotEnd in slots]
+
+
+# AVAILABLE components are expanded and cached in blocks of this many seconds
+AVAILABLE_BLOCK = 28 * 24 * 3600
+
+# Maximum number of expanded blocks an AvailabilityEvaluator keeps
+AVAILABLE_CACHE_SIZE = 4096
+
+
+def availabilityRange(component):
+    """
+    Return the (start, end) of a VAVAILABILITY component as aware datetimes,
+    each None if unbounded.
+    """
+    start = component.getChildValue('dtstart')
+    end = component.getChildValue('dtend')
+    if end is None:
+        duration = component.getChildValue('duration')
+        if start is not None and duration is not None:
+            end = start + duration
+    return start, end
+
+
+def availabilityRank(component):
+    """
+    Return the rank of a VAVAILABILITY's PRIORITY, 1 for the highest, 10 for
+    an undefined priority, which is the lowest.
+    """
+    try:
+        priority = int(component.getChildValue('priority') or 0)
+    except ValueError:
+        priority = 0
+    return priority if 1 <= priority <= 9 else 10
+
+
+class AvailabilityEvaluator(object):
+    """
+    Compute the availability described by VAVAILABILITY components.
+
+    Following RFC 7953, time within a VAVAILABILITY's range is busy with its
+    BUSYTYPE, BUSY-UNAVAILABLE by default, except during its AVAILABLE
+    occurrences.  Where components overlap, the one with the highest
+    PRIORITY (1, then 2, ... then undefined) decides; components of the same
+    priority are combined, time available in one of them is free.
+
+    The occurrences of AVAILABLE components are expanded in blocks of
+    AVAILABLE_BLOCK seconds and cached, so repeated queries don't expand
+    them again.  Changes to an AVAILABLE's times or recurrence are noticed
+    like L{getrruleset<vobject.icalendar.RecurringComponent.getrruleset>}
+    notices them, call clear after other changes.
+    """
+    def __init__(self, components, cacheSize=AVAILABLE_CACHE_SIZE):
+        """
+        components are VAVAILABILITY components, or calendars containing
+        them.
+        """
+        self.components = []
+        for component in components:
+            if component.name == 'VAVAILABILITY':
+                self.components.append(component)
+            else:
+                self.components.extend(
+                    component.contents.get('vavailability', ()))
+        self.cache = LRUCache(cacheSize)
+
+    def clear(self):
+        self.cache.clear()
+
+    def signature(self, available, overrides):
+        """
+        Return what the occurrences of available depend on, in the format of
+        recurrenceSignature.
+        """
+        signature = available.recurrenceSignature()
+        for component in [available] + overrides:
+            for name in ('dtend', 'duration'):
+                for line in component.contents.get(name, ()):
+                    signature += ((line, line.value, None),)
+            if component is not available:
+                signature += ((component, None, None),)
+                signature += component.recurrenceSignature()
+        return signature
+
+    def blockOccurrences(self, available, index, block, tzinfo, budget=None):
+        """
+        Return the occurrences of available intersecting block, as (start,
+        end) UTC seconds.  Blocks truncated by budget aren't cached.
+        """
+        uid = available.getChildValue('uid')
+        overrides = list(index.overrides.get(uid, {}).values())
+        signature = self.signature(available, overrides)
+        key = (id(available), block, id(tzinfo))
+        cached = self.cache.get(key)
+        if (cached is not None and cached[0] is available and
+                cached[1] is tzinfo and sameSignature(cached[2], signature)):
+            return cached[3]
+
+        blockStart = fromTimestamp(block * AVAILABLE_BLOCK)
+        blockEnd = fromTimestamp((block + 1) * AVAILABLE_BLOCK)
+        occurrences = []
+        for component in [available] + overrides:
+            for occurrence in expandComponent(component, blockStart, blockEnd,
+                                              tzinfo, index, budget):
+                occurrences.append(
+                    (toTimestamp(localize(occurrence.start, tzinfo)),
+                     toTimestamp(localize(occurrence.end, tzinfo))))
+        if budget is None or not budget.truncated:
+            self.cache.put(key, (available, tzinfo, signature, occurrences))
+        return occurrences
+
+    def availableTimes(self, component, windowStart, windowEnd, tzinfo,
+                       budget=None):
+        """
+        Return the occurrences of component's AVAILABLE subcomponents
+        intersecting the window, UTC seconds, as (start, end) pairs.
+        """
+        availables = component.contents.get('available', ())
+        if not availables:
+            return []
+        index = OverrideIndex(availables)
+        times = set()
+        for available in availables:
+            if 'recurrence-id' in available.contents:
+                continue
+            for block in range(windowStart // AVAILABLE_BLOCK,
+                               (windowEnd - 1) // AVAILABLE_BLOCK + 1):
+                times.update(self.blockOccurrences(available, index, block,
+                                                   tzinfo, budget))
+        return [(start, end) for start, end in times
+                if start < windowEnd and end > windowStart]
+
+    def periods(self, start, end, tzinfo=None, budget=None):
+        """
+        Return the availability within [start, end), as a list of
+        (start, end, fbtype) with UTC datetimes, ordered and coalesced.
+
+        fbtype is FREE for available time, or the BUSYTYPE of busy time.
+        Time outside of all VAVAILABILITY components isn't included.  start
+        and end may be dates or datetimes, floating times, dates and naive
+        bounds are taken to be in tzinfo, which defaults to start's timezone,
+        or UTC.  Expansion is limited by budget, an
+        L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}, or the
+        default budget.
+        """
+        if tzinfo is None:
+            tzinfo = getattr(start, 'tzinfo', None) or utc
+        windowStart = toTimestamp(localize(start, tzinfo))
+        windowEnd = toTimestamp(localize(end, tzinfo))
+        budget = getBudget(budget)
+
+        # sweep events: (time, rank, fbtype or FREE, +1 or -1)
+        events = []
+        for component in self.components:
+            rangeStart, rangeEnd = availabilityRange(component)
+            rangeStart = (windowStart if rangeStart is None else
+                          max(toTimestamp(localize(rangeStart, tzinfo)),
+                              windowStart))
+            rangeEnd = (windowEnd if rangeEnd is None else
+                        min(toTimestamp(localize(rangeEnd, tzinfo)),
+                            windowEnd))
+            if rangeStart >= rangeEnd:
+                continue
+            rank = availabilityRank(component)
+            busyType = (component.getChildValue('busytype') or
+                        BUSY_UNAVAILABLE).upper()
+            events.append((rangeStart, rank, busyType, 1))
+            events.append((rangeEnd, rank, busyType, -1))
+            for available in self.availableTimes(component, rangeStart,
+                                                 rangeEnd, tzinfo, budget):
+                events.append((max(available[0], rangeStart), rank, FREE, 1))
+                events.append((min(available[1], rangeEnd), rank, FREE, -1))
+        events.sort()
+
+        # counts[rank][fbtype] is the number of ranges or occurrences active
+        counts = dict((rank, {}) for rank in range(1, 11))
+        periods = []
+        for time, group in itertools.groupby(events, lambda event: event[0]):
+            for _, rank, fbtype, delta in group:
+                counts[rank][fbtype] = counts[rank].get(fbtype, 0) + delta
+            state = None
+            for rank in range(1, 11):
+                active = counts[rank]
+                if any(active.values()):
+                    if active.get(FREE):
+                        state = FREE
+                    else:
+                        state = next(
+                            (fbtype for fbtype in PRECEDENCE
+                             if active.get(fbtype)),
+                            min(fbtype for fbtype in active
+                                if active[fbtype]))
+                    break
+            if periods and periods[-1][1] is None:
+                if periods[-1][2] == state:
+                    continue
+                periods[-1][1] = time
+            if state is not None:
+                periods.append([time, None, state])
+        return [(fromTimestamp(periodStart), fromTimestamp(periodEnd), fbtype)
+                for periodStart, periodEnd, fbtype in periods
+                if periodStart < periodEnd]
+
+    def busyPeriods(self, start, end, tzinfo=None, budget=None):
+        """
+        Return the busy time within [start, end) as L{BusyPeriods}, for
+        findFreeSlots.
+        """
+        periods = {}
+        for periodStart, periodEnd, fbtype in self.periods(start, end,
+                                                           tzinfo, budget):
+            if fbtype != FREE:
+                periods.setdefault(fbtype, []).append(
+                    (toTimestamp(periodStart), toTimestamp(periodEnd)))
+        return BusyPeriods(dict((fbtype, coalesce(pairs))
+                                for fbtype, pairs in periods.items()))
@@ -2,42 +2,67 @@
 
 from __future__ import print_function
 
+import collections
 import datetime
 import logging
 import random  # for generating a UID
-import socket
 import string
 import base64
+import threading
+
+from timeit import default_timer as clock
 
 from dateutil import rrule, tz
 import six
 
-try:
-    import pytz
-except ImportError:
-    class Pytz:
-        """fake pytz module (pytz is not required)"""
 
-        class AmbiguousTimeError(Exception):
-            """pytz error for ambiguous times
-               during transition daylight->standard"""
+class Pytz:
+    """fake pytz module (pytz is not required)"""
+
+    class AmbiguousTimeError(Exception):
+        """pytz error for ambiguous times
+           during transition daylight->standard"""
 
-        class NonExistentTimeError(Exception):
-            """pytz error for non-existent times
-               during transition standard->daylight"""
+    class NonExistentTimeError(Exception):
+        """pytz error for non-existent times
+           during transition standard->daylight"""
+
+
+class LazyPytz(object):
+    """
+    Stand-in for pytz, importing it when an attribute is first used.
 
-    pytz = Pytz  # keeps quantifiedcode happy
+    Only pytz's timezones raise its errors, so the except clauses naming them
+    import nothing until pytz is in use anyway.
+    """
+    def __getattr__(self, name):
+        global pytz
+        try:
+            import pytz
+        except ImportError:
+            pytz = Pytz
+        return getattr(pytz, name)
+
+pytz = LazyPytz()
+
+try:
+    import zoneinfo
+except ImportError:
+    zoneinfo = None  # zoneinfo is only in the standard library from 3.9
 
 from . import behavior
+from .recurrence import emptyRule, isImpossible, seekRruleset
 from .base import (VObjectError, NativeError, ValidateError, ParseError,
                    Component, ContentLine, logger, registerBehavior,
-                   backslashEscape, foldOneLine)
+                   backslashEscape, foldOneLine, getParseContext, getParseStats,
+                   timedPhase, escapableCharList, stringToTextValues)
 
 
 # ------------------------------- Constants ------------------------------------
 DATENAMES = ("rdate", "exdate")
 RULENAMES = ("exrule", "rrule")
 DATESANDRULES = ("exrule", "rrule", "rdate", "exdate")
+RECURRENCENAMES = ("dtstart", "due") + DATESANDRULES
 PRODID = u"-//PYVOBJECT//NONSGML Version 1//EN"
 
 WEEKDAYS = "MO", "TU", "WE", "TH", "FR", "SA", "SU"
@@ -51,6 +76,76 @@ twoHours = datetime.timedelta(hours=2)
 # ---------------------------- TZID registry -----------------------------------
 __tzidMap = {}
 
+# Maximum number of resolved (hits) and unresolvable (misses) TZIDs to keep
+TZID_CACHE_SIZE = 512
+
+
+# marks keys absent from an LRUCache, whose values may be None
+_missing = object()
+
+
+class LRUCache(object):
+    """
+    A bounded, least-recently-used mapping.
+
+    Used to remember the results of slow lookups, like the TZID resolvers
+    (zoneinfo, pytz) or RRULE parsing, without letting arbitrary strings from
+    untrusted input grow the cache without bound.
+
+    The module-level caches are shared by threads.  Changes are made under a
+    lock, lookups only mark a key as recently used if the lock is free, so
+    hits never wait.  Marking a key removes it for a moment, so a key not
+    found is looked up again under the lock before reporting a miss.
+    """
+    def __init__(self, maxsize=TZID_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.data = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        if key in self.data:
+            return True
+        with self.lock:
+            return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        value = self.data.get(key, _missing)
+        if value is _missing:
+            with self.lock:
+                return self.data.get(key, default)
+        # pop and re-insert to mark key as recently used, OrderedDict's
+        # move_to_end is only in Python 3
+        if self.lock.acquire(False):
+            try:
+                if self.data.pop(key, _missing) is not _missing:
+                    self.data[key] = value
+            finally:
+                self.lock.release()
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+__tzidCache = LRUCache()    # TZIDs resolved by the fallback resolvers
+__tzidMisses = LRUCache()   # TZIDs no resolver knows about
+__tzidAliases = {}
+
 
 def toUnicode(s):
     """
@@ -61,34 +156,256 @@ def toUnicode(s):
     return s
 
 
+def tzidCaches(context):
+    """
+    Return the (hits, misses) LRUCaches to use with context, which may be None.
+
+    Each ParseContext gets its own caches, so threads parsing with separate
+    contexts don't share them.
+    """
+    if context is None:
+        return __tzidCache, __tzidMisses
+    caches = context.caches.get('tzid')
+    if caches is None:
+        caches = context.caches['tzid'] = (LRUCache(), LRUCache())
+    return caches
+
+
 def registerTzid(tzid, tzinfo):
     """
     Register a tzid -> tzinfo mapping.
+
+    While a ParseContext is active, the mapping is registered in the context,
+    otherwise in the global registry.
+    """
+    tzid = toUnicode(tzid)
+    context = getParseContext()
+    if context is None:
+        __tzidMap[tzid] = tzinfo
+    else:
+        context.tzids[tzid] = tzinfo
+    hits, misses = tzidCaches(context)
+    hits.discard(tzid)
+    misses.discard(tzid)
+
+
+def registerTzidAlias(alias, tzid):
+    """
+    Make the non-standard TZID alias resolve like the (IANA) TZID tzid.
     """
-    __tzidMap[toUnicode(tzid)] = tzinfo
+    alias = toUnicode(alias)
+    __tzidAliases[alias] = toUnicode(tzid)
+    __tzidCache.discard(alias)
+    __tzidMisses.discard(alias)
+
+
+def clearTzidCache():
+    """
+    Forget the results of previous TZID resolutions, successful or not.
+    """
+    __tzidCache.clear()
+    __tzidMisses.clear()
+
+
+def zoneinfoTimezone(tzid):
+    """
+    Return a zoneinfo.ZoneInfo for the IANA tzid, or None.
+    """
+    if zoneinfo is None:
+        return None
+    try:
+        return zoneinfo.ZoneInfo(tzid)
+    except (KeyError, ValueError, UnicodeError, OSError):
+        # ZoneInfoNotFoundError is a KeyError, malformed keys raise ValueError
+        return None
+
+
+def pytzTimezone(tzid):
+    """
+    Return a pytz timezone for tzid, or None.
+    """
+    try:
+        from pytz import timezone
+    except ImportError:
+        return None
+    try:
+        return timezone(tzid)
+    except (KeyError, ValueError, UnicodeError):
+        # UnknownTimeZoneError is a KeyError
+        return None
+
+
+def ianaTimezone(name):
+    """
+    Return a tzinfo for the IANA timezone name, or None.
+    """
+    return zoneinfoTimezone(name) or pytzTimezone(name)
+
+
+def aliasTimezone(tzid):
+    """
+    Return the timezone for a registered or built-in alias of tzid, or None.
+
+    Built-in aliases cover Windows timezone ids and the display names Outlook,
+    Exchange and Lotus Notes use as TZIDs, see L{tzaliases}.
+    """
+    target = __tzidAliases.get(tzid)
+    if target is None:
+        from . import tzaliases
+        target = tzaliases.lookup(tzid)
+        if target is None:
+            return None
+    return ianaTimezone(target)
+
+
+def abbreviatedAliasTimezone(tzid):
+    """
+    Return the timezone for a Lotus Notes style abbreviated Windows timezone
+    id like "Eastern" or "W. Europe", or None.
+
+    Tried after zoneinfo and pytz, because some abbreviations, like GMT, are
+    also IANA names.
+    """
+    from . import tzaliases
+    target = tzaliases.lookup(tzid, guessSuffix=True)
+    if target is None:
+        return None
+    return ianaTimezone(target)
+
+
+# Resolvers tried, in order, for TZIDs which aren't registered.  Alias lookups
+# are dictionary accesses, so they come before zoneinfo and pytz, which search
+# the disk for every TZID they don't know.
+tzidResolvers = [aliasTimezone, zoneinfoTimezone, pytzTimezone,
+                 abbreviatedAliasTimezone]
+
+
+def resolveTzid(tzid):
+    """
+    Run tzid through tzidResolvers, return the first tzinfo found, or None.
+
+    Results aren't cached, use getTzid for that.
+    """
+    for resolver in tzidResolvers:
+        tz = resolver(tzid)
+        if tz is not None:
+            return tz
+    return None
 
 
 def getTzid(tzid, smart=True):
     """
     Return the tzid if it exists, or None.
-    """
-    tz = __tzidMap.get(toUnicode(tzid), None)
-    if smart and tzid and not tz:
-        try:
-            from pytz import timezone, UnknownTimeZoneError
-            try:
-                tz = timezone(tzid)
-                registerTzid(toUnicode(tzid), tz)
-            except UnknownTimeZoneError as e:
-                logging.error(e)
-        except ImportError as e:
-            logging.error(e)
+
+    If smart is True, TZIDs which haven't been registered are looked up with
+    resolveTzid.  Both hits and misses are remembered, so each unknown TZID is
+    only resolved, and logged, once.
+    """
+    tzid = toUnicode(tzid)
+    context = getParseContext()
+    if context is not None:
+        tz = context.tzids.get(tzid)
+        if tz is not None:
+            return tz
+    tz = __tzidMap.get(tzid, None)
+    if tz is not None or not smart or not tzid:
+        return tz
+    hits, misses = tzidCaches(context)
+    tz = hits.get(tzid)
+    if tz is not None or tzid in misses:
+        return tz
+    with timedPhase('tz'):
+        tz = resolveTzid(tzid)
+    if tz is None:
+        misses.put(tzid, True)
+        logger.error(u"Unknown TZID {0!r}, using floating time".format(tzid))
+    else:
+        hits.put(tzid, tz)
     return tz
 
 utc = tz.tzutc()
 registerTzid("UTC", utc)
 
 
+class TzinfoPool(object):
+    """
+    Canonical tzinfo objects for VTIMEZONEs, shared across parsed calendars.
+
+    Each calendar in a batch import usually carries its own copy of the same
+    VTIMEZONEs.  Parsed with a pool, a VTIMEZONE with the same TZID and the
+    same rules as one seen before reuses that VTIMEZONE's tzinfo, without
+    parsing it again.  If the TZID is an IANA name and the rules agree with
+    the IANA zone from start to end, the IANA tzinfo is used instead, so
+    datetimes from different calendars share tzinfo objects and compare
+    cheaply.
+
+    The TZID is part of the key, so serializing a parsed calendar still
+    writes the TZIDs it was read with.  Pass the pool to a ParseContext to
+    use it, one pool can be shared by contexts in different threads::
+
+        pool = TzinfoPool()
+        for text in calendars:
+            readOne(text, context=ParseContext(tzPool=pool))
+
+    @ivar matchIana:
+        Whether to look for an equivalent IANA zone.
+    @ivar start:
+        First year compared with the IANA zone.
+    @ivar end:
+        Year after the last year compared with the IANA zone.
+    """
+    def __init__(self, matchIana=True, start=2010, end=2030):
+        self.matchIana = matchIana
+        self.start = start
+        self.end = end
+        self.tzinfos = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tzinfos)
+
+    @staticmethod
+    def fingerprint(component):
+        """
+        Return a hashable key for the TZID and rules of VTIMEZONE component.
+
+        Ordering of STANDARD and DAYLIGHT subcomponents and of their lines
+        doesn't matter.
+        """
+        rules = []
+        for comp in component.components():
+            lines = sorted((line.name, six.text_type(line.value))
+                           for line in comp.lines()
+                           if line.name.lower() in TimezoneComponent.ruleLines)
+            rules.append((comp.name, tuple(lines)))
+        return toUnicode(component.tzid.value), tuple(sorted(rules))
+
+    def canonical(self, component):
+        """
+        Return the canonical tzinfo for VTIMEZONE component.
+        """
+        key = self.fingerprint(component)
+        tzinfo = self.tzinfos.get(key)
+        if tzinfo is not None:
+            return tzinfo
+        tzinfo = component.tzinfo
+        if tzinfo is None:
+            return None
+        if self.matchIana:
+            tzid = key[0]
+            iana = ianaTimezone(tzid)
+            if (iana is not None and TimezoneComponent.pickTzid(iana) == tzid
+                    and offsetsAgree(tzinfo, iana, self.start, self.end)):
+                tzinfo = iana
+        with self.lock:
+            # another thread may have got here first
+            return self.tzinfos.setdefault(key, tzinfo)
+
+    def clear(self):
+        with self.lock:
+            self.tzinfos.clear()
+
+
 # -------------------- Helper subclasses ---------------------------------------
 class TimezoneComponent(Component):
     """
@@ -124,16 +441,27 @@ class TimezoneComponent(Component):
     def registerTzinfo(obj, tzinfo):
         """
         Register tzinfo if it's not already registered, return its tzid.
+
+        While a ParseContext is active, only TZIDs registered in the context
+        count, so a stream's own VTIMEZONEs take precedence over global ones.
         """
         tzid = obj.pickTzid(tzinfo)
-        if tzid and not getTzid(tzid, False):
-            registerTzid(tzid, tzinfo)
+        if tzid:
+            context = getParseContext()
+            if context is None:
+                if not getTzid(tzid, False):
+                    registerTzid(tzid, tzinfo)
+            elif context.tzids.get(tzid) is None:
+                context.tzids[tzid] = tzinfo
         return tzid
 
+    # the lines which define a timezone's rules
+    ruleLines = ('rdate', 'rrule', 'dtstart', 'tzname', 'tzoffsetfrom',
+                 'tzoffsetto')
+
     def gettzinfo(self):
         # workaround for dateutil failing to parse some experimental properties
-        good_lines = ('rdate', 'rrule', 'dtstart', 'tzname', 'tzoffsetfrom',
-                      'tzoffsetto', 'tzid')
+        good_lines = self.ruleLines + ('tzid',)
         # serialize encodes as utf-8, cStringIO will leave utf-8 alone
         buffer = six.StringIO()
         # allow empty VTIMEZONEs
@@ -341,6 +669,10 @@ class TimezoneComponent(Component):
         if hasattr(tzinfo, 'zone'):
             return toUnicode(tzinfo.zone)
 
+        # try zoneinfo's key
+        elif getattr(tzinfo, 'key', None):
+            return toUnicode(tzinfo.key)
+
         # try tzical's tzid key
         elif hasattr(tzinfo, '_tzid'):
             return toUnicode(tzinfo._tzid)
@@ -392,17 +724,82 @@ class RecurringComponent(Component):
 
         self.isNative = True
 
-    def getrruleset(self, addRDate=False):
+    def getrruleset(self, addRDate=False, seek=None):
         """
         Get an rruleset created from self.
 
         If addRDate is True, add an RDATE for dtstart if it's not included in
         an RRULE or RDATE, and count is decremented if it exists.
 
+        If seek is a datetime, the rules of the returned rruleset are sought
+        to it, see L{seekRruleset<vobject.recurrence.seekRruleset>}.
+        Occurrences from seek on are unchanged, but iterating doesn't walk
+        the occurrences before, which may be missing.  seek must be naive
+        for floating and all-day components.
+
         Note that for rules which don't match DTSTART, DTSTART may not appear
         in list(rruleset), although it should.  By default, an RDATE is not
         created in these cases, and count isn't updated, so dateutil may list
         a spurious occurrence.
+
+        The rruleset is built once and cached until a DTSTART, DUE, RRULE,
+        RDATE, EXRULE or EXDATE line is added, removed or given a new value.
+        Modifying a line's value in place isn't noticed, except for appending
+        to or removing from a list of dates.  Each call returns a new
+        rruleset, which callers are free to modify.
+
+        If a L{ParseStats<vobject.base.ParseStats>} with a slowThreshold is
+        active, a slow call is reported to it.  This only covers building the
+        rruleset, iterating it is reported by the expansion functions.
+
+        The returned rruleset is not limited by an
+        L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}, iterating it
+        directly can produce unboundedly many occurrences.  Iterate it with
+        L{iterInstances<vobject.recurrence.iterInstances>}, or use the
+        expansion functions of L{occurrences<vobject.occurrences>} and
+        L{intervals<vobject.intervals>}, to apply a budget.  Rules whose
+        BYMONTHDAY days exist in none of their months are replaced with empty
+        ones.  Other rules that can never match, like some with BYSETPOS or
+        BYWEEKNO, make dateutil search until year 9999, and even a budget's
+        deadline can't interrupt that search.
+        """
+        stats = getParseStats()
+        if stats is not None and stats.slowThreshold is not None:
+            start = clock()
+        else:
+            stats = None
+        signature = self.recurrenceSignature()
+        cache = self.__dict__.get('rrulesetCache')
+        if cache is None:
+            cache = self.rrulesetCache = {}
+        cached = cache.get(addRDate)
+        if cached is None or not sameSignature(cached[0], signature):
+            cached = cache[addRDate] = (signature,
+                                        self.buildrruleset(addRDate))
+        if seek is not None and cached[1] is not None:
+            rruleset = seekRruleset(cached[1], seek)
+        else:
+            rruleset = copyRruleset(cached[1])
+        if stats is not None:
+            stats.checkSlow('rruleset', self, clock() - start)
+        return rruleset
+
+    def recurrenceSignature(self):
+        """
+        Return the lines and values the rruleset is built from.
+
+        Values are kept, not just their ids, so they can't be garbage
+        collected and have their ids reused.
+        """
+        return tuple(
+            (line, line.value,
+             len(line.value) if isinstance(line.value, list) else None)
+            for name in RECURRENCENAMES
+            for line in self.contents.get(name, ()))
+
+    def buildrruleset(self, addRDate=False):
+        """
+        Create a new rruleset from self, see getrruleset.
         """
         rruleset = None
         for name in DATESANDRULES:
@@ -447,24 +844,15 @@ class RecurringComponent(Component):
                     # shouldn't get one, either:
                     ignoretz = (not isinstance(dtstart, datetime.datetime) or
                                 dtstart.tzinfo is None)
-                    try:
-                        until = rrule.rrulestr(value, ignoretz=ignoretz)._until
-                    except ValueError:
-                        # WORKAROUND: dateutil<=2.7.2 doesn't set the time zone
-                        # of dtstart
-                        if ignoretz:
-                            raise
-                        utc_now = datetime.datetime.now(datetime.timezone.utc)
-                        until = rrule.rrulestr(value, dtstart=utc_now)._until
+                    until, untilIsDate, template = parseRrule(value,
+                                                              ignoretz)
 
                     if until is not None and isinstance(dtstart,
                                                         datetime.datetime) and \
                             (until.tzinfo != dtstart.tzinfo):
                         # dateutil converts the UNTIL date to a datetime,
                         # check to see if the UNTIL parameter value was a date
-                        vals = dict(pair.split('=') for pair in
-                                    value.upper().split(';'))
-                        if len(vals.get('UNTIL', '')) == 8:
+                        if untilIsDate:
                             until = datetime.datetime.combine(until.date(),
                                                               dtstart.time())
                         # While RFC2445 says UNTIL MUST be UTC, Chandler allows
@@ -493,12 +881,10 @@ class RecurringComponent(Component):
                         if dtstart.tzinfo is None:
                             until = until.replace(tzinfo=None)
 
-                    value_without_until = ';'.join(
-                        pair for pair in value.split(';')
-                        if pair.split('=')[0].upper() != 'UNTIL')
-                    rule = rrule.rrulestr(value_without_until,
-                                          dtstart=dtstart, ignoretz=ignoretz)
+                    rule = makeRrule(value, template, dtstart, ignoretz)
                     rule._until = until
+                    if isImpossible(rule):
+                        rule = emptyRule(rule)
 
                     # add the rrule or exrule to the rruleset
                     addfunc(rule)
@@ -721,6 +1107,7 @@ class RecurringBehavior(VCalendarComponentBehavior):
             rand = int(random.random() * 100000)
             now = datetime.datetime.now(utc)
             now = dateTimeToString(now)
+            import socket
             host = socket.gethostname()
             obj.add(ContentLine('UID', [], "{0} - {1}@{2}".format(now, rand,
                                                                   host)))
@@ -998,7 +1385,8 @@ class VCalendar2_0(VCalendarComponentBehavior):
 
         cls.generateImplicitParameters(obj)
         if validate:
-            cls.validate(obj, raiseException=True)
+            with timedPhase('validate'):
+                cls.validate(obj, raiseException=True)
         if obj.isNative:
             transformed = obj.transformFromNative()
             undoTransform = True
@@ -1082,7 +1470,13 @@ class VTimezone(VCalendarComponentBehavior):
         if not obj.isNative:
             object.__setattr__(obj, '__class__', TimezoneComponent)
             obj.isNative = True
-            obj.registerTzinfo(obj.tzinfo)
+            context = getParseContext()
+            pool = context and context.options.get('tzPool')
+            with timedPhase('tz'):
+                if pool is None:
+                    obj.registerTzinfo(obj.tzinfo)
+                else:
+                    obj.registerTzinfo(pool.canonical(obj))
         return obj
 
     @staticmethod
@@ -1736,89 +2130,17 @@ def stringToDateTime(s, tzinfo=None):
         second = int(s[13:15])
         if len(s) > 15:
             if s[15] == 'Z':
-                tzinfo = getTzid('UTC')
+                tzinfo = utc
     except:
         raise ParseError("'{0!s}' is not a valid DATE-TIME".format(s))
     year = year and year or 2000
-    if tzinfo is not None and hasattr(tzinfo,'localize'):  # PyTZ case
+    # zoneinfo (and dateutil) tzinfos can be attached directly, only
+    # explicitly registered pytz timezones need localize
+    if tzinfo is not None and hasattr(tzinfo, 'localize'):  # PyTZ case
         return tzinfo.localize(datetime.datetime(year, month, day, hour, minute, second))
     return datetime.datetime(year, month, day, hour, minute, second, 0, tzinfo)
 
 
-# DQUOTE included to work around iCal's penchant for backslash escaping it,
-# although it isn't actually supposed to be escaped according to rfc2445 TEXT
-escapableCharList = '\\;,Nn"'
-
-
-def stringToTextValues(s, listSeparator=',', charList=None, strict=False):
-    """
-    Returns list of strings.
-    """
-    if charList is None:
-        charList = escapableCharList
-
-    def escapableChar(c):
-        return c in charList
-
-    def error(msg):
-        if strict:
-            raise ParseError(msg)
-        else:
-            logging.error(msg)
-
-    # vars which control state machine
-    charIterator = enumerate(s)
-    state = "read normal"
-
-    current = []
-    results = []
-
-    while True:
-        try:
-            charIndex, char = next(charIterator)
-        except:
-            char = "eof"
-
-        if state == "read normal":
-            if char == '\\':
-                state = "read escaped char"
-            elif char == listSeparator:
-                state = "read normal"
-                current = "".join(current)
-                results.append(current)
-                current = []
-            elif char == "eof":
-                state = "end"
-            else:
-                state = "read normal"
-                current.append(char)
-
-        elif state == "read escaped char":
-            if escapableChar(char):
-                state = "read normal"
-                if char in 'nN':
-                    current.append('\n')
-                else:
-                    current.append(char)
-            else:
-                state = "read normal"
-                # leave unrecognized escaped characters for later passes
-                current.append('\\' + char)
-
-        elif state == "end":  # an end state
-            if len(current) or len(results) == 0:
-                current = "".join(current)
-                results.append(current)
-            return results
-
-        elif state == "error":  # an end state
-            return results
-
-        else:
-            state = "error"
-            error("unknown state: '{0!s}' reached in {1!s}".format(state, s))
-
-
 def stringToDurations(s, strict=False):
     """
     Returns list of timedelta objects.
@@ -1972,6 +2294,108 @@ def stringToPeriod(s, tzinfo=None):
         return (start, stringToDateTime(valEnd, tzinfo))
 
 
+# Maximum number of parsed RRULE and EXRULE values to keep
+RRULE_CACHE_SIZE = 1024
+
+__rruleCache = LRUCache(RRULE_CACHE_SIZE)
+
+
+def parseRrule(value, ignoretz):
+    """
+    Parse an RRULE or EXRULE value, return (until, untilIsDate, template).
+
+    until is the UNTIL datetime as parsed by dateutil, or None, untilIsDate is
+    True if UNTIL was a DATE.  template is the rule without UNTIL parsed by
+    dateutil.rrule.rrulestr with a placeholder DTSTART, give it the real
+    DTSTART with makeRrule, or None if it can't be parsed without DTSTART.
+
+    Results are memoized by value and ignoretz, many events share the same
+    rules and dateutil's string parsing is slow.
+    """
+    key = (value, ignoretz)
+    parsed = __rruleCache.get(key)
+    if parsed is not None:
+        return parsed
+
+    try:
+        until = rrule.rrulestr(value, ignoretz=ignoretz)._until
+    except ValueError:
+        # WORKAROUND: dateutil<=2.7.2 doesn't set the time zone
+        # of dtstart
+        if ignoretz:
+            raise
+        utc_now = datetime.datetime.now(utc)
+        until = rrule.rrulestr(value, dtstart=utc_now)._until
+
+    untilIsDate = False
+    if until is not None:
+        for pair in value.upper().split(';'):
+            name, _, part = pair.partition('=')
+            if name == 'UNTIL':
+                untilIsDate = len(part) == 8
+
+    try:
+        template = rrule.rrulestr(withoutUntil(value), ignoretz=ignoretz,
+                                  dtstart=datetime.datetime(2000, 1, 1))
+    except ValueError:
+        # sub-daily BY* parts with an INTERVAL may be valid only for some
+        # DTSTARTs, leave the rule to makeRrule
+        template = None
+
+    parsed = until, untilIsDate, template
+    __rruleCache.put(key, parsed)
+    return parsed
+
+
+def withoutUntil(value):
+    """
+    Return the RRULE or EXRULE value without its UNTIL part.
+    """
+    return ';'.join(pair for pair in value.split(';')
+                    if pair.split('=')[0].upper() != 'UNTIL')
+
+
+def makeRrule(value, template, dtstart, ignoretz):
+    """
+    Return the rrule for value and dtstart from its parseRrule template.
+
+    Parts like BYMONTHDAY, which default to DTSTART's, are recomputed for
+    dtstart.  dateutil before 2.7 can't replace DTSTART, so value is parsed
+    again.
+    """
+    if template is not None and hasattr(template, 'replace'):
+        return template.replace(dtstart=dtstart)
+    return rrule.rrulestr(withoutUntil(value), dtstart=dtstart,
+                          ignoretz=ignoretz)
+
+
+def sameSignature(signature1, signature2):
+    """
+    Compare two RecurringComponent.recurrenceSignature results.
+    """
+    if len(signature1) != len(signature2):
+        return False
+    for (line1, value1, len1), (line2, value2, len2) in zip(signature1,
+                                                            signature2):
+        if line1 is not line2 or value1 is not value2 or len1 != len2:
+            return False
+    return True
+
+
+def copyRruleset(rruleset):
+    """
+    Return a new rruleset with the same rules and dates as rruleset, or None.
+    """
+    if rruleset is None:
+        return None
+    copy = rrule.rruleset()
+    copy._rrule = list(rruleset._rrule)
+    copy._rdate = list(rruleset._rdate)
+    copy._exrule = list(rruleset._exrule)
+    copy._exdate = list(rruleset._exdate)
+    return copy
+
+
 def getTransition(transitionTo, year, tzinfo):
     """
     Return the datetime of the transition to/from DST, or None.
@@ -2072,6 +2496,46 @@ def tzinfo_eq(tzinfo1, tzinfo2, startYear=2000, endYear=2020):
     return True
 
 
+def offsetsAgree(tzinfo1, tzinfo2, startYear=2010, endYear=2030):
+    """
+    Compare UTC offsets at the start of each month from startYear to endYear,
+    and either side of each of tzinfo2's transitions.
+
+    Unlike tzinfo_eq, instants are compared, not wall times, so the result
+    doesn't depend on how each tzinfo treats nonexistent or ambiguous times.
+    """
+    minute = datetime.timedelta(minutes=1)
+
+    def offsets(dt):
+        return (dt.astimezone(tzinfo1).utcoffset(),
+                dt.astimezone(tzinfo2).utcoffset())
+
+    previous = None
+    for year in range(startYear, endYear):
+        for month in range(1, 13):
+            dt = datetime.datetime(year, month, 1, tzinfo=utc)
+            offset1, offset2 = offsets(dt)
+            if offset1 != offset2:
+                return False
+            if previous is not None and offset2 != previous[1]:
+                # bisect to the minute of tzinfo2's transition
+                low, high = previous[0], dt
+                while high - low > minute:
+                    middle = low + (high - low) // 2
+                    middle -= datetime.timedelta(seconds=middle.second,
+                                                 microseconds=middle.microsecond)
+                    if middle.astimezone(tzinfo2).utcoffset() == previous[1]:
+                        low = middle
+                    else:
+                        high = middle
+                for edge in low, high:
+                    offset1, offset2 = offsets(edge)
+                    if offset1 != offset2:
+                        return False
+            previous = dt, offset2
+    return True
+
+
 # ------------------- Testing and running functions ----------------------------
 if __name__ == '__main__':
     import tests
@@ -0,0 +1,452 @@
+"""
+Answer time-range queries against large calendars without scanning them.
+
+An IntervalIndex stores the span of every component of a calendar: the
+start and end of components which don't recur, and the overall bounds of
+recurring series, from their first start to the end of their last
+occurrence, or unbounded.  Spans are kept in sorted lists grouped by length,
+each group holding spans shorter than a power of two seconds, so the spans
+intersecting a window are found with one bisection per group, and only the
+recurring series among them are expanded.
+
+getIntervalIndex returns the index of a calendar, which is kept up to date
+as components are added to and removed from the calendar::
+
+    index = getIntervalIndex(calendar)
+    for occurrence in index.between(start, end):
+        ...
+
+agenda merges the occurrences of many calendars in order, lazily, so the
+next few occurrences are found without expanding everything::
+
+    upcoming = list(itertools.islice(agenda(calendars, now), 20))
+"""
+
+import bisect
+import datetime
+import heapq
+import itertools
+
+from .icalendar import RecurringComponent, utc
+from .occurrences import (EXPANDED, expandComponent, futureMargin,
+                          getOverrideIndex, instanceOccurrence,
+                          lastSeriesStart, localize, oneDay, overlaps,
+                          startAndDuration)
+from .recurrence import getBudget, iterInstances, timedInstances
+
+epoch = datetime.datetime(1970, 1, 1)
+utcEpoch = epoch.replace(tzinfo=utc)
+# the end of open windows
+farFuture = datetime.datetime(9000, 1, 1, tzinfo=utc)
+
+# group of the spans without an end
+UNBOUNDED = None
+
+# series bounded by a COUNT of at most this many occurrences are iterated
+# once to find their end, when it can't be computed
+MAX_ITERATED_COUNT = 10000
+
+
+def toSeconds(value):
+    """
+    Return the seconds from the epoch to value, a date or datetime.
+
+    Dates, floating and aware times get comparable numbers: wall clock
+    seconds for dates and floating times, UTC seconds for aware times.
+    """
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        return (value - epoch).total_seconds()
+    return (value - utcEpoch).total_seconds()
+
+
+def isFloating(value):
+    return not isinstance(value, datetime.datetime) or value.tzinfo is None
+
+
+def isRecurring(component):
+    return (isinstance(component, RecurringComponent) and
+            'recurrence-id' not in component.contents and
+            ('rrule' in component.contents or
+             'rdate' in component.contents))
+
+
+def componentSpan(component):
+    """
+    Return (floating, start, end) for component in seconds, or None if it
+    has no time.
+
+    end is None for series which recur forever, or whose COUNT is too large
+    to find their last occurrence.
+    """
+    start, duration = startAndDuration(component)
+    if start is None:
+        return None
+    first = last = start
+    if isRecurring(component):
+        rruleset = component.getrruleset(addRDate=True)
+        if rruleset is not None:
+            last = lastSeriesStart(rruleset, MAX_ITERATED_COUNT)
+            if rruleset._rdate:
+                first = min(first, min(rruleset._rdate), key=toSeconds)
+    if last is None:
+        return isFloating(start), toSeconds(first), None
+    # adding durations to aware times is wall clock arithmetic
+    return isFloating(start), toSeconds(first), toSeconds(last + duration)
+
+
+def spanGroup(start, end):
+    """
+    Return the group of spans [start, end) belongs to: the number of bits
+    of its length in whole seconds, or UNBOUNDED.
+    """
+    if end is None:
+        return UNBOUNDED
+    return int(end - start).bit_length()
+
+
+class IntervalIndex(object):
+    """
+    The spans of a calendar's components, for finding the components which
+    may intersect a window.
+
+    Components are indexed with the times they have when they're added,
+    components without a time are indexed once they have one.  Call reindex
+    after changing an indexed component's times or recurrence rules.
+    """
+    def __init__(self, calendar, names=EXPANDED):
+        self.calendar = calendar
+        self.names = names
+        self.overrideIndex = getOverrideIndex(calendar)
+        # (floating, group): sorted list of (start, id(component))
+        self.groups = {}
+        # id(component): (component, floating, group, start, end)
+        self.entries = {}
+        self.pending = []
+        for name in names:
+            for component in calendar.contents.get(name, ()):
+                self.add(component)
+
+    def __len__(self):
+        self.refresh()
+        return len(self.entries)
+
+    def add(self, component):
+        span = componentSpan(component)
+        if span is None:
+            self.pending.append(component)
+            return
+        floating, start, end = span
+        group = spanGroup(start, end)
+        bisect.insort(self.groups.setdefault((floating, group), []),
+                      (start, id(component)))
+        self.entries[id(component)] = (component, floating, group, start, end)
+
+    def discard(self, component):
+        entry = self.entries.pop(id(component), None)
+        if entry is None:
+            if component in self.pending:
+                self.pending.remove(component)
+            return
+        component, floating, group, start, end = entry
+        spans = self.groups[(floating, group)]
+        del spans[bisect.bisect_left(spans, (start, id(component)))]
+        if not spans:
+            del self.groups[(floating, group)]
+
+    def reindex(self, component):
+        self.discard(component)
+        self.add(component)
+
+    def refresh(self):
+        """
+        Index pending components which have been given a time.
+        """
+        if self.pending:
+            pending, self.pending = self.pending, []
+            for component in pending:
+                self.add(component)
+
+    def childAdded(self, parent, child):
+        if child.name.lower() in self.names:
+            self.add(child)
+
+    def childRemoved(self, parent, child):
+        self.discard(child)
+
+    def search(self, windowStart, windowEnd, floating):
+        """
+        Yield the indexed components of a kind whose span intersects
+        [windowStart, windowEnd), given in seconds.
+        """
+        for (kind, group), spans in self.groups.items():
+            if kind != floating:
+                continue
+            if group is UNBOUNDED:
+                low = 0
+            else:
+                # spans in this group are shorter than 2 ** group seconds
+                low = bisect.bisect_left(spans, (windowStart - 2 ** group,))
+            high = bisect.bisect_left(spans, (windowEnd,))
+            for position in range(low, high):
+                entry = self.entries[spans[position][1]]
+                start, end = entry[3], entry[4]
+                if (end is None or end > windowStart or
+                        start == end == windowStart):
+                    yield entry[0]
+
+    def ordered(self, windowStart, tzinfo):
+        """
+        Return iterators, one per group, of (key, component) for the indexed
+        components which may intersect [windowStart, ...), ordered by key.
+
+        key is an aware datetime no later than the component's first
+        occurrence, floating times and dates being taken to be in tzinfo.
+        """
+        self.refresh()
+        iterators = []
+        for (floating, group), spans in self.groups.items():
+            if floating:
+                # the wall clock window, with a day to spare
+                start = toSeconds(windowStart.astimezone(tzinfo).replace(
+                    tzinfo=None) - oneDay)
+            else:
+                start = toSeconds(windowStart)
+            if group is UNBOUNDED:
+                low = 0
+            else:
+                low = bisect.bisect_left(spans, (start - 2 ** group,))
+            iterators.append(self.iterSpans(spans, low, start, floating,
+                                            tzinfo))
+        return iterators
+
+    def iterSpans(self, spans, position, windowStart, floating, tzinfo):
+        for start, key in itertools.islice(spans, position, None):
+            component, end = self.entries[key][0], self.entries[key][4]
+            if end is not None and end <= windowStart and start != end:
+                continue
+            if floating:
+                yield (localize(epoch + datetime.timedelta(seconds=start),
+                                tzinfo), component)
+            else:
+                yield utcEpoch + datetime.timedelta(seconds=start), component
+
+    def candidates(self, windowStart, windowEnd, tzinfo):
+        """
+        Return the components which may intersect the window, given as aware
+        datetimes, floating times and dates being taken to be in tzinfo.
+        """
+        self.refresh()
+        overrideIndex = self.overrideIndex
+        overrideIndex.refresh()
+        found = {}
+        for component in self.search(toSeconds(windowStart),
+                                     toSeconds(windowEnd), False):
+            found[id(component)] = component
+        # the wall clock window, with a day to spare for offset changes
+        wallStart = windowStart.astimezone(tzinfo).replace(tzinfo=None)
+        wallEnd = windowEnd.astimezone(tzinfo).replace(tzinfo=None)
+        for component in self.search(toSeconds(wallStart - oneDay),
+                                     toSeconds(wallEnd + oneDay), True):
+            found[id(component)] = component
+        # RANGE=THISANDFUTURE overrides may move instances into the window
+        for uid in overrideIndex.futures:
+            master = overrideIndex.master(uid)
+            if master is not None and id(master) in self.entries:
+                found[id(master)] = master
+        return list(found.values())
+
+    def between(self, start, end, tzinfo=None, names=None, budget=None):
+        """
+        Return the occurrences intersecting [start, end), in order.
+
+        Arguments and results are like
+        L{occurrences.expand<vobject.occurrences.expand>}'s, names defaults
+        to the names the index was built for.
+        """
+        budget = getBudget(budget)
+        if tzinfo is None:
+            tzinfo = getattr(start, 'tzinfo', None) or utc
+        windowStart = localize(start, tzinfo)
+        windowEnd = localize(end, tzinfo)
+        names = self.names if names is None else names
+
+        occurrences = []
+        for component in self.candidates(windowStart, windowEnd, tzinfo):
+            if component.name.lower() not in names:
+                continue
+            recurrenceId = component.getChildValue('recurrence_id')
+            if recurrenceId is None:
+                occurrences.extend(expandComponent(
+                    component, windowStart, windowEnd, tzinfo,
+                    self.overrideIndex, budget))
+            else:
+                for occurrence in expandComponent(component, windowStart,
+                                                  windowEnd, tzinfo,
+                                                  budget=budget):
+                    occurrences.append(occurrence._replace(
+                        recurrenceId=recurrenceId))
+
+        occurrences.sort(key=lambda o: localize(o.start, tzinfo))
+        return occurrences
+
+
+def getIntervalIndex(calendar):
+    """
+    Return the IntervalIndex of calendar's components.
+
+    The index is built on first use, then kept up to date as components are
+    added to and removed from calendar with add and remove.
+    """
+    index = calendar.__dict__.get('intervalIndex')
+    if index is None:
+        index = IntervalIndex(calendar)
+        calendar.intervalIndex = index
+        calendar.addObserver(index)
+    return index
+
+
+def iterSeries(component, windowStart, tzinfo, index, budget=None):
+    """
+    Yield the occurrences of recurring component intersecting
+    [windowStart, ...), in order, expanding its rruleset as they're asked for.
+
+    index is the calendar's OverrideIndex.  The instances looked at and the
+    occurrences yielded are counted against budget.
+    """
+    start, duration = startAndDuration(component)
+    uid = component.getChildValue('uid')
+    margin = futureMargin(index, uid)
+    after = windowStart - duration - margin
+    isDate = not isinstance(start, datetime.datetime)
+    if isDate or start.tzinfo is None:
+        after = after.astimezone(tzinfo).replace(tzinfo=None)
+    rruleset = component.getrruleset(addRDate=True, seek=after)
+    if rruleset is None:
+        for occurrence in expandComponent(component, windowStart, farFuture,
+                                          tzinfo, index, budget):
+            yield occurrence
+        return
+
+    # RANGE=THISANDFUTURE overrides move instances by up to margin, so
+    # occurrences are held back until no later instance can precede them
+    pending = []
+    counter = itertools.count()
+    for occurrenceStart in timedInstances(iterInstances(rruleset, budget),
+                                          component):
+        if occurrenceStart < after:
+            continue
+        if isDate:
+            occurrenceStart = occurrenceStart.date()
+        occurrence = instanceOccurrence(component, uid, occurrenceStart,
+                                        duration, index)
+        if occurrence is not None:
+            occurrenceKey = localize(occurrence.start, tzinfo)
+            if overlaps(occurrenceKey, localize(occurrence.end, tzinfo),
+                        windowStart, farFuture):
+                heapq.heappush(pending, (occurrenceKey, next(counter),
+                                         occurrence))
+        bound = localize(occurrenceStart, tzinfo) - margin
+        while pending and pending[0][0] <= bound:
+            if budget is not None and not budget.produce():
+                return
+            yield heapq.heappop(pending)[2]
+    while pending:
+        if budget is not None and not budget.produce():
+            return
+        yield heapq.heappop(pending)[2]
+
+
+def iterComponent(component, windowStart, tzinfo, index, budget=None):
+    """
+    Yield the occurrences of component intersecting [windowStart, ...), in
+    order.
+    """
+    if isRecurring(component):
+        return iterSeries(component, windowStart, tzinfo, index, budget)
+    occurrences = expandComponent(component, windowStart, farFuture, tzinfo,
+                                  budget=budget)
+    recurrenceId = component.getChildValue('recurrence_id')
+    if recurrenceId is None:
+        return occurrences
+    return (occurrence._replace(recurrenceId=recurrenceId)
+            for occurrence in occurrences)
+
+
+def agenda(calendars, start, tzinfo=None, names=EXPANDED, budget=None):
+    """
+    Yield the occurrences in calendars intersecting [start, ...), in order.
+
+    Occurrences are merged lazily with a heap: each calendar's
+    L{IntervalIndex} lists its components by start, and recurring series
+    are only expanded as far as their occurrences are asked for, so taking
+    the next few occurrences of many calendars doesn't expand them all.
+    Use itertools.islice to stop after some occurrences.  Calendars
+    shouldn't be modified while iterating.
+
+    start may be a date or datetime.  Floating times, dates and a naive start
+    are taken to be in tzinfo, which defaults to start's timezone, or UTC.
+    names are the (lowercase) names of the components to expand.  Occurrences
+    starting at the same time are yielded in the order of calendars.  The
+    expansion is limited by budget, an
+    L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}, or the default
+    budget; with an unbounded series the time and iteration limits apply to
+    the whole iteration, not to each occurrence.  A series slow to expand is
+    reported to the active L{ParseStats<vobject.base.ParseStats>}, if it has
+    a slowThreshold, once its iteration stops.
+
+    @return:
+        An iterator of L{Occurrence<vobject.occurrences.Occurrence>}s.
+    """
+    if tzinfo is None:
+        tzinfo = getattr(start, 'tzinfo', None) or utc
+    windowStart = localize(start, tzinfo)
+    budget = getBudget(budget)
+
+    # entries are (key, tiebreaker, occurrence, iterator, overrideIndex),
+    # iterators yield occurrences, or (key, component) for components not
+    # yet expanded, with the OverrideIndex of their calendar
+    heap = []
+    counter = itertools.count()
+
+    def push(iterator, overrideIndex=None):
+        for item in iterator:
+            if overrideIndex is None:
+                heapq.heappush(heap, (localize(item.start, tzinfo),
+                                      next(counter), item, iterator, None))
+            else:
+                heapq.heappush(heap, (item[0], next(counter), item[1],
+                                      iterator, overrideIndex))
+            return
+
+    indexes = []
+    for calendar in calendars:
+        index = getIntervalIndex(calendar)
+        index.overrideIndex.refresh()
+        indexes.append(index)
+        for spans in index.ordered(windowStart, tzinfo):
+            push(spans, index.overrideIndex)
+    # RANGE=THISANDFUTURE overrides may move instances before a series'
+    # first start, so these series are expanded right away
+    expanded = set()
+    for index in indexes:
+        overrideIndex = index.overrideIndex
+        for uid in overrideIndex.futures:
+            master = overrideIndex.master(uid)
+            if (master is not None and id(master) in index.entries and
+                    master.name.lower() in names):
+                expanded.add(id(master))
+                push(iterSeries(master, windowStart, tzinfo, overrideIndex,
+                                budget))
+
+    while heap:
+        key, tiebreaker, item, iterator, overrideIndex = heapq.heappop(heap)
+        if overrideIndex is None:
+            yield item
+            push(iterator)
+            continue
+        push(iterator, overrideIndex)
+        if id(item) not in expanded and item.name.lower() in names:
+            push(iterComponent(item, windowStart, tzinfo, overrideIndex,
+                               budget))
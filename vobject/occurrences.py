@@ -0,0 +1,466 @@
+"""
+Expand the VEVENTs, VTODOs and VJOURNALs of a calendar into occurrences.
+"""
+
+import bisect
+import collections
+import datetime
+
+from .icalendar import RecurringComponent, utc
+from .recurrence import (getBudget, iterInstances, lastOccurrence,
+                         timedInstances)
+
+# Components expanded by default
+EXPANDED = ('vevent', 'vtodo', 'vjournal')
+
+zeroDelta = datetime.timedelta(0)
+oneDay = datetime.timedelta(days=1)
+
+
+Occurrence = collections.namedtuple(
+    'Occurrence', ('uid', 'recurrenceId', 'start', 'end', 'component'))
+Occurrence.__doc__ = """
+One occurrence of a component.
+
+start and end are of the same kind as the component's DTSTART (or DUE): a
+date for all-day components, a naive datetime for floating times, an aware
+datetime otherwise.  recurrenceId identifies the occurrence in its series,
+it's None for components which don't recur.  component is the component
+the occurrence comes from, the master or an overriding instance.
+"""
+
+
+def localize(value, tzinfo):
+    """
+    Return value as an aware datetime.
+
+    Dates become midnight, dates and naive datetimes are taken to be in
+    tzinfo.
+    """
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        if hasattr(tzinfo, 'localize'):
+            # pytz timezones can't be used with replace
+            return tzinfo.localize(value)
+        return value.replace(tzinfo=tzinfo)
+    return value
+
+
+def recurrenceKey(value):
+    """
+    Normalize a RECURRENCE-ID or occurrence start for comparisons.
+
+    Dates become naive datetimes, like in an rruleset, aware datetimes are
+    converted to UTC.
+    """
+    if not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        return value.astimezone(utc)
+    return value
+
+
+def startAndDuration(component):
+    """
+    Return (start, duration) for component, or (None, None) if it has no time.
+
+    VTODOs without DTSTART occur at DUE, VEVENTs and RFC 7953 AVAILABLEs end
+    at DTEND.  Following RFC 5545, components without an end or duration
+    last for a day if they start on a date, and have no duration otherwise.
+    """
+    start = component.getChildValue('dtstart')
+    if component.name == 'VTODO':
+        due = component.getChildValue('due')
+        if start is None:
+            return (None, None) if due is None else (due, zeroDelta)
+        if due is not None:
+            return start, max(durationBetween(start, due), zeroDelta)
+    else:
+        if start is None:
+            return None, None
+        end = component.getChildValue('dtend')
+        if end is not None and component.name in ('VEVENT', 'AVAILABLE'):
+            return start, max(durationBetween(start, end), zeroDelta)
+    duration = component.getChildValue('duration')
+    if duration is not None:
+        return start, duration
+    if isinstance(start, datetime.datetime):
+        return start, zeroDelta
+    return start, oneDay
+
+
+def durationBetween(start, end):
+    """
+    Return end - start, even if one is a date and the other a datetime.
+    """
+    if isinstance(start, datetime.datetime) != isinstance(end,
+                                                          datetime.datetime):
+        start = recurrenceKey(start).replace(tzinfo=None)
+        end = recurrenceKey(end).replace(tzinfo=None)
+    elif (isinstance(start, datetime.datetime) and
+          (start.tzinfo is None) != (end.tzinfo is None)):
+        start = start.replace(tzinfo=None)
+        end = end.replace(tzinfo=None)
+    return end - start
+
+
+def overlaps(start, end, windowStart, windowEnd):
+    """
+    Return True if [start, end) intersects [windowStart, windowEnd).
+
+    An instant (start == end) intersects the window if it's inside it.
+    """
+    if start == end:
+        return windowStart <= start < windowEnd
+    return start < windowEnd and end > windowStart
+
+
+def lastSeriesStart(rruleset, limit=0):
+    """
+    Return the latest any occurrence of rruleset can start, or None if unknown.
+
+    Rules bounded by a COUNT of more than limit are only bounded if their
+    last occurrence can be computed, see
+    L{lastOccurrence<vobject.recurrence.lastOccurrence>}.
+    """
+    last = None
+    for rule in rruleset._rrule:
+        end = rule._until
+        if end is None:
+            end = lastOccurrence(rule, limit)
+            if end is None:
+                return None
+        if last is None or end > last:
+            last = end
+    for dt in rruleset._rdate:
+        if last is None or dt > last:
+            last = dt
+    return last
+
+
+def seriesCandidates(component, start, duration, windowStart, windowEnd,
+                     tzinfo, budget=None):
+    """
+    Return the starts of component's occurrences which may intersect the
+    window, in the same kind as start.
+
+    The instances looked at are counted against budget, an
+    L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}.
+    """
+    if not isinstance(component, RecurringComponent):
+        return [start]
+
+    # an occurrence starting before the window may still reach into it
+    after = windowStart - duration
+    before = windowEnd
+    isDate = not isinstance(start, datetime.datetime)
+    if isDate or start.tzinfo is None:
+        # rrulesets of floating and all-day components are naive
+        after = after.astimezone(tzinfo).replace(tzinfo=None)
+        before = before.astimezone(tzinfo).replace(tzinfo=None)
+
+    rruleset = component.getrruleset(addRDate=True, seek=after)
+    if rruleset is None:
+        return [start]
+    last = lastSeriesStart(rruleset)
+    if last is not None and localize(last, tzinfo) + duration < windowStart:
+        return []
+
+    starts = []
+    for dt in timedInstances(iterInstances(rruleset, budget), component):
+        if dt > before:
+            break
+        if dt >= after:
+            starts.append(dt)
+    if isDate:
+        return [dt.date() for dt in starts]
+    return starts
+
+
+class OverrideIndex(object):
+    """
+    Recurring series by UID: their master component, and the components
+    overriding instances, by normalized RECURRENCE-ID.
+
+    Components are indexed with the UID and RECURRENCE-ID they have when
+    they're added, components without a UID are indexed once they have one.
+    Call reindex after changing an indexed component's UID or RECURRENCE-ID.
+    Use getOverrideIndex for an index of a calendar which is kept up to date
+    as components are added and removed.
+
+    @ivar masters:
+        A dictionary of master components by UID.
+    @ivar overrides:
+        A dictionary of dictionaries of overriding components by UID, then
+        by recurrenceKey of their RECURRENCE-ID.
+    @ivar futures:
+        A dictionary of sorted lists, by UID, of the recurrenceKeys of
+        overrides with RANGE=THISANDFUTURE.
+    """
+    def __init__(self, components=(), names=EXPANDED):
+        self.names = names
+        self.masters = {}
+        self.overrides = collections.defaultdict(dict)
+        self.futures = collections.defaultdict(list)
+        self.entries = {}
+        self.pending = []
+        for component in components:
+            self.add(component)
+
+    def add(self, component):
+        uid = component.getChildValue('uid')
+        if uid is None:
+            self.pending.append(component)
+            return
+        lines = component.contents.get('recurrence-id')
+        if lines is None:
+            key = None
+            self.masters[uid] = component
+        else:
+            key = recurrenceKey(lines[0].value)
+            self.overrides[uid][key] = component
+            ranges = lines[0].params.get('RANGE', ())
+            if ranges and ranges[0].upper() == 'THISANDFUTURE':
+                try:
+                    bisect.insort(self.futures[uid], key)
+                except TypeError:
+                    # can't compare floating and UTC RECURRENCE-IDs
+                    pass
+        self.entries[id(component)] = (uid, key)
+
+    def discard(self, component):
+        entry = self.entries.pop(id(component), None)
+        if entry is None:
+            if component in self.pending:
+                self.pending.remove(component)
+            return
+        uid, key = entry
+        if key is None:
+            if self.masters.get(uid) is component:
+                del self.masters[uid]
+            return
+        instances = self.overrides.get(uid, {})
+        if instances.get(key) is component:
+            del instances[key]
+            if not instances:
+                del self.overrides[uid]
+            futures = self.futures.get(uid)
+            if futures and key in futures:
+                futures.remove(key)
+                if not futures:
+                    del self.futures[uid]
+
+    def reindex(self, component):
+        self.discard(component)
+        self.add(component)
+
+    def refresh(self):
+        """
+        Index pending components which have been given a UID.
+        """
+        if self.pending:
+            pending, self.pending = self.pending, []
+            for component in pending:
+                self.add(component)
+
+    def childAdded(self, parent, child):
+        if child.name.lower() in self.names:
+            self.add(child)
+
+    def childRemoved(self, parent, child):
+        self.discard(child)
+
+    def master(self, uid):
+        """
+        Return the master component of series uid, or None.
+        """
+        self.refresh()
+        return self.masters.get(uid)
+
+    def override(self, uid, recurrenceId):
+        """
+        Return the component overriding recurrenceId of series uid, or None.
+
+        A floating RECURRENCE-ID matches an aware recurrenceId with the same
+        wall clock time.
+        """
+        self.refresh()
+        instances = self.overrides.get(uid)
+        if not instances:
+            return None
+        component = instances.get(recurrenceKey(recurrenceId))
+        if component is None and getattr(recurrenceId, 'tzinfo', None):
+            component = instances.get(recurrenceId.replace(tzinfo=None))
+        return component
+
+    def thisAndFuture(self, uid, recurrenceId):
+        """
+        Return the RANGE=THISANDFUTURE override of series uid in effect at
+        recurrenceId, or None.
+        """
+        self.refresh()
+        futures = self.futures.get(uid)
+        if not futures:
+            return None
+        try:
+            position = bisect.bisect_right(futures, recurrenceKey(recurrenceId))
+        except TypeError:
+            return None
+        if position == 0:
+            return None
+        return self.overrides[uid][futures[position - 1]]
+
+
+def getOverrideIndex(calendar):
+    """
+    Return the OverrideIndex of calendar's components.
+
+    The index is built on first use, then kept up to date as components are
+    added to and removed from calendar with add and remove.
+    """
+    index = calendar.__dict__.get('overrideIndex')
+    if index is None:
+        index = OverrideIndex(component for name in EXPANDED
+                              for component in calendar.contents.get(name, ()))
+        calendar.overrideIndex = index
+        calendar.addObserver(index)
+    return index
+
+
+def futureShift(override):
+    """
+    Return (shift, duration) for a RANGE=THISANDFUTURE override: how far it
+    moves the instances it applies to, and their new duration.
+    """
+    start, duration = startAndDuration(override)
+    recurrenceId = override.getChildValue('recurrence_id')
+    return durationBetween(recurrenceId, start), duration
+
+
+def futureMargin(index, uid):
+    """
+    Return how far RANGE=THISANDFUTURE overrides of series uid may move its
+    instances' starts and ends, a timedelta.
+    """
+    futures = index.futures.get(uid)
+    if not futures:
+        return zeroDelta
+    return max(abs(shift) + length for shift, length in
+               (futureShift(index.overrides[uid][key]) for key in futures))
+
+
+def instanceOccurrence(component, uid, occurrenceStart, duration, index):
+    """
+    Return the Occurrence of the instance of series component starting at
+    occurrenceStart, or None if it's overridden.
+
+    If index, an OverrideIndex, is given, instances following a
+    RANGE=THISANDFUTURE override are moved and given its duration.
+    """
+    recurrenceId = occurrence = occurrenceStart
+    source = component
+    end = occurrenceStart + duration
+    if index is not None:
+        if index.override(uid, recurrenceId) is not None:
+            return None
+        future = index.thisAndFuture(uid, recurrenceId)
+        if future is not None:
+            shift, length = futureShift(future)
+            source = future
+            occurrence = occurrenceStart + shift
+            end = occurrence + length
+    return Occurrence(uid, recurrenceId, occurrence, end, source)
+
+
+def expandComponent(component, windowStart, windowEnd, tzinfo, index=None,
+                    budget=None):
+    """
+    Yield the Occurrences of component which intersect the window.
+
+    windowStart and windowEnd must be aware datetimes, floating and all-day
+    times are taken to be in tzinfo.  If index, an OverrideIndex, is given,
+    instances it has overrides for are skipped, and instances following a
+    RANGE=THISANDFUTURE override are moved and given its duration.
+    Expansion is limited by budget, or the default budget, see
+    L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}.
+    """
+    budget = getBudget(budget)
+    start, duration = startAndDuration(component)
+    if start is None:
+        return
+    uid = component.getChildValue('uid')
+    recurring = (isinstance(component, RecurringComponent) and
+                 ('rrule' in component.contents or
+                  'rdate' in component.contents))
+    if not recurring:
+        index = None
+    # moved instances may come from outside of the window
+    margin = zeroDelta if index is None else futureMargin(index, uid)
+    for occurrenceStart in seriesCandidates(component, start, duration,
+                                            windowStart - margin,
+                                            windowEnd + margin, tzinfo,
+                                            budget):
+        if recurring:
+            occurrence = instanceOccurrence(component, uid, occurrenceStart,
+                                            duration, index)
+            if occurrence is None:
+                continue
+        else:
+            occurrence = Occurrence(uid, None, occurrenceStart,
+                                    occurrenceStart + duration, component)
+        if overlaps(localize(occurrence.start, tzinfo),
+                    localize(occurrence.end, tzinfo), windowStart, windowEnd):
+            if budget is not None and not budget.produce():
+                return
+            yield occurrence
+
+
+def expand(calendar, start, end, tzinfo=None, names=EXPANDED, budget=None):
+    """
+    Return the occurrences in calendar intersecting [start, end), in order.
+
+    Recurring components are expanded with their RRULEs, RDATEs, EXRULEs and
+    EXDATEs, and occurrences overridden by a component with the same UID and
+    a RECURRENCE-ID are replaced by the overriding component's occurrence.
+    Overrides are found with the calendar's L{OverrideIndex}, see
+    L{getOverrideIndex}.
+
+    start and end may be dates or datetimes.  Floating times, dates and naive
+    window bounds are taken to be in tzinfo, which defaults to start's
+    timezone, or UTC.  names are the (lowercase) names of the components to
+    expand.  Expansion is limited by budget, an
+    L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}, or the default
+    budget.  Components slow to expand are reported to the active
+    L{ParseStats<vobject.base.ParseStats>}, if it has a slowThreshold.
+
+    @return:
+        A list of L{Occurrence}s, ordered by start.
+    """
+    if tzinfo is None:
+        tzinfo = getattr(start, 'tzinfo', None) or utc
+    windowStart = localize(start, tzinfo)
+    windowEnd = localize(end, tzinfo)
+    budget = getBudget(budget)
+
+    index = getOverrideIndex(calendar)
+    index.refresh()
+    occurrences = []
+    for name in names:
+        for component in calendar.contents.get(name, ()):
+            if 'recurrence-id' not in component.contents:
+                occurrences.extend(expandComponent(
+                    component, windowStart, windowEnd, tzinfo, index, budget))
+    for instances in index.overrides.values():
+        for component in instances.values():
+            if component.name.lower() not in names:
+                continue
+            recurrenceId = component.getChildValue('recurrence_id')
+            for occurrence in expandComponent(component, windowStart,
+                                              windowEnd, tzinfo,
+                                              budget=budget):
+                occurrences.append(occurrence._replace(
+                    recurrenceId=recurrenceId))
+
+    occurrences.sort(key=lambda o: localize(o.start, tzinfo))
+    return occurrences
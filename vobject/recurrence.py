@@ -0,0 +1,412 @@
+"""
+Seek recurrence rules to a date instead of iterating from DTSTART.
+
+dateutil's rrule iterates every occurrence from DTSTART on, so asking a
+daily rule which started ten years ago for next week's occurrences walks
+thousands of instances.  For the common rule shapes, FREQ and INTERVAL with
+BYMONTH, BYMONTHDAY and BYDAY (and the BYHOUR, BYMINUTE and BYSECOND dateutil
+derives from DTSTART), the period containing a date can be computed directly,
+and an equivalent rule starting at that period built.  Other rules, with
+BYSETPOS, BYWEEKNO, BYYEARDAY or BYEASTER, or with a COUNT that can't be
+computed, are left alone and iterated from DTSTART by dateutil.
+
+Expanding untrusted rules is bounded by ExpansionBudgets: the expansion
+functions of L{occurrences<vobject.occurrences>}, L{intervals
+<vobject.intervals>}, L{freebusy<vobject.freebusy>} and L{vectorized
+<vobject.vectorized>} accept one, and use a default budget set with
+setDefaultBudget otherwise.  Rules which can never match, like the 30th of
+February, are recognized and don't have dateutil search until year 9999.
+"""
+
+import datetime
+
+from timeit import default_timer as clock
+
+from dateutil import rrule
+
+from .base import ExpansionLimitError, getParseStats
+
+weekDelta = datetime.timedelta(weeks=1)
+
+# the most days each month can have
+monthDays = (None, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# length of a period of the sub-daily frequencies
+periodLengths = {
+    rrule.HOURLY: datetime.timedelta(hours=1),
+    rrule.MINUTELY: datetime.timedelta(minutes=1),
+    rrule.SECONDLY: datetime.timedelta(seconds=1),
+}
+
+
+def isSeekable(rule):
+    """
+    Return True if the period containing a date can be computed for rule.
+    """
+    return (rule._bysetpos is None and rule._byweekno is None and
+            rule._byyearday is None and rule._byeaster is None)
+
+
+def onePerPeriod(rule):
+    """
+    Return True if rule has exactly one occurrence in each of its periods.
+
+    This is the case when no BY* parts were given, and DTSTART's day exists
+    in every period, so COUNT can be computed from the number of periods.
+    """
+    dtstart = rule._dtstart
+    freq = rule._freq
+    if (rule._bynmonthday or rule._bynweekday or
+            (freq != rrule.YEARLY and rule._bymonth is not None)):
+        return False
+    if freq == rrule.YEARLY:
+        if (rule._bymonth != (dtstart.month,) or
+                rule._bymonthday != (dtstart.day,) or
+                (dtstart.month, dtstart.day) == (2, 29)):
+            return False
+    elif freq == rrule.MONTHLY:
+        if rule._bymonthday != (dtstart.day,) or dtstart.day > 28:
+            return False
+    elif rule._bymonthday:
+        return False
+    if freq == rrule.WEEKLY:
+        if rule._byweekday != (dtstart.weekday(),):
+            return False
+    elif rule._byweekday is not None:
+        return False
+    # BYHOUR on an HOURLY rule, say, filters periods rather than picking a
+    # time in each, otherwise the time must be DTSTART's or the first period
+    # may have no occurrence
+    for byxxx, finest, value in ((rule._byhour, rrule.HOURLY, dtstart.hour),
+                                 (rule._byminute, rrule.MINUTELY,
+                                  dtstart.minute),
+                                 (rule._bysecond, rrule.SECONDLY,
+                                  dtstart.second)):
+        if byxxx is not None and (freq >= finest or
+                                  tuple(byxxx) != (value,)):
+            return False
+    return True
+
+
+def wholeSeconds(delta):
+    """
+    Return a timedelta in whole seconds, rounded down.
+
+    Unlike total_seconds it's exact, and unlike dividing by a timedelta it
+    works on Python 2.
+    """
+    return delta.days * 86400 + delta.seconds
+
+
+def periodStart(rule, dt):
+    """
+    Return (n, start): the number of periods from rule's first period to the
+    last period starting with an interval boundary at or before dt, and the
+    beginning of that period.
+
+    Both dt and the returned start are naive wall clock times, like the
+    times dateutil iterates over.
+    """
+    dtstart = rule._dtstart.replace(tzinfo=None)
+    freq = rule._freq
+    interval = rule._interval
+    if freq == rrule.YEARLY:
+        periods = dt.year - dtstart.year
+        n = periods - periods % interval
+        return n, datetime.datetime(dtstart.year + n, 1, 1)
+    elif freq == rrule.MONTHLY:
+        periods = (dt.year - dtstart.year) * 12 + dt.month - dtstart.month
+        n = periods - periods % interval
+        years, month = divmod(dtstart.month - 1 + n, 12)
+        return n, datetime.datetime(dtstart.year + years, month + 1, 1)
+    elif freq == rrule.WEEKLY:
+        weekStart = dtstart.date() - datetime.timedelta(
+            days=(dtstart.weekday() - rule._wkst) % 7)
+        periods = (dt.date() - weekStart).days // 7
+        n = periods - periods % interval
+        return n, datetime.datetime.combine(weekStart + n * weekDelta,
+                                            datetime.time())
+    elif freq == rrule.DAILY:
+        periods = (dt.date() - dtstart.date()).days
+        n = periods - periods % interval
+        return n, datetime.datetime.combine(
+            dtstart.date() + datetime.timedelta(days=n), datetime.time())
+    else:
+        length = periodLengths[freq]
+        if freq == rrule.HOURLY:
+            first = dtstart.replace(minute=0, second=0)
+        elif freq == rrule.MINUTELY:
+            first = dtstart.replace(second=0)
+        else:
+            first = dtstart
+        periods = wholeSeconds(dt - first) // wholeSeconds(length)
+        n = periods - periods % interval
+        return n, first + n * length
+
+
+def seekRule(rule, dt):
+    """
+    Return a rule with the same occurrences as rule from dt on.
+
+    The returned rule starts at the beginning of the period containing dt,
+    so iterating it doesn't walk the occurrences before.  rule is returned
+    if it can't be sought, None if it has no occurrences from dt on.
+    """
+    dtstart = rule._dtstart
+    if (dtstart.tzinfo is None) != (dt.tzinfo is None):
+        return rule
+    if rule._until is not None and dt > rule._until:
+        return None
+    if dt <= dtstart or not isSeekable(rule):
+        return rule
+
+    if dtstart.tzinfo is not None:
+        dt = dt.astimezone(dtstart.tzinfo)
+    n, start = periodStart(rule, dt.replace(tzinfo=None))
+    if n <= 0:
+        return rule
+
+    count = rule._count
+    if count is not None:
+        if not onePerPeriod(rule):
+            return rule
+        count -= n // rule._interval
+        if count <= 0:
+            return None
+
+    byweekday = list(rule._byweekday or ())
+    byweekday.extend(rrule.weekday(day, nth)
+                     for day, nth in rule._bynweekday or ())
+    bymonthday = tuple(rule._bymonthday) + tuple(rule._bynmonthday)
+
+    sought = rrule.rrule(rule._freq, dtstart=start.replace(tzinfo=dtstart.tzinfo),
+                         interval=rule._interval, wkst=rule._wkst,
+                         count=count, bymonth=rule._bymonth,
+                         bymonthday=bymonthday, byweekday=byweekday or None,
+                         byhour=rule._byhour, byminute=rule._byminute,
+                         bysecond=rule._bysecond)
+    # like getrruleset, set UNTIL afterwards, it's already been adjusted
+    sought._until = rule._until
+    return sought
+
+
+def lastOccurrence(rule, limit=0):
+    """
+    Return the start of the last occurrence of rule, bounded by a COUNT, or
+    None if it has no COUNT or its last occurrence can't be found cheaply.
+
+    For rules with one occurrence per period it's computed from the number
+    of periods, other seekable rules are iterated if their COUNT is at most
+    limit.
+    """
+    count = rule._count
+    if count is None or count <= 0 or not isSeekable(rule):
+        return None
+    if not onePerPeriod(rule):
+        if count > limit:
+            return None
+        last = None
+        for last in rule:
+            pass
+        return last
+
+    # like dateutil, step DTSTART's wall clock time
+    dtstart = rule._dtstart
+    wall = dtstart.replace(tzinfo=None)
+    freq = rule._freq
+    n = (count - 1) * rule._interval
+    try:
+        if freq == rrule.YEARLY:
+            wall = wall.replace(year=wall.year + n)
+        elif freq == rrule.MONTHLY:
+            years, month = divmod(wall.month - 1 + n, 12)
+            wall = wall.replace(year=wall.year + years, month=month + 1)
+        elif freq == rrule.WEEKLY:
+            wall += n * weekDelta
+        elif freq == rrule.DAILY:
+            wall += datetime.timedelta(days=n)
+        else:
+            wall += n * periodLengths[freq]
+    except (ValueError, OverflowError):
+        # past year 9999, where dateutil stops
+        return None
+    return wall.replace(tzinfo=dtstart.tzinfo)
+
+
+def seekRruleset(rruleset, dt):
+    """
+    Return a new rruleset with the same occurrences as rruleset from dt on,
+    whose rules don't iterate over the occurrences before dt.
+    """
+    sought = rrule.rruleset()
+    for rule in rruleset._rrule:
+        rule = seekRule(rule, dt)
+        if rule is not None:
+            sought.rrule(rule)
+    for rule in rruleset._exrule:
+        rule = seekRule(rule, dt)
+        if rule is not None:
+            sought.exrule(rule)
+    sought._rdate = list(rruleset._rdate)
+    sought._exdate = list(rruleset._exdate)
+    return sought
+
+
+def isImpossible(rule):
+    """
+    Return True if rule can't have any occurrence because its BYMONTHDAY days
+    don't exist in any of its months.
+
+    dateutil doesn't notice, it searches for an occurrence until year 9999.
+    Other impossible combinations, with BYSETPOS, BYWEEKNO or BYYEARDAY, say,
+    aren't detected.
+    """
+    if not (rule._bymonthday or rule._bynmonthday):
+        return False
+    for month in rule._bymonth or range(1, 13):
+        if (any(day <= monthDays[month] for day in rule._bymonthday) or
+                any(-day <= monthDays[month] for day in rule._bynmonthday)):
+            return False
+    return True
+
+
+def emptyRule(rule):
+    """
+    Return a rule without occurrences, which dateutil is done with at once.
+    """
+    return rrule.rrule(rule._freq, dtstart=rule._dtstart,
+                       until=rule._dtstart - datetime.timedelta(seconds=1))
+
+
+class ExpansionBudget(object):
+    """
+    Limits on expanding recurrences, shared by everything expanded with it.
+
+    Create one per request or task, and pass it to the expansion functions.
+    maxIterations limits the recurrence instances looked at, including the
+    ones outside of the window, excluded, or overridden, maxInstances the
+    occurrences returned, and deadline the seconds from the budget's creation
+    until expansion stops.  When a limit is reached ExpansionLimitError is
+    raised, or, if truncate is True, expansion stops, results are truncated,
+    and the budget's truncated attribute is set.
+
+    The deadline is checked between instances, a rule which dateutil
+    searches a long time for its next instance can't be interrupted.  Only
+    impossible BYMONTHDAY rules are detected in advance, see isImpossible.
+    Rulesets returned by getrruleset aren't limited unless iterated with
+    iterInstances.
+    """
+    def __init__(self, maxInstances=None, maxIterations=None, deadline=None,
+                 truncate=False):
+        self.maxInstances = maxInstances
+        self.maxIterations = maxIterations
+        self.deadline = deadline
+        self.truncate = truncate
+        self.expires = (None if deadline is None else
+                        clock() + deadline)
+        self.instances = 0
+        self.iterations = 0
+        self.truncated = False
+
+    def exceeded(self, msg):
+        if not self.truncate:
+            raise ExpansionLimitError(msg)
+        self.truncated = True
+        return False
+
+    def iterate(self):
+        """
+        Count an instance looked at, return False if expansion must stop.
+        """
+        if self.truncated:
+            return False
+        self.iterations += 1
+        if (self.maxIterations is not None and
+                self.iterations > self.maxIterations):
+            return self.exceeded("Recurrence expansion looked at more than "
+                                 "{0} instances".format(self.maxIterations))
+        if self.expires is not None and clock() > self.expires:
+            return self.exceeded("Recurrence expansion took more than {0} "
+                                 "seconds".format(self.deadline))
+        return True
+
+    def produce(self, count=1):
+        """
+        Count occurrences returned, return False if they must be dropped and
+        expansion stop.
+        """
+        if self.truncated:
+            return False
+        self.instances += count
+        if (self.maxInstances is not None and
+                self.instances > self.maxInstances):
+            return self.exceeded("Recurrence expansion returned more than "
+                                 "{0} occurrences".format(self.maxInstances))
+        return True
+
+
+__defaultLimits = {}
+
+
+def setDefaultBudget(**limits):
+    """
+    Set the limits of the budget used when none is given to an expansion
+    function, as keyword arguments of ExpansionBudget.  Without arguments,
+    expansion isn't limited by default.
+    """
+    __defaultLimits.clear()
+    __defaultLimits.update(limits)
+
+
+def getBudget(budget=None):
+    """
+    Return budget, or a new default budget if it's None, or None if there are
+    no default limits.
+    """
+    if budget is None and __defaultLimits:
+        return ExpansionBudget(**__defaultLimits)
+    return budget
+
+
+def iterInstances(iterable, budget):
+    """
+    Yield the instances of an rruleset, counting them against budget.
+    """
+    if budget is None:
+        for instance in iterable:
+            yield instance
+        return
+    for instance in iterable:
+        if not budget.iterate():
+            return
+        yield instance
+
+
+def timedInstances(iterable, component):
+    """
+    Yield the instances of iterable, reporting component as slow to expand
+    if a L{ParseStats<vobject.base.ParseStats>} with a slowThreshold is
+    active and producing them took longer than that.
+
+    The time spent by the caller between instances isn't counted.  component
+    is reported once iteration stops, or the generator is closed.
+    """
+    stats = getParseStats()
+    if stats is None or stats.slowThreshold is None:
+        for instance in iterable:
+            yield instance
+        return
+    seconds = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = clock()
+            try:
+                instance = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += clock() - start
+            yield instance
+    finally:
+        stats.checkSlow('expand', component, seconds)
@@ -0,0 +1,230 @@
+"""
+Map Windows, Outlook, Exchange and Lotus Notes TZIDs to IANA timezone names.
+
+Windows timezone ids come from the CLDR windowsZones table (territory 001).
+Outlook and Exchange often use a timezone's display name as TZID instead, in
+several historical spellings, for instance:
+
+    (GMT+01.00) Amsterdam / Berlin / Bern / Rome / Stockholm / Vienna
+    (UTC+01:00) Amsterdam, Berlin, Bern, Rome, Stockholm, Vienna
+    Amsterdam, Berlin, Bern, Rome, Stockholm, Vienna
+
+so display names are compared after L{normalizeTzid} strips the offset prefix
+and separators.  Lotus Notes drops the " Standard Time" suffix of Windows ids,
+L{lookup} can optionally retry with it.
+
+The table is kept as compact text and only parsed into a dictionary the first
+time it's needed, so lookups are a single dict access on any platform, no
+Windows registry required.
+"""
+
+import re
+
+
+# Each line is an IANA name followed by '|' separated aliases
+ALIASES = u"""
+Etc/GMT+12|Dateline Standard Time|International Date Line West
+Etc/GMT+11|UTC-11|Coordinated Universal Time-11
+Pacific/Pago_Pago|Midway Island, Samoa
+America/Adak|Aleutian Standard Time|Aleutian Islands
+Pacific/Honolulu|Hawaiian Standard Time|Hawaii
+Pacific/Marquesas|Marquesas Standard Time|Marquesas Islands
+America/Anchorage|Alaskan Standard Time|Alaska
+Etc/GMT+9|UTC-09|Coordinated Universal Time-09
+America/Tijuana|Pacific Standard Time (Mexico)|Baja California|Tijuana, Baja California
+Etc/GMT+8|UTC-08|Coordinated Universal Time-08
+America/Los_Angeles|Pacific Standard Time|Pacific Time (US & Canada)|Pacific Time (US & Canada); Tijuana
+America/Phoenix|US Mountain Standard Time|Arizona
+America/Mazatlan|Mountain Standard Time (Mexico)|Mexico Standard Time 2|Chihuahua, La Paz, Mazatlan
+America/Denver|Mountain Standard Time|Mountain Time (US & Canada)
+America/Whitehorse|Yukon Standard Time|Yukon
+America/Guatemala|Central America Standard Time|Central America
+America/Chicago|Central Standard Time|Central Time (US & Canada)
+Pacific/Easter|Easter Island Standard Time|Easter Island
+America/Mexico_City|Central Standard Time (Mexico)|Mexico Standard Time|Guadalajara, Mexico City, Monterrey|Guadalajara, Mexico City, Monterrey - New|Guadalajara, Mexico City, Monterrey - Old
+America/Regina|Canada Central Standard Time|Saskatchewan
+America/Bogota|SA Pacific Standard Time|Bogota, Lima, Quito|Bogota, Lima, Quito, Rio Branco
+America/Cancun|Eastern Standard Time (Mexico)|Chetumal
+America/New_York|Eastern Standard Time|Eastern Time (US & Canada)
+America/Port-au-Prince|Haiti Standard Time|Haiti
+America/Havana|Cuba Standard Time|Havana
+America/Indiana/Indianapolis|US Eastern Standard Time|Indiana (East)
+America/Grand_Turk|Turks And Caicos Standard Time|Turks and Caicos
+America/Asuncion|Paraguay Standard Time|Asuncion
+America/Halifax|Atlantic Standard Time|Atlantic Time (Canada)
+America/Caracas|Venezuela Standard Time|Caracas|Caracas, La Paz
+America/Cuiaba|Central Brazilian Standard Time|Cuiaba|Manaus
+America/La_Paz|SA Western Standard Time|Georgetown, La Paz, Manaus, San Juan|Georgetown, La Paz, San Juan
+America/Santiago|Pacific SA Standard Time|Santiago
+America/St_Johns|Newfoundland Standard Time|Newfoundland|Newfoundland and Labrador
+America/Araguaina|Tocantins Standard Time|Araguaina
+America/Sao_Paulo|E. South America Standard Time|Brasilia
+America/Cayenne|SA Eastern Standard Time|Cayenne, Fortaleza
+America/Argentina/Buenos_Aires|Argentina Standard Time|Buenos Aires|City of Buenos Aires|Buenos Aires, Georgetown
+America/Godthab|Greenland Standard Time|Greenland
+America/Montevideo|Montevideo Standard Time|Montevideo
+America/Punta_Arenas|Magallanes Standard Time|Punta Arenas
+America/Miquelon|Saint Pierre Standard Time|Saint Pierre and Miquelon
+America/Bahia|Bahia Standard Time|Salvador
+Etc/GMT+2|UTC-02|Mid-Atlantic Standard Time|Coordinated Universal Time-02|Mid-Atlantic|Mid-Atlantic - Old
+Atlantic/Azores|Azores Standard Time|Azores
+Atlantic/Cape_Verde|Cape Verde Standard Time|Cape Verde Is.
+Etc/UTC|UTC|Coordinated Universal Time|Coordinated Universal Time - UTC
+Europe/London|GMT Standard Time|Dublin, Edinburgh, Lisbon, London|Greenwich Mean Time : Dublin, Edinburgh, Lisbon, London
+Atlantic/Reykjavik|Greenwich Standard Time|Monrovia, Reykjavik|Casablanca, Monrovia, Reykjavik
+Africa/Sao_Tome|Sao Tome Standard Time|Sao Tome
+Africa/Casablanca|Morocco Standard Time|Casablanca|Casablanca, Monrovia
+Europe/Berlin|W. Europe Standard Time|Amsterdam, Berlin, Bern, Rome, Stockholm, Vienna
+Europe/Budapest|Central Europe Standard Time|Belgrade, Bratislava, Budapest, Ljubljana, Prague
+Europe/Paris|Romance Standard Time|Brussels, Copenhagen, Madrid, Paris
+Europe/Warsaw|Central European Standard Time|Sarajevo, Skopje, Warsaw, Zagreb|Sarajevo, Skopje, Sofija, Vilnius, Warsaw, Zagreb
+Africa/Lagos|W. Central Africa Standard Time|West Central Africa
+Asia/Amman|Jordan Standard Time|Amman
+Europe/Bucharest|GTB Standard Time|Athens, Bucharest|Athens, Bucharest, Istanbul|Bucharest
+Europe/Athens|Athens, Istanbul, Minsk
+Asia/Beirut|Middle East Standard Time|Beirut
+Africa/Cairo|Egypt Standard Time|Cairo
+Europe/Chisinau|E. Europe Standard Time|Chisinau
+Asia/Damascus|Syria Standard Time|Damascus
+Asia/Hebron|West Bank Standard Time|Gaza, Hebron
+Africa/Johannesburg|South Africa Standard Time|Harare, Pretoria
+Europe/Kiev|FLE Standard Time|Helsinki, Kyiv, Riga, Sofia, Tallinn, Vilnius|Helsinki, Kiev, Riga, Sofia, Tallinn, Vilnius
+Asia/Jerusalem|Israel Standard Time|Jerusalem
+Africa/Juba|South Sudan Standard Time|Juba
+Europe/Kaliningrad|Kaliningrad Standard Time|Kaliningrad|Kaliningrad (RTZ 1)
+Africa/Khartoum|Sudan Standard Time|Khartoum
+Africa/Tripoli|Libya Standard Time|Tripoli
+Africa/Windhoek|Namibia Standard Time|Windhoek
+Asia/Baghdad|Arabic Standard Time|Baghdad
+Europe/Istanbul|Turkey Standard Time|Istanbul
+Asia/Riyadh|Arab Standard Time|Kuwait, Riyadh
+Europe/Minsk|Belarus Standard Time|Minsk
+Europe/Moscow|Russian Standard Time|Moscow, St. Petersburg|Moscow, St. Petersburg, Volgograd|Moscow, St. Petersburg, Volgograd (RTZ 2)
+Africa/Nairobi|E. Africa Standard Time|Nairobi
+Europe/Volgograd|Volgograd Standard Time|Volgograd
+Asia/Tehran|Iran Standard Time|Tehran
+Asia/Dubai|Arabian Standard Time|Abu Dhabi, Muscat
+Europe/Astrakhan|Astrakhan Standard Time|Astrakhan, Ulyanovsk
+Asia/Baku|Azerbaijan Standard Time|Baku|Baku, Tbilisi, Yerevan
+Europe/Samara|Russia Time Zone 3|Izhevsk, Samara|Izhevsk, Samara (RTZ 3)
+Indian/Mauritius|Mauritius Standard Time|Port Louis
+Europe/Saratov|Saratov Standard Time|Saratov
+Asia/Tbilisi|Georgian Standard Time|Tbilisi
+Asia/Yerevan|Caucasus Standard Time|Armenian Standard Time|Yerevan
+Asia/Kabul|Afghanistan Standard Time|Kabul
+Asia/Tashkent|West Asia Standard Time|Ashgabat, Tashkent|Tashkent
+Asia/Yekaterinburg|Ekaterinburg Standard Time|Ekaterinburg|Ekaterinburg (RTZ 4)
+Asia/Karachi|Pakistan Standard Time|Islamabad, Karachi|Islamabad, Karachi, Tashkent
+Asia/Qyzylorda|Qyzylorda Standard Time|Qyzylorda
+Asia/Kolkata|India Standard Time|Chennai, Kolkata, Mumbai, New Delhi
+Asia/Colombo|Sri Lanka Standard Time|Sri Jayawardenepura
+Asia/Kathmandu|Nepal Standard Time|Kathmandu
+Asia/Almaty|Central Asia Standard Time|Astana|Nur-Sultan
+Asia/Dhaka|Bangladesh Standard Time|Dhaka|Astana, Dhaka
+Asia/Omsk|Omsk Standard Time|Omsk
+Asia/Yangon|Myanmar Standard Time|Yangon (Rangoon)|Rangoon
+Asia/Bangkok|SE Asia Standard Time|Bangkok, Hanoi, Jakarta
+Asia/Barnaul|Altai Standard Time|Barnaul, Gorno-Altaysk
+Asia/Hovd|W. Mongolia Standard Time|Hovd
+Asia/Krasnoyarsk|North Asia Standard Time|Krasnoyarsk|Krasnoyarsk (RTZ 6)
+Asia/Novosibirsk|N. Central Asia Standard Time|Novosibirsk|Almaty, Novosibirsk|Novosibirsk (RTZ 5)
+Asia/Tomsk|Tomsk Standard Time|Tomsk
+Asia/Shanghai|China Standard Time|Beijing, Chongqing, Hong Kong, Urumqi|Beijing, Chongqing, Hong Kong SAR, Urumqi
+Asia/Irkutsk|North Asia East Standard Time|Irkutsk|Irkutsk, Ulaan Bataar|Irkutsk (RTZ 7)
+Asia/Singapore|Singapore Standard Time|Malay Peninsula Standard Time|Kuala Lumpur, Singapore
+Australia/Perth|W. Australia Standard Time|Perth
+Asia/Taipei|Taipei Standard Time|Taipei
+Asia/Ulaanbaatar|Ulaanbaatar Standard Time|Ulaanbaatar
+Australia/Eucla|Aus Central W. Standard Time|Eucla
+Asia/Chita|Transbaikal Standard Time|Chita
+Asia/Tokyo|Tokyo Standard Time|Osaka, Sapporo, Tokyo
+Asia/Pyongyang|North Korea Standard Time|Pyongyang
+Asia/Seoul|Korea Standard Time|Seoul
+Asia/Yakutsk|Yakutsk Standard Time|Yakutsk|Yakutsk (RTZ 8)
+Australia/Adelaide|Cen. Australia Standard Time|Adelaide
+Australia/Darwin|AUS Central Standard Time|Darwin
+Australia/Brisbane|E. Australia Standard Time|Brisbane
+Australia/Sydney|AUS Eastern Standard Time|Canberra, Melbourne, Sydney
+Pacific/Port_Moresby|West Pacific Standard Time|Guam, Port Moresby
+Australia/Hobart|Tasmania Standard Time|Hobart
+Asia/Vladivostok|Vladivostok Standard Time|Vladivostok|Vladivostok, Magadan|Vladivostok, Magadan (RTZ 9)
+Australia/Lord_Howe|Lord Howe Standard Time|Lord Howe Island
+Pacific/Bougainville|Bougainville Standard Time|Bougainville Island
+Asia/Srednekolymsk|Russia Time Zone 10|Chokurdakh|Chokurdakh (RTZ 10)
+Asia/Magadan|Magadan Standard Time|Magadan|Magadan, Solomon Is., New Caledonia
+Pacific/Norfolk|Norfolk Standard Time|Norfolk Island
+Asia/Sakhalin|Sakhalin Standard Time|Sakhalin
+Pacific/Guadalcanal|Central Pacific Standard Time|Solomon Is., New Caledonia
+Asia/Kamchatka|Russia Time Zone 11|Kamchatka Standard Time|Anadyr, Petropavlovsk-Kamchatsky|Anadyr, Petropavlovsk-Kamchatsky (RTZ 11)|Petropavlovsk-Kamchatsky - Old
+Pacific/Auckland|New Zealand Standard Time|Auckland, Wellington
+Etc/GMT-12|UTC+12|Coordinated Universal Time+12
+Pacific/Fiji|Fiji Standard Time|Fiji|Fiji, Kamchatka, Marshall Is.|Fiji Islands, Kamchatka, Marshall Islands
+Pacific/Chatham|Chatham Islands Standard Time|Chatham Islands
+Etc/GMT-13|UTC+13|Coordinated Universal Time+13
+Pacific/Tongatapu|Tonga Standard Time|Nuku'alofa
+Pacific/Apia|Samoa Standard Time|Samoa
+Pacific/Kiritimati|Line Islands Standard Time|Kiritimati Island
+"""
+
+STANDARD_TIME = u' standard time'
+
+# Leading offsets used by Outlook and Exchange display names, like
+# "(GMT+01.00) ", "(UTC-05:00) " or "(GMT) "
+offset_prefix_re = re.compile(
+    r'^\(\s*(?:gmt|utc)\s*(?:[+-]\s*\d{1,2}(?:[.:]\d{2})?)?\s*\)\s*')
+separator_re = re.compile(r'\s*[,/]\s*')
+space_re = re.compile(r'\s+')
+
+__aliasMap = None
+
+
+def normalizeTzid(tzid):
+    """
+    Return a canonical lowercase form of tzid for comparing display names.
+
+    Quotes and any (GMT+hh.mm) style prefix are dropped, cities may be
+    separated by commas or slashes.
+
+    >>> normalizeTzid(u'(GMT+01.00) Amsterdam / Berlin / Bern / Rome')
+    'amsterdam,berlin,bern,rome'
+    """
+    s = space_re.sub(u' ', tzid.strip().strip(u'"').lower())
+    s = offset_prefix_re.sub(u'', s).replace(u' :', u':').replace(u': ', u':')
+    return u','.join(part for part in separator_re.split(s) if part)
+
+
+def getAliasMap():
+    """
+    Return the dictionary of aliases to IANA names, parsing ALIASES once.
+
+    Both the exact alias and its normalized form are keys.
+    """
+    global __aliasMap
+    if __aliasMap is None:
+        aliasMap = {}
+        for line in ALIASES.splitlines():
+            if not line:
+                continue
+            names = line.split(u'|')
+            for alias in names[1:]:
+                aliasMap[alias] = names[0]
+                aliasMap.setdefault(normalizeTzid(alias), names[0])
+        __aliasMap = aliasMap
+    return __aliasMap
+
+
+def lookup(tzid, guessSuffix=False):
+    """
+    Return the IANA name for the Windows style tzid, or None.
+
+    If guessSuffix is True, also try tzid as a Lotus Notes style Windows id
+    missing its " Standard Time" suffix (for instance "W. Europe").
+    """
+    aliasMap = getAliasMap()
+    name = aliasMap.get(tzid)
+    if name is None:
+        normalized = normalizeTzid(tzid)
+        name = aliasMap.get(normalized)
+        if name is None and guessSuffix:
+            name = aliasMap.get(normalized + STANDARD_TIME)
+    return name
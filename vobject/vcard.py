@@ -4,8 +4,8 @@ import codecs
 
 from . import behavior
 
-from .base import ContentLine, registerBehavior, backslashEscape, str_
-from .icalendar import stringToTextValues
+from .base import ContentLine, registerBehavior, backslashEscape, str_, \
+    stringToTextValues
 
 
 # Python 3 no longer has a basestring type, so....
@@ -0,0 +1,313 @@
+"""
+Expand many recurring components at once with NumPy, for bulk analytics.
+
+expandArrays returns the occurrences of a large number of components as
+NumPy arrays instead of Occurrence records.  Series with the most common
+rule shapes, a DAILY or WEEKLY RRULE with INTERVAL, BYDAY, COUNT or UNTIL,
+are computed with vectorized date arithmetic, EXDATEs and overridden
+instances are removed with numpy.isin.  Other components are expanded with
+L{occurrences.expandComponent<vobject.occurrences.expandComponent>}.
+
+NumPy is optional, this module can be imported without it, but
+expandArrays raises VObjectError if it isn't installed.
+
+The vectorized benchmark of L{vobject.bench} times expandArrays against
+iterating each component's rruleset over the same window::
+
+    python -m vobject.bench vectorized
+"""
+
+import collections
+import datetime
+
+from timeit import default_timer as clock
+
+from dateutil import rrule
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .base import VObjectError, getParseStats
+from .icalendar import RecurringComponent, utc
+from .occurrences import (OverrideIndex, expandComponent, localize,
+                          startAndDuration)
+from .recurrence import getBudget, isSeekable, wholeSeconds
+
+epoch = datetime.datetime(1970, 1, 1)
+oneHour = datetime.timedelta(hours=1)
+oneDay = datetime.timedelta(days=1)
+
+# Series expanded with vectorized arithmetic
+Series = collections.namedtuple(
+    'Series', ('position', 'rule', 'rruleset', 'duration', 'tzinfo',
+               'overridden'))
+
+
+def toWall(value, tzinfo):
+    """
+    Return value as a naive wall clock time in tzinfo.
+    """
+    if not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None and tzinfo is not None:
+        return value.astimezone(tzinfo).replace(tzinfo=None)
+    return value.replace(tzinfo=None)
+
+
+def toSeconds(values):
+    """
+    Return an int64 array of seconds since the epoch for naive datetimes.
+    """
+    return numpy.array([wholeSeconds(value - epoch) for value in values],
+                       dtype=numpy.int64)
+
+
+def vectorizable(rruleset):
+    """
+    Return rruleset's only rule if it can be expanded by arithmetic, or None.
+    """
+    if len(rruleset._rrule) != 1 or rruleset._exrule:
+        return None
+    rule = rruleset._rrule[0]
+    dtstart = rule._dtstart
+    if (rule._freq not in (rrule.DAILY, rrule.WEEKLY) or
+            not isSeekable(rule) or rule._bymonth or rule._bymonthday or
+            rule._bynmonthday or rule._bynweekday):
+        return None
+    # occurrences must be at DTSTART's time of day
+    for byxxx, value in ((rule._byhour, dtstart.hour),
+                         (rule._byminute, dtstart.minute),
+                         (rule._bysecond, dtstart.second)):
+        if byxxx is None or set(byxxx) != set([value]):
+            return None
+    return rule
+
+
+def ruleDays(rule, low, high):
+    """
+    Return the days of rule's occurrences from day low to day high, both
+    datetime64[D], in order, with each occurrence's index in the series.
+    """
+    dtstart = rule._dtstart
+    first = numpy.datetime64(dtstart.date(), 'D')
+    interval = rule._interval
+    byweekday = rule._byweekday
+
+    if rule._freq == rrule.DAILY:
+        start = max(0, -(-(low - first).astype(numpy.int64) // interval))
+        stop = (high - first).astype(numpy.int64) // interval + 1
+        steps = numpy.arange(start, max(start, stop), dtype=numpy.int64)
+        days = first + steps * interval
+        if byweekday is None:
+            return days, steps
+        # the weekdays of first + step * interval repeat every 7 steps
+        cycle = numpy.isin((dtstart.weekday() +
+                            numpy.arange(7) * interval) % 7, byweekday)
+        before = numpy.concatenate(([0], numpy.cumsum(cycle)[:-1]))
+        mask = cycle[steps % 7]
+        steps = steps[mask]
+        return (days[mask],
+                (steps // 7) * int(cycle.sum()) + before[steps % 7])
+
+    # WEEKLY, weeks start on WKST
+    weekStart = first - (dtstart.weekday() - rule._wkst) % 7
+    offsets = numpy.array(sorted((day - rule._wkst) % 7 for day in byweekday),
+                          dtype=numpy.int64)
+    firstWeek = int((weekStart + offsets >= first).sum())
+    start = max(0, (low - weekStart).astype(numpy.int64) // 7 // interval)
+    stop = (high - weekStart).astype(numpy.int64) // 7 // interval + 1
+    weeks = numpy.arange(start, max(start, stop), dtype=numpy.int64)
+    days = (weekStart + (weeks * interval * 7)[:, None] +
+            offsets[None, :]).ravel()
+    indexes = ((weeks - 1) * len(offsets) + firstWeek)[:, None] + \
+        numpy.arange(len(offsets))[None, :]
+    indexes = indexes.ravel()
+    # in the first week, only days from DTSTART on are occurrences
+    mask = days >= first
+    return days[mask], indexes[mask]
+
+
+def seriesWallStarts(series, low, high):
+    """
+    Return the naive wall clock starts of a vectorizable series' occurrences,
+    as seconds since the epoch, which start on day low to day high.
+    """
+    rule = series.rule
+    rruleset = series.rruleset
+    dtstart = rule._dtstart
+    days, indexes = ruleDays(rule, low, high)
+    if rule._count is not None:
+        days = days[indexes < rule._count]
+    timeOfDay = (dtstart.hour * 3600 + dtstart.minute * 60 + dtstart.second)
+    starts = days.astype('datetime64[s]').astype(numpy.int64) + timeOfDay
+    starts = starts[starts >= toSeconds([dtstart.replace(tzinfo=None)])[0]]
+    if rule._until is not None:
+        until = toWall(rule._until, series.tzinfo)
+        starts = starts[starts <= toSeconds([until])[0]]
+    if rruleset._rdate:
+        rdates = toSeconds(toWall(dt, series.tzinfo)
+                           for dt in rruleset._rdate)
+        lowSeconds = low.astype('datetime64[s]').astype(numpy.int64)
+        highSeconds = (high + 1).astype('datetime64[s]').astype(numpy.int64)
+        rdates = rdates[(rdates >= lowSeconds) & (rdates < highSeconds)]
+        starts = numpy.union1d(starts, rdates)
+    removed = [toWall(dt, series.tzinfo) for dt in rruleset._exdate]
+    removed.extend(series.overridden)
+    if removed:
+        starts = starts[~numpy.isin(starts, toSeconds(removed))]
+    return starts
+
+
+class OffsetTable(object):
+    """
+    UTC offsets of wall clock times in a timezone, sampled every hour.
+
+    Looking up offsets in the table is vectorized, at the price of assuming
+    transitions happen on the hour, and not twice within a day.
+    """
+    def __init__(self, tzinfo, low, high):
+        self.low = wholeSeconds(low - epoch) // 3600
+        hours = wholeSeconds(high - epoch) // 3600 - self.low + 1
+        first = low.replace(minute=0, second=0, microsecond=0)
+
+        def offset(hour):
+            wall = localize(first + hour * oneHour, tzinfo)
+            return wholeSeconds(wall.utcoffset())
+
+        # localizing is slow, sample a day apart and only look at each hour
+        # of the days with a transition
+        offsets = numpy.empty(hours, dtype=numpy.int64)
+        previous = offsets[0] = offset(0)
+        for day in range(0, hours - 1, 24):
+            last = min(day + 24, hours - 1)
+            current = offset(last)
+            if current == previous:
+                offsets[day:last + 1] = current
+            else:
+                for hour in range(day + 1, last + 1):
+                    offsets[hour] = offset(hour)
+            previous = current
+        self.offsets = offsets
+
+    def toUtc(self, wall):
+        """
+        Convert an array of wall clock seconds to UTC seconds.
+        """
+        hours = numpy.clip(wall // 3600 - self.low, 0, len(self.offsets) - 1)
+        return wall - self.offsets[hours]
+
+
+def expandArrays(components, start, end, tzinfo=None, budget=None):
+    """
+    Return the occurrences of components intersecting [start, end).
+
+    Occurrences overridden by one of components with the same UID and a
+    RECURRENCE-ID are replaced by the overriding component's occurrence,
+    like in L{occurrences.expand<vobject.occurrences.expand>}.  Floating
+    times, dates and naive window bounds are taken to be in tzinfo, which
+    defaults to start's timezone, or UTC.  Expansion is limited by budget,
+    an L{ExpansionBudget<vobject.recurrence.ExpansionBudget>}, or the default
+    budget; a truncated result leaves out whole series.  Components slow to
+    expand are reported to the active
+    L{ParseStats<vobject.base.ParseStats>}, if it has a slowThreshold.
+
+    @return:
+        (starts, ends, index), NumPy arrays ordered by start.  starts and
+        ends are datetime64[s] UTC times, index holds the position in
+        components of each occurrence's component.
+    """
+    if numpy is None:
+        raise VObjectError("expandArrays requires NumPy")
+    if tzinfo is None:
+        tzinfo = getattr(start, 'tzinfo', None) or utc
+    windowStart = localize(start, tzinfo)
+    windowEnd = localize(end, tzinfo)
+    components = list(components)
+    budget = getBudget(budget)
+    stats = getParseStats()
+    if stats is not None and stats.slowThreshold is None:
+        stats = None
+
+    overrides = OverrideIndex(components)
+
+    series = []
+    starts, ends, index = [], [], []
+    for position, component in enumerate(components):
+        dtstart, duration = startAndDuration(component)
+        if dtstart is None:
+            continue
+        isMaster = component.getChildValue('recurrence_id') is None
+        rruleset = None
+        if isMaster and isinstance(component, RecurringComponent):
+            rruleset = component.getrruleset(addRDate=True)
+        rule = None if rruleset is None else vectorizable(rruleset)
+        uid = component.getChildValue('uid')
+        if rule is not None and not overrides.futures.get(uid):
+            seriesTz = getattr(dtstart, 'tzinfo', None)
+            overridden = [toWall(key, seriesTz)
+                          for key in overrides.overrides.get(uid, ())]
+            series.append(Series(position, rule, rruleset, duration,
+                                 seriesTz or tzinfo, overridden))
+            continue
+        for occurrence in expandComponent(
+                component, windowStart, windowEnd, tzinfo,
+                overrides if isMaster else None, budget):
+            starts.append(localize(occurrence.start, tzinfo))
+            ends.append(localize(occurrence.end, tzinfo))
+            index.append(position)
+
+    def utcSeconds(values):
+        return numpy.array([(value - windowStart).total_seconds()
+                            for value in values], dtype=numpy.int64) + \
+            int((windowStart - epoch.replace(tzinfo=utc)).total_seconds())
+
+    startArrays = [utcSeconds(starts)]
+    endArrays = [utcSeconds(ends)]
+    indexArrays = [numpy.array(index, dtype=numpy.int64)]
+
+    if series:
+        longest = max(s.duration for s in series)
+        tables = {}
+        winLow = windowStart.astimezone(utc).replace(tzinfo=None)
+        winHigh = windowEnd.astimezone(utc).replace(tzinfo=None)
+        lowSeconds = toSeconds([winLow])[0]
+        highSeconds = toSeconds([winHigh])[0]
+        for s in series:
+            # some tzinfo classes aren't hashable
+            table = tables.get(id(s.tzinfo))
+            if table is None:
+                table = tables[id(s.tzinfo)] = OffsetTable(
+                    s.tzinfo, winLow - longest - 2 * oneDay,
+                    winHigh + longest + 2 * oneDay)
+            if stats is not None:
+                began = clock()
+            # wall clock days which may hold intersecting occurrences
+            low = numpy.datetime64((winLow - s.duration - oneDay).date(), 'D')
+            high = numpy.datetime64((winHigh + oneDay).date(), 'D')
+            wallStarts = seriesWallStarts(s, low, high)
+            duration = wholeSeconds(s.duration)
+            utcStarts = table.toUtc(wallStarts)
+            utcEnds = table.toUtc(wallStarts + duration)
+            instants = utcStarts == utcEnds
+            mask = numpy.where(
+                instants,
+                (utcStarts >= lowSeconds) & (utcStarts < highSeconds),
+                (utcStarts < highSeconds) & (utcEnds > lowSeconds))
+            if stats is not None:
+                stats.checkSlow('expand', components[s.position],
+                                clock() - began)
+            count = int(mask.sum())
+            if budget is not None and not budget.produce(count):
+                break
+            startArrays.append(utcStarts[mask])
+            endArrays.append(utcEnds[mask])
+            indexArrays.append(numpy.full(count, s.position,
+                                          dtype=numpy.int64))
+
+    starts = numpy.concatenate(startArrays)
+    order = numpy.argsort(starts, kind='stable')
+    return (starts[order].astype('datetime64[s]'),
+            numpy.concatenate(endArrays)[order].astype('datetime64[s]'),
+            numpy.concatenate(indexArrays)[order])